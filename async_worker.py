@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Async Worker
+
+One long-lived asyncio event loop on a background thread, shared by everything the
+GUI does off the Tk thread (health monitoring, probes, terminal launches). Work is
+handed to the loop thread-safely, and results come back through a queue that the
+Tk main loop drains on a timer, so widgets are only touched from the Tk thread.
+Keeping one loop lets all probes share the switcher's aiohttp connection pool, and
+stop() cancels outstanding work cleanly.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import asyncio
+import functools
+import queue
+import threading
+import traceback
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Optional
+
+
+class AsyncWorker:
+    """常驻的事件循环线程 + 返回主线程的结果队列"""
+
+    def __init__(self, on_shutdown: Optional[Callable[[], Awaitable[None]]] = None, name: str = "async-worker"):
+        self.on_shutdown = on_shutdown  # 停止时在循环里执行的清理协程，例如关闭共享的 HTTP 会话
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._results: "queue.SimpleQueue[Callable[[], None]]" = queue.SimpleQueue()
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None and self._loop.is_running()
+
+    def start(self):
+        """启动工作线程，等事件循环就绪后返回"""
+        if self._thread is not None:
+            return
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        loop.call_soon(self._ready.set)
+        try:
+            loop.run_forever()
+            # stop() 之后：取消剩下的任务并等它们收尾，再执行清理
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            if self.on_shutdown:
+                loop.run_until_complete(self.on_shutdown())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            self._loop = None
+            loop.close()
+
+    def submit(self, coro: Awaitable, on_done: Optional[Callable[[Any], None]] = None,
+               on_error: Optional[Callable[[BaseException], None]] = None) -> Future:
+        """从任意线程提交协程；on_done/on_error 由 poll() 在主线程调用，返回可 cancel() 的 Future"""
+        if not self.running:
+            raise RuntimeError("AsyncWorker 未启动")
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+        def finished(future: Future):
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is None:
+                if on_done:
+                    self.post(on_done, future.result())
+            elif on_error:
+                self.post(on_error, error)
+            else:
+                self.post(traceback.print_exception, type(error), error, error.__traceback__)
+
+        future.add_done_callback(finished)
+        return future
+
+    def submit_call(self, func: Callable, *args, on_done: Optional[Callable[[Any], None]] = None,
+                    on_error: Optional[Callable[[BaseException], None]] = None, **kwargs) -> Future:
+        """在循环的线程池里执行阻塞函数(如启动终端)，结果同样经由 poll() 返回"""
+        async def call():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+        return self.submit(call(), on_done, on_error)
+
+    def post(self, callback: Callable, *args):
+        """把回调排进结果队列，交给主线程执行；可在任意线程调用"""
+        self._results.put(functools.partial(callback, *args))
+
+    def poll(self, limit: int = 500) -> int:
+        """在主线程执行排队的回调(每次最多 limit 个，避免卡住界面)，返回执行的数量"""
+        handled = 0
+        while handled < limit:
+            try:
+                callback = self._results.get_nowait()
+            except queue.Empty:
+                break
+            handled += 1
+            try:
+                callback()
+            except Exception:
+                traceback.print_exc()
+        return handled
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """取消所有未完成的任务、执行清理并等待线程退出"""
+        loop, thread = self._loop, self._thread
+        if loop is not None:
+            try:
+                loop.call_soon_threadsafe(loop.stop)
+            except RuntimeError:
+                pass  # 循环已关闭
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
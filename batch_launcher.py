@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Batch Launcher
+
+Opens Claude sessions for several project directories at once. Sessions are spread
+across the healthy providers in proportion to their ranking score, taking sessions
+already started into account, so no single provider's rate limit is hit by every
+session. Terminals are launched concurrently and each session reports its own status.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import heapq
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from provider_switch import AIProviderSwitcher, ProjectDirectory
+from terminal_launcher import launch_terminal, load_claude_env
+
+STRATEGIES = ("load", "weight")
+
+
+@dataclass
+class BatchSession:
+    """批量启动中的一个会话"""
+    project_name: str
+    path: str
+    provider: Optional[str] = None
+    status: str = "pending"          # pending / launching / ok / failed
+    terminal: Optional[str] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+
+class BatchLauncher:
+    """批量启动器：分配提供者并并发打开终端；记住已启动的会话数，后续批次按负载继续分摊"""
+
+    def __init__(self, switcher: AIProviderSwitcher, max_workers: int = 8):
+        self.switcher = switcher
+        self.max_workers = max_workers
+        self.session_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def provider_weights(self) -> Dict[str, float]:
+        """可用提供者及其权重(排名得分)"""
+        scores = self.switcher.score_all()
+        return {name: scores[name] for name in self.switcher.rank_providers() if scores.get(name)}
+
+    def assign(self, projects: List[ProjectDirectory], strategy: str = "load") -> List[BatchSession]:
+        """为每个项目分配提供者
+
+        load:   每次选 (已有会话数 + 1) / 权重 最小的提供者，之前批次启动的会话也计入
+        weight: 只按本批次做平滑加权轮询，不考虑之前的会话
+        """
+        sessions = [BatchSession(project_name=project.name, path=project.path) for project in projects]
+        weights = self.provider_weights()
+        if not weights:
+            for session in sessions:
+                session.status = "failed"
+                session.error = "没有可用的提供者"
+            return sessions
+
+        with self._lock:
+            counts = dict(self.session_counts) if strategy == "load" else {}
+        # (下一个会话落在该提供者时的相对负载, 名称)
+        heap = [((counts.get(name, 0) + 1) / weight, name) for name, weight in weights.items()]
+        heapq.heapify(heap)
+        for session in sessions:
+            _, name = heapq.heappop(heap)
+            session.provider = name
+            counts[name] = counts.get(name, 0) + 1
+            heapq.heappush(heap, ((counts[name] + 1) / weights[name], name))
+        return sessions
+
+    def launch_one(self, session: BatchSession, fast: bool,
+                   on_update: Optional[Callable[[BatchSession], None]]) -> BatchSession:
+        """启动单个会话的终端；只把提供者变量传给子进程，不改当前进程的环境"""
+        provider = self.switcher.get_provider(session.provider) if session.provider else None
+        if provider is None:
+            session.status = "failed"
+            session.error = session.error or f"未找到提供者: {session.provider}"
+            if on_update:
+                on_update(session)
+            return session
+
+        session.status = "launching"
+        if on_update:
+            on_update(session)
+        start = time.perf_counter()
+        if not os.path.isdir(session.path):
+            success, terminal_name, error = False, None, f"目录不存在: {session.path}"
+        else:
+            success, terminal_name, error = launch_terminal(
+                None,
+                env=self.switcher.provider_env(provider),
+                working_dir=session.path,
+                auto_claude=True,
+                fast=fast
+            )
+        session.elapsed = time.perf_counter() - start
+        session.terminal = terminal_name
+        session.error = error
+        session.status = "ok" if success else "failed"
+        if success:
+            with self._lock:
+                self.session_counts[provider.name] = self.session_counts.get(provider.name, 0) + 1
+        if on_update:
+            on_update(session)
+        return session
+
+    def launch(self, sessions: List[BatchSession], fast: bool = True,
+               on_update: Optional[Callable[[BatchSession], None]] = None) -> List[BatchSession]:
+        """并发启动所有会话，阻塞直到全部完成；on_update 在线程池的线程中调用"""
+        if fast:
+            load_claude_env()  # 先准备好环境快照，避免每个线程各自采集一次
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(sessions)))) as pool:
+            list(pool.map(lambda session: self.launch_one(session, fast, on_update), sessions))
+        return sessions
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Health Check Benchmark
+
+Measures check_all_providers wall time, CPU time and peak memory for fleets of
+10, 100 and 1000 providers against the local mock provider server. Every fleet size
+runs in a fresh subprocess so memory and CPU numbers are not polluted by earlier runs.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# 可被 mock 服务器模拟的提供商类型(official_anthropic 的探测地址写死为官方域名，不参与)
+MOCK_TYPES = [
+    "openrouter", "custom_anthropic", "deepseek", "moonshot", "zhipu",
+    "baichuan", "azure_openai", "gemini", "local_ollama",
+]
+
+DEFAULT_SIZES = [10, 100, 1000]
+
+
+def build_fleet(size: int, port: int, hosts: int, profiles: List[str]) -> Dict:
+    """生成 size 个提供者的配置，轮流分配类型、主机和行为 profile"""
+    providers = []
+    for i in range(size):
+        host = f"127.0.0.{i % hosts + 1}"
+        profile = profiles[i % len(profiles)]
+        providers.append({
+            "name": f"mock-{i:04d}",
+            "type": MOCK_TYPES[i % len(MOCK_TYPES)],
+            "base_url": f"http://{host}:{port}/p/{profile}",
+            "api_key": f"mock-key-{i}",
+            "model": "mock-model",
+            "small_fast_model": "mock-model",
+            "priority": 1,
+            "timeout": 5.0,
+        })
+    return {"providers": providers}
+
+
+def rss_kb() -> int:
+    """进程峰值常驻内存(KB，Linux 上 ru_maxrss 的单位)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+async def run_one(config_file: str, rounds: int, deep: bool) -> Dict:
+    """在当前进程里对一个配置跑若干轮 check_all_providers"""
+    from provider_switch import AIProviderSwitcher
+
+    rss_before = rss_kb()
+    switcher = AIProviderSwitcher(config_file)
+    results = []
+    try:
+        for _ in range(rounds):
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            statuses = await switcher.check_all_providers(deep=deep)
+            results.append({
+                "wall_s": time.perf_counter() - wall_start,
+                "cpu_s": time.process_time() - cpu_start,
+                "healthy": sum(1 for status in statuses.values() if status.is_healthy),
+            })
+    finally:
+        await switcher.close()
+
+    return {
+        "providers": len(switcher.providers),
+        "rounds": results,
+        "peak_rss_kb": rss_kb(),
+        "rss_growth_kb": rss_kb() - rss_before,
+    }
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    """等待模拟服务器开始监听"""
+    import socket
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"模拟服务器未在 {timeout}s 内启动")
+
+
+def print_table(rows: List[Dict]):
+    print(f"\n{'提供者数':>8} {'轮次':>4} {'耗时(s)':>9} {'CPU(s)':>8} {'健康':>6} {'峰值RSS(MB)':>12}")
+    for row in rows:
+        for index, result in enumerate(row["rounds"], 1):
+            label = "冷" if index == 1 else "热"
+            print(f"{row['providers']:>8} {label + str(index):>4} {result['wall_s']:>9.3f} "
+                  f"{result['cpu_s']:>8.3f} {result['healthy']:>6} {row['peak_rss_kb'] / 1024:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Easy Claude Code 健康检查基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--rounds", type=int, default=3, help="每个规模跑几轮(第一轮为冷启动)")
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--hosts", type=int, default=8, help="模拟的主机数量(不同回环地址)")
+    parser.add_argument("--profiles", nargs="+", default=["fast", "normal"],
+                        help="轮流分配给提供者的 mock profile")
+    parser.add_argument("--deep", action="store_true", help="同时执行深度探测")
+    parser.add_argument("--json", dest="json_out", help="把结果写入 JSON 文件")
+    parser.add_argument("--run-one", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        # 子进程模式：只跑一个配置并输出 JSON
+        result = asyncio.run(run_one(args.run_one, args.rounds, args.deep))
+        print(json.dumps(result))
+        return
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(here, "mock_provider_server.py"),
+         "--port", str(args.port), "--hosts", str(args.hosts)],
+        stdout=subprocess.DEVNULL
+    )
+    rows = []
+    try:
+        wait_for_port(args.port)
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in args.sizes:
+                config_file = os.path.join(tmp, f"providers_{size}.json")
+                with open(config_file, 'w', encoding='utf-8') as f:
+                    json.dump(build_fleet(size, args.port, args.hosts, args.profiles), f)
+
+                command = [sys.executable, os.path.abspath(__file__), "--run-one", config_file,
+                           "--rounds", str(args.rounds)]
+                if args.deep:
+                    command.append("--deep")
+                output = subprocess.run(command, cwd=here, capture_output=True, text=True, check=True)
+                rows.append(json.loads(output.stdout.strip().splitlines()[-1]))
+                print(f"✅ {size} 个提供者完成", flush=True)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print_table(rows)
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Launch Latency Benchmark
+
+Measures the time from a terminal starting its shell command to `claude` actually
+being executed, for the regular launch script (bashrc + nvm + checks) and for the
+fast-launch mode that reuses the Node/claude environment snapshot. Runs against a
+throwaway HOME with a stub nvm install and a stub `claude` that records when it starts.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Dict, List
+
+import terminal_launcher
+
+NODE_VERSION = "v20.0.0"
+
+
+def build_fake_home(root: str, nvm_delay: float) -> str:
+    """生成带 nvm 和 claude 桩程序的临时 HOME"""
+    bin_dir = os.path.join(root, ".nvm", "versions", "node", NODE_VERSION, "bin")
+    os.makedirs(bin_dir)
+    os.makedirs(os.path.join(root, ".nvm", "alias"))
+    with open(os.path.join(root, ".nvm", "alias", "default"), "w") as f:
+        f.write(NODE_VERSION + "\n")
+    with open(os.path.join(root, ".nvm", "nvm.sh"), "w") as f:
+        # 真实的 nvm.sh 加载通常要几百毫秒，用 --nvm-delay 模拟
+        f.write(f'sleep {nvm_delay}\nexport PATH="$NVM_DIR/versions/node/{NODE_VERSION}/bin:$PATH"\n')
+    with open(os.path.join(root, ".bashrc"), "w") as f:
+        f.write("# benchmark bashrc\n")
+
+    stubs = {
+        "node": "#!/bin/sh\nexit 0\n",
+        # 记录 claude 被执行的时刻
+        "claude": '#!/bin/sh\ndate +%s.%N > "$CLAUDE_STARTED_FILE"\n',
+    }
+    for name, content in stubs.items():
+        path = os.path.join(bin_dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        os.chmod(path, 0o755)
+    return root
+
+
+def run_once(fast: bool, started_file: str) -> Dict[str, float]:
+    """生成一次启动脚本并在 bash 里执行，返回准备时间和 shell 到 claude 启动的时间"""
+    prepare_start = time.perf_counter()
+    prepared = terminal_launcher.build_fast_launch_command({}, None) if fast else None
+    if prepared is None:
+        prepared = terminal_launcher.build_launch_command(None, {}, None, auto_claude=True)
+    full_command, env = prepared
+    prepare = time.perf_counter() - prepare_start
+
+    if os.path.exists(started_file):
+        os.remove(started_file)
+    shell_start = time.time()
+    subprocess.run(["bash", "-c", full_command], env=env, stdin=subprocess.DEVNULL,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    with open(started_file) as f:
+        claude_started = float(f.read().strip())
+    return {"prepare_s": prepare, "to_claude_s": claude_started - shell_start}
+
+
+def summarize(samples: List[Dict[str, float]]) -> Dict[str, float]:
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Easy Claude Code 启动延迟基准测试")
+    parser.add_argument("--runs", type=int, default=3, help="每种模式执行的次数(普通模式每次约 3 秒)")
+    parser.add_argument("--nvm-delay", type=float, default=0.3, help="模拟 nvm.sh 的加载耗时(秒)")
+    parser.add_argument("--json", dest="json_out", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        home = build_fake_home(tmp, args.nvm_delay)
+        started_file = os.path.join(tmp, "claude_started")
+        os.environ.update({
+            "HOME": home,
+            "NVM_DIR": os.path.join(home, ".nvm"),
+            "XDG_CACHE_HOME": os.path.join(home, ".cache"),
+            "CLAUDE_STARTED_FILE": started_file,
+        })
+
+        capture_start = time.perf_counter()
+        terminal_launcher.load_claude_env(refresh=True)
+        capture = time.perf_counter() - capture_start
+
+        results = {
+            "regular": summarize([run_once(False, started_file) for _ in range(args.runs)]),
+            "fast": summarize([run_once(True, started_file) for _ in range(args.runs)]),
+            "snapshot_capture_s": capture,
+        }
+
+    print(f"\n一次性采集环境快照: {capture * 1000:.0f} ms (之后按 mtime 校验复用)")
+    print(f"{'模式':<8} {'准备(ms)':>9} {'到 claude 启动(ms)':>18}")
+    for mode in ("regular", "fast"):
+        row = results[mode]
+        print(f"{mode:<8} {row['prepare_s'] * 1000:>9.1f} {row['to_claude_s'] * 1000:>18.1f}")
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - CLI Startup Benchmark
+
+Measures cold-start wall time of provider_cli.py subcommands that answer from local
+state (status, best, env), each run in a fresh interpreter, and reports which heavy
+modules (asyncio, aiohttp, tkinter) each subcommand ended up importing.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmark_health import build_fleet
+
+HEAVY_MODULES = ("asyncio", "aiohttp", "tkinter")
+DEFAULT_COMMANDS = ["status", "best", "env mock-0000"]
+
+
+def seed_health(config_file: str):
+    """写入一份健康缓存，让 best 等子命令走缓存路径而不是联网探测"""
+    from provider_switch import AIProviderSwitcher, HealthStatus
+
+    switcher = AIProviderSwitcher(config_file)
+    for index, provider in enumerate(switcher.providers):
+        switcher.record_health(HealthStatus(
+            provider_name=provider.name,
+            is_healthy=True,
+            response_time=0.05 + index * 0.001,
+            last_check=time.time()
+        ))
+    switcher.save_health()
+
+
+def time_command(cli: str, config_file: str, command: str, runs: int) -> List[float]:
+    """在全新解释器里重复执行一个子命令，返回每次的耗时(秒)"""
+    argv = [sys.executable, cli, "--config", config_file, *command.split()]
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def heavy_imports(cli: str, config_file: str, command: str) -> List[str]:
+    """用 -X importtime 执行一次，找出导入了哪些重量级模块"""
+    argv = [sys.executable, "-X", "importtime", cli, "--config", config_file, *command.split()]
+    output = subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+    imported = {line.rsplit("|", 1)[-1].strip() for line in output.splitlines() if line.startswith("import time:")}
+    return [module for module in HEAVY_MODULES if module in imported]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Easy Claude Code 命令行冷启动基准测试")
+    parser.add_argument("--providers", type=int, default=50, help="配置中的提供者数量")
+    parser.add_argument("--runs", type=int, default=20, help="每个子命令执行的次数")
+    parser.add_argument("--commands", nargs="+", default=DEFAULT_COMMANDS, help="要测量的子命令")
+    parser.add_argument("--json", dest="json_out", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    cli = os.path.join(here, "provider_cli.py")
+    baseline = [sys.executable, "-c", "pass"]
+    rows: List[Dict] = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_file = os.path.join(tmp, "providers.json")
+        with open(config_file, 'w', encoding='utf-8') as f:
+            json.dump(build_fleet(args.providers, 18000, 1, ["fast"]), f)
+        seed_health(config_file)
+
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            subprocess.run(baseline)
+        interpreter = (time.perf_counter() - start) / args.runs
+
+        for command in args.commands:
+            timings = sorted(time_command(cli, config_file, command, args.runs))
+            rows.append({
+                "command": command,
+                "min_s": timings[0],
+                "median_s": statistics.median(timings),
+                "p95_s": timings[max(int(len(timings) * 0.95) - 1, 0)],
+                "heavy_imports": heavy_imports(cli, config_file, command),
+            })
+
+    print(f"\n空解释器启动: {interpreter * 1000:.1f} ms ({args.providers} 个提供者, 每项 {args.runs} 次)")
+    print(f"{'子命令':<20} {'最小(ms)':>9} {'中位(ms)':>9} {'p95(ms)':>9}  重量级导入")
+    for row in rows:
+        print(f"{row['command']:<20} {row['min_s'] * 1000:>9.1f} {row['median_s'] * 1000:>9.1f} "
+              f"{row['p95_s'] * 1000:>9.1f}  {', '.join(row['heavy_imports']) or '-'}")
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump({"interpreter_s": interpreter, "commands": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Config File Watcher
+
+Watches providers.json for outside edits and calls back so the switcher can reload
+them incrementally. Uses Linux inotify on the containing directory (so atomic
+rename-based saves are seen too) and falls back to mtime polling elsewhere.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Callable, Optional, Tuple
+
+# inotify 常量 (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class ConfigWatcher:
+    """配置文件监视器：文件变化后(去抖)在后台线程里调用 on_change"""
+
+    def __init__(self, path: str, on_change: Callable[[], None],
+                 poll_interval: float = 1.0, debounce: float = 0.2):
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._signature = self._stat()
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _check(self):
+        """文件确实变了才回调(inotify 事件可能只是同目录的其他文件)"""
+        signature = self._stat()
+        if signature != self._signature:
+            self._signature = signature
+            try:
+                self.on_change()
+            except Exception as e:
+                print(f"配置变更处理失败: {e}")
+
+    def _open_inotify(self) -> Optional[int]:
+        """创建监视配置文件所在目录的 inotify 描述符，不支持时返回 None"""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return None
+            mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+            if libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), mask) < 0:
+                os.close(fd)
+                return None
+            return fd
+        except (OSError, AttributeError):
+            return None
+
+    def _touches_config(self, data: bytes) -> bool:
+        """事件批次里是否有针对配置文件名的事件"""
+        name = os.path.basename(self.path).encode()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            if data[offset:offset + length].rstrip(b"\0") == name:
+                return True
+            offset += length
+        return False
+
+    def _run_inotify(self, fd: int):
+        try:
+            while not self._stop.is_set():
+                readable, _, _ = select.select([fd], [], [], 0.5)
+                if not readable:
+                    continue
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                if not self._touches_config(data):
+                    continue
+                # 编辑器保存常常是几次连续写入，等一小会儿把它们合并
+                self._stop.wait(self.debounce)
+                try:
+                    os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    pass
+                self._check()
+        finally:
+            os.close(fd)
+
+    def _run_polling(self):
+        while not self._stop.wait(self.poll_interval):
+            self._check()
+
+    def _run(self):
+        fd = self._open_inotify()
+        if fd is None:
+            self._run_polling()
+        else:
+            self._run_inotify(fd)
+
+    def start(self) -> threading.Thread:
+        """在守护线程里开始监视"""
+        self._stop.clear()
+        self._signature = self._stat()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = 2.0):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+            self._thread = None
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Environment Server
+
+Serves the active provider's environment over a per-user Unix socket, so shell hooks
+can pick up a provider switch made elsewhere (GUI, CLI) without sourcing any file.
+Also formats environments as eval-able sh/fish snippets for `provider_cli.py env`.
+
+Protocol: one request line, one response, then the connection closes.
+    env [sh|fish|json] [name]   environment of the given or active provider
+    current                     name of the active provider (empty if none)
+    activate <name>             switch the active provider
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import argparse
+import json
+import os
+import shlex
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+import threading
+from typing import Callable, Dict, Optional
+
+from provider_switch import ANTHROPIC_ENV_VARS, AIProviderSwitcher
+
+SHELL_FORMATS = ("sh", "fish", "json")
+
+
+def _uid() -> int:
+    return os.getuid() if hasattr(os, "getuid") else 0
+
+
+def default_socket_path() -> str:
+    """每个用户一个套接字，放在 XDG_RUNTIME_DIR(没有时为临时目录)下本人专用的 0700 目录里
+
+    临时目录所有人可写，固定的文件名可能被别人抢先占用，所以套接字不能直接放在那里。
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime_dir, f"easy-claude-code-{_uid()}", "env.sock")
+
+
+def is_private(path: str, kind: int) -> bool:
+    """path 是本人所有、类型为 kind(stat.S_IFDIR/S_IFSOCK)、组和其他人无权访问的文件(不跟随符号链接)"""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return (stat.S_IFMT(info.st_mode) == kind and info.st_uid == _uid()
+            and not info.st_mode & (stat.S_IRWXG | stat.S_IRWXO))
+
+
+def ensure_private_dir(directory: str):
+    """创建本人专用的 0700 目录；已存在但不属于本人(或权限过宽)时抛出 OSError"""
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    if not is_private(directory, stat.S_IFDIR):
+        raise OSError(f"{directory} 不是本人专用的目录(需要属于当前用户且权限为 0700)")
+
+
+def is_trusted_socket(path: str) -> bool:
+    """只信任本人专用目录里、由本人创建的套接字；别人放的套接字返回的内容会被 shell eval"""
+    return is_private(os.path.dirname(os.path.abspath(path)), stat.S_IFDIR) and is_private(path, stat.S_IFSOCK)
+
+
+def format_env(env: Dict[str, str], shell: str = "sh") -> str:
+    """把环境变量转成可 eval 的脚本；先清掉旧提供商的变量，避免混用"""
+    if shell == "json":
+        return json.dumps(env, ensure_ascii=False) + "\n"
+    stale = [key for key in ANTHROPIC_ENV_VARS if key not in env]
+    lines = []
+    if shell == "fish":
+        lines += [f"set -e {key};" for key in stale]
+        lines += [f"set -gx {key} {shlex.quote(value)};" for key, value in env.items()]
+    else:
+        if stale:
+            lines.append(f"unset {' '.join(stale)};")
+        lines += [f"export {key}={shlex.quote(value)};" for key, value in env.items()]
+    return "\n".join(lines) + "\n"
+
+
+class EnvRequestHandler(socketserver.StreamRequestHandler):
+    """处理一条请求"""
+
+    def handle(self):
+        line = self.rfile.readline(1024).decode("utf-8", "replace").split()
+        try:
+            response = self.server.env_server.dispatch(line)
+        except Exception as e:
+            response = f"# error: {e}\n"
+        self.wfile.write(response.encode("utf-8"))
+
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class EnvServer:
+    """常驻的环境变量服务：直接读取 switcher 的当前提供商，切换无需任何文件读写"""
+
+    def __init__(self, switcher: AIProviderSwitcher, path: Optional[str] = None,
+                 on_activate: Optional[Callable[[str], None]] = None):
+        self.switcher = switcher
+        self.path = path or default_socket_path()
+        self.on_activate = on_activate
+        self._server: Optional[ThreadingUnixServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def dispatch(self, request) -> str:
+        """执行一条请求，返回响应文本"""
+        command, args = (request[0], request[1:]) if request else ("env", [])
+        if command == "current":
+            return (self.switcher.current_provider or "") + "\n"
+        if command == "env":
+            shell = args[0] if args and args[0] in SHELL_FORMATS else "sh"
+            name = args[1] if len(args) > 1 else self.switcher.current_provider
+            provider = self.switcher.get_provider(name) if name else None
+            if provider is None:
+                # 没有激活的提供商：只清理变量
+                return format_env({}, shell)
+            return format_env(self.switcher.provider_env(provider), shell)
+        if command == "activate" and args:
+            if not self.switcher.activate_provider(args[0]):
+                return f"error 未找到提供者: {args[0]}\n"
+            if self.on_activate:
+                self.on_activate(args[0])
+            return f"ok {args[0]}\n"
+        return f"error 未知请求: {' '.join(request)}\n"
+
+    def start(self) -> bool:
+        """在后台线程里开始监听；平台不支持 Unix 套接字、已有实例在运行或路径不安全时返回 False"""
+        if not hasattr(socket, "AF_UNIX"):
+            return False
+        try:
+            ensure_private_dir(os.path.dirname(os.path.abspath(self.path)))
+            if os.path.lexists(self.path):
+                if query("current", self.path) is not None:
+                    return False  # 另一个实例正在服务
+                os.unlink(self.path)  # 上次异常退出留下的
+            old_umask = os.umask(0o177)  # 套接字只允许本人访问，里面有 API key
+            try:
+                self._server = ThreadingUnixServer(self.path, EnvRequestHandler)
+            finally:
+                os.umask(old_umask)
+        except OSError as e:
+            print(f"环境变量服务无法启动: {e}")
+            return False
+        self._server.env_server = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+def query(request: str, path: Optional[str] = None, timeout: float = 0.5) -> Optional[str]:
+    """向运行中的环境变量服务发一条请求，没有服务或套接字不属于本人时返回 None"""
+    path = path or default_socket_path()
+    if not hasattr(socket, "AF_UNIX") or not is_trusted_socket(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(path)
+            client.sendall(request.encode("utf-8") + b"\n")
+            chunks = []
+            while True:
+                chunk = client.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        return b"".join(chunks).decode("utf-8")
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Easy Claude Code 环境变量服务")
+    parser.add_argument("--config", default="providers.json")
+    parser.add_argument("--socket", help="套接字路径 (默认 $XDG_RUNTIME_DIR/easy-claude-code-<uid>/env.sock)")
+    parser.add_argument("--provider", help="启动时激活的提供者，默认最佳提供者")
+    args = parser.parse_args()
+
+    switcher = AIProviderSwitcher(args.config)
+    initial = args.provider or switcher.get_best_provider()
+    if initial:
+        switcher.activate_provider(initial)
+
+    server = EnvServer(switcher, args.socket)
+    if not server.start():
+        print(f"无法在 {server.path} 启动(已有实例在运行、目录不安全或平台不支持 Unix 套接字)")
+        sys.exit(1)
+    print(f"环境变量服务已启动: {server.path}")
+    print(f'在 shell 中执行: eval "$(printf \'env sh\\n\' | nc -U {server.path})"')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
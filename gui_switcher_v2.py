@@ -6,12 +6,18 @@ Easily switch between different AI providers for Claude Code with a beautiful GU
 
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import asyncio
 import os
-import threading
+import sys
 import json
-from provider_switch import AIProviderSwitcher, ProviderType
-from terminal_launcher import launch_terminal
+from provider_switch import AIProviderSwitcher, CircuitState, ProviderType
+from terminal_launcher import launch_terminal, warm_terminal_cache
+from health_monitor import HealthMonitor
+from config_watcher import ConfigWatcher
+from env_server import EnvServer
+from batch_launcher import BatchLauncher, STRATEGIES
+from async_worker import AsyncWorker
+import profiling
+from profiling import traced
 
 class ProviderEditDialog:
     """提供商编辑对话框"""
@@ -124,7 +130,7 @@ class ProviderEditDialog:
         ttk.Spinbox(advanced_frame, from_=1, to=10, textvariable=self.priority_var, width=38).grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(10, 0), pady=5)
         
         # 最大重试次数
-        ttk.Label(advanced_frame, text="最大重试:").grid(row=1, column=0, sticky=tk.W, pady=5)
+        ttk.Label(advanced_frame, text="最大重试(熔断):").grid(row=1, column=0, sticky=tk.W, pady=5)
         self.max_retries_var = tk.IntVar(value=3)
         ttk.Spinbox(advanced_frame, from_=1, to=10, textvariable=self.max_retries_var, width=38).grid(row=1, column=1, sticky=(tk.W, tk.E), padx=(10, 0), pady=5)
         
@@ -248,7 +254,114 @@ class ProviderEditDialog:
         """获取表单数据"""
         return self.data
 
+class BatchLaunchDialog:
+    """批量启动对话框：选择多个项目，分摊到各个提供商并发启动"""
+    
+    STATUS_TEXT = {"pending": "等待", "launching": "⏳启动中", "ok": "✅已启动", "failed": "❌失败"}
+    STRATEGY_TEXT = {"load": "按负载(计入已启动的会话)", "weight": "按权重"}
+    
+    def __init__(self, parent, switcher, launcher, worker, fast=True):
+        self.switcher = switcher
+        self.launcher = launcher
+        self.worker = worker
+        self.running = False
+        
+        self.dialog = tk.Toplevel(parent)
+        self.dialog.title("批量启动")
+        self.dialog.geometry("900x450")
+        self.dialog.transient(parent)
+        
+        main_frame = ttk.Frame(self.dialog, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(main_frame, text="选择要启动的项目(可多选):").pack(anchor=tk.W)
+        
+        columns = ('project', 'path', 'provider', 'status', 'detail')
+        self.tree = ttk.Treeview(main_frame, columns=columns, show='headings', selectmode='extended', height=12)
+        for column, text, width in (('project', '项目', 140), ('path', '路径', 300), ('provider', '提供商', 140),
+                                    ('status', '状态', 90), ('detail', '终端 / 错误', 200)):
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=width)
+        self.tree.pack(fill=tk.BOTH, expand=True, pady=5)
+        
+        self.projects = {}
+        for project in switcher.project_directories:
+            item = self.tree.insert('', 'end', values=(project.name, project.path, '', '', ''))
+            self.projects[item] = project
+        self.tree.selection_set(list(self.projects))
+        
+        options_frame = ttk.Frame(main_frame)
+        options_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(options_frame, text="分配策略:").pack(side=tk.LEFT)
+        self.strategy_var = tk.StringVar(value=self.STRATEGY_TEXT["load"])
+        ttk.Combobox(options_frame, textvariable=self.strategy_var, state="readonly", width=24,
+                     values=[self.STRATEGY_TEXT[strategy] for strategy in STRATEGIES]).pack(side=tk.LEFT, padx=5)
+        self.fast_var = tk.BooleanVar(value=fast)
+        ttk.Checkbutton(options_frame, text="快速启动", variable=self.fast_var).pack(side=tk.LEFT, padx=10)
+        
+        self.summary_label = ttk.Label(options_frame, text="")
+        self.summary_label.pack(side=tk.LEFT, padx=10)
+        
+        self.start_btn = ttk.Button(options_frame, text="🚀 启动选中项目", command=self.start)
+        self.start_btn.pack(side=tk.RIGHT)
+    
+    def start(self):
+        """分配提供商并在后台并发启动"""
+        if self.running:
+            return
+        items = [item for item in self.tree.selection() if item in self.projects]
+        if not items:
+            messagebox.showwarning("提示", "请至少选择一个项目", parent=self.dialog)
+            return
+        
+        strategy = next(key for key, text in self.STRATEGY_TEXT.items() if text == self.strategy_var.get())
+        sessions = self.launcher.assign([self.projects[item] for item in items], strategy)
+        self.rows = dict(zip((id(session) for session in sessions), items))
+        for session in sessions:
+            self.update_row(session)
+        
+        self.running = True
+        self.start_btn.config(state=tk.DISABLED)
+        # 在共享的工作线程里执行，进度经结果队列回到主线程
+        self.worker.submit_call(
+            self.launcher.launch,
+            sessions,
+            fast=self.fast_var.get(),
+            on_update=lambda session: self.worker.post(self.update_row, session),
+            on_done=self.finish
+        )
+    
+    def update_row(self, session):
+        """刷新单个会话的启动状态"""
+        if not self.dialog.winfo_exists():
+            return
+        item = self.rows.get(id(session))
+        if item is None or not self.tree.exists(item):
+            return
+        detail = session.error or (f"{session.terminal} ({session.elapsed * 1000:.0f}ms)" if session.terminal else "")
+        self.tree.item(item, values=(session.project_name, session.path, session.provider or '-',
+                                     self.STATUS_TEXT.get(session.status, session.status), detail))
+    
+    def finish(self, sessions):
+        """全部启动完成后汇总"""
+        if not self.dialog.winfo_exists():
+            return
+        self.running = False
+        self.start_btn.config(state=tk.NORMAL)
+        ok = sum(1 for session in sessions if session.status == "ok")
+        counts = {}
+        for session in sessions:
+            if session.status == "ok":
+                counts[session.provider] = counts.get(session.provider, 0) + 1
+        spread = ", ".join(f"{name}×{count}" for name, count in counts.items())
+        self.summary_label.config(text=f"成功 {ok}/{len(sessions)}  {spread}")
+
 class AIProviderGUI_V2:
+    # 健康状态更新合并后再重绘，最多每秒 4 次
+    REFRESH_INTERVAL_MS = 250
+    # 主线程取回后台结果的间隔
+    POLL_INTERVAL_MS = 50
+    
     def __init__(self, config_file="providers.json"):
         self.root = tk.Tk()
         self.root.title("Easy Claude Code - AI Provider Switcher")
@@ -258,16 +371,53 @@ class AIProviderGUI_V2:
         self.setup_theme()
         
         self.switcher = AIProviderSwitcher(config_file)
+        self.batch_launcher = BatchLauncher(self.switcher)
+        
+        # 提供商列表的增量刷新状态
+        self._rows = {}               # 名称 -> 当前显示的 (图标, 值)
+        self._offscreen_rows = set()  # 不在可见区域、等滚动到时再渲染的行
+        self._pending_rows = set()    # 等待合并刷新的行，None 表示全部
+        self._refresh_scheduled = False
+        self._shown_current = None
+        self._shown_env = None
         
         # 创建主界面
         self.create_widgets()
         
         # 加载配置并刷新显示
         self.update_provider_list()
+        self.update_env_display()
         self.refresh_projects()
         
-        # 启动时自动检查提供商健康状态
-        self.root.after(100, self.check_providers_health)
+        # 后台预先检测可用终端，点击启动时直接打开
+        warm_terminal_cache()
+        
+        # 所有后台异步工作共用的事件循环线程；结果经队列回到主线程，共享同一个连接池
+        self.worker = AsyncWorker(on_shutdown=self.switcher.close)
+        self.worker.start()
+        self.root.after(self.POLL_INTERVAL_MS, self.poll_worker)
+        
+        # 启动后台健康监控，持续按自适应节奏探测各提供商
+        self.health_monitor = HealthMonitor(
+            self.switcher,
+            on_update=lambda status: self.worker.post(self.schedule_refresh, status.provider_name)
+        )
+        self.monitor_task = self.worker.submit(self.health_monitor.run(close_session=False))
+        
+        # 监视配置文件，外部编辑后增量重载
+        self.config_watcher = ConfigWatcher(
+            config_file,
+            on_change=lambda: self.worker.post(self.reload_config)
+        )
+        self.config_watcher.start()
+        
+        # 供 shell 钩子查询当前提供商的环境变量，切换后新开的 shell 立即生效
+        self.env_server = EnvServer(
+            self.switcher,
+            on_activate=lambda name: self.worker.post(self.schedule_refresh)
+        )
+        self.env_server.start()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
     
     def setup_theme(self):
         """设置主题样式"""
@@ -319,7 +469,8 @@ class AIProviderGUI_V2:
         provider_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         
         # 创建Treeview
-        columns = ('name', 'type', 'model', 'status', 'response_time', 'priority')
+        columns = ('name', 'type', 'model', 'status', 'response_time', 'p95', 'error_rate',
+                   'dns', 'connect', 'tls', 'ttfb', 'priority')
         self.provider_tree = ttk.Treeview(provider_frame, columns=columns, show='tree headings', height=10)
         
         # 配置列
@@ -341,12 +492,30 @@ class AIProviderGUI_V2:
         self.provider_tree.heading('response_time', text='响应时间')
         self.provider_tree.column('response_time', width=80)
         
+        self.provider_tree.heading('p95', text='P95')
+        self.provider_tree.column('p95', width=70)
+        
+        self.provider_tree.heading('error_rate', text='错误率')
+        self.provider_tree.column('error_rate', width=60)
+        
+        # 各请求阶段的中位耗时，判断慢在 DNS、连接、TLS 还是服务端
+        for column, text in (('dns', 'DNS'), ('connect', '连接'), ('tls', 'TLS'), ('ttfb', '首字节')):
+            self.provider_tree.heading(column, text=text)
+            self.provider_tree.column(column, width=55)
+        
         self.provider_tree.heading('priority', text='优先级')
         self.provider_tree.column('priority', width=60)
         
         # 添加滚动条
         scrollbar = ttk.Scrollbar(provider_frame, orient="vertical", command=self.provider_tree.yview)
-        self.provider_tree.configure(yscrollcommand=scrollbar.set)
+        
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            # 滚动后补画刚进入可见区域的行
+            if self._offscreen_rows:
+                self.render_visible_rows()
+        
+        self.provider_tree.configure(yscrollcommand=on_scroll)
         
         # 布局
         self.provider_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -443,10 +612,17 @@ class AIProviderGUI_V2:
         full_auto_check = ttk.Checkbutton(options_frame, text="完全自动化(直接可用claude)", variable=self.full_auto_mode)
         full_auto_check.grid(row=1, column=0, sticky=tk.W, pady=2)
         
+        self.fast_launch = tk.BooleanVar(value=True)
+        fast_check = ttk.Checkbutton(options_frame, text="快速启动(复用 Node/claude 环境快照)", variable=self.fast_launch)
+        fast_check.grid(row=2, column=0, sticky=tk.W, pady=2)
+        
         # 启动按钮
         launch_btn = ttk.Button(terminal_frame, text="🚀 一键启动", command=self.launch_terminal)
         launch_btn.grid(row=2, column=0, sticky=(tk.W, tk.E))
         
+        batch_btn = ttk.Button(terminal_frame, text="📚 批量启动多个项目", command=self.open_batch_launch)
+        batch_btn.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=(5, 0))
+        
         # 配置权重
         project_select_frame.columnconfigure(1, weight=1)
         project_frame.columnconfigure(0, weight=1)
@@ -521,6 +697,7 @@ class AIProviderGUI_V2:
         # 触发路径显示更新
         self.on_project_changed(None)
     
+    @traced("gui.launch_terminal", "launch")
     def launch_terminal(self):
         """一键启动：自动激活选中提供商并启动终端"""
         command = self.terminal_command.get().strip()
@@ -555,7 +732,6 @@ class AIProviderGUI_V2:
                 
                 # 更新界面显示
                 self.update_provider_list()
-                self.update_env_display()
                 
                 print(f"✅ 提供商 {selected_provider} 已自动激活")
                 
@@ -563,7 +739,7 @@ class AIProviderGUI_V2:
                 env = os.environ.copy()
                 
                 # 获取当前提供商配置（用于自定义头部处理）
-                provider = next((p for p in self.switcher.providers if p.name == self.switcher.current_provider), None)
+                provider = self.switcher.get_provider(self.switcher.current_provider)
                 if provider and provider.custom_headers:
                     for key, value in provider.custom_headers.items():
                         env_var_name = f"ANTHROPIC_CUSTOM_HEADERS_{key.replace('-', '_').upper()}"
@@ -572,12 +748,14 @@ class AIProviderGUI_V2:
                 # 检查是否启用完全自动化
                 if self.full_auto_mode.get():
                     # 完全自动化模式：直接启动claude
-                    success, terminal_name, error = launch_terminal(
-                        command=None,
-                        env=env,
-                        working_dir=project_dir,
-                        auto_claude=True
-                    )
+                    def describe(terminal_name):
+                        info_msg = f"🎉 一键启动成功!\n📱 终端: {terminal_name}\n🔄 已自动激活: {selected_provider}\n🚀 Claude命令将自动执行\n💡 执行完成后终端保持打开以便继续工作"
+                        if project_dir:
+                            info_msg += f"\n📁 项目目录: {project_dir}"
+                        return info_msg
+                    
+                    self.start_launch("启动成功", describe, None, env=env, working_dir=project_dir,
+                                      auto_claude=True, fast=self.fast_launch.get())
                 else:
                     # 准备启动命令
                     welcome_msg = f'''echo "🎉 Claude Code 环境已就绪"
@@ -585,91 +763,205 @@ echo "当前提供商: {selected_provider}"
 echo "可以直接使用 {command} 命令"
 echo'''
                     
-                    # 使用新的终端启动器
-                    success, terminal_name, error = launch_terminal(
-                        welcome_msg,
-                        env=env,
-                        working_dir=project_dir
-                    )
-                
-                if success:
-                    if self.full_auto_mode.get():
-                        info_msg = f"🎉 一键启动成功!\n📱 终端: {terminal_name}\n🔄 已自动激活: {selected_provider}\n🚀 Claude命令将自动执行\n💡 执行完成后终端保持打开以便继续工作"
-                    else:
+                    def describe(terminal_name):
                         info_msg = f"🎉 一键启动成功!\n📱 终端: {terminal_name}\n🔄 已自动激活: {selected_provider}\n📝 命令: {command}"
+                        if project_dir:
+                            info_msg += f"\n📁 项目目录: {project_dir}"
+                        return info_msg
                     
-                    if project_dir:
-                        info_msg += f"\n📁 项目目录: {project_dir}"
-                    messagebox.showinfo("启动成功", info_msg)
-                else:
-                    messagebox.showerror("错误", f"终端启动失败: {error}")
-                    return
+                    self.start_launch("启动成功", describe, welcome_msg, env=env, working_dir=project_dir)
             else:
                 # 普通启动
                 launch_cmd = f'echo "终端已启动"\necho "可以使用 {command} 命令"'
                 
-                success, terminal_name, error = launch_terminal(
-                    launch_cmd,
-                    working_dir=project_dir
-                )
-                
-                if success:
+                def describe(terminal_name):
                     info_msg = f"已启动终端: {terminal_name}\n命令: {command}"
                     if project_dir:
                         info_msg += f"\n项目目录: {project_dir}"
-                    messagebox.showinfo("成功", info_msg)
-                else:
-                    messagebox.showerror("错误", f"终端启动失败: {error}")
-                    return
+                    return info_msg
+                
+                self.start_launch("成功", describe, launch_cmd, working_dir=project_dir)
         
         except Exception as e:
             messagebox.showerror("错误", f"启动终端失败: {str(e)}")
     
-    def update_provider_list(self):
-        """更新提供商列表显示"""
-        # 清空现有项目
-        for item in self.provider_tree.get_children():
-            self.provider_tree.delete(item)
+    def start_launch(self, title, describe, *args, **kwargs):
+        """在工作线程里启动终端(首次可能要采集环境快照)，不阻塞界面；完成后在主线程提示"""
+        def done(result):
+            success, terminal_name, error = result
+            if success:
+                messagebox.showinfo(title, describe(terminal_name))
+            else:
+                messagebox.showerror("错误", f"终端启动失败: {error}")
         
-        # 添加提供商
-        for provider in self.switcher.providers:
-            health = self.switcher.health_status.get(provider.name)
-            
-            if health:
-                status = "✅正常" if health.is_healthy else "❌故障"
-                response_time = f"{health.response_time:.2f}s" if health.response_time != float('inf') else "超时"
+        self.worker.submit_call(
+            launch_terminal, *args,
+            on_done=done,
+            on_error=lambda e: messagebox.showerror("错误", f"启动终端失败: {str(e)}"),
+            **kwargs
+        )
+    
+    def open_batch_launch(self):
+        """打开批量启动对话框"""
+        if not self.switcher.project_directories:
+            messagebox.showwarning("提示", "请先在配置中添加项目目录")
+            return
+        BatchLaunchDialog(self.root, self.switcher, self.batch_launcher, self.worker, fast=self.fast_launch.get())
+    
+    def poll_worker(self):
+        """定时取回后台任务的结果和通知，在主线程执行"""
+        self.worker.poll()
+        self.root.after(self.POLL_INTERVAL_MS, self.poll_worker)
+    
+    def schedule_refresh(self, name=None):
+        """登记需要刷新的提供商(None 表示全部)，合并后统一重绘；后台线程经 worker.post 调用"""
+        if name is None or self._pending_rows is None:
+            self._pending_rows = None
+        else:
+            self._pending_rows.add(name)
+        if not self._refresh_scheduled:
+            self._refresh_scheduled = True
+            self.root.after(self.REFRESH_INTERVAL_MS, self.flush_refresh)
+    
+    def flush_refresh(self):
+        """执行合并后的刷新"""
+        names, self._pending_rows = self._pending_rows, set()
+        self._refresh_scheduled = False
+        self.update_provider_list(names)
+    
+    def provider_row(self, provider):
+        """一个提供商在列表中显示的 (图标, 值)"""
+        health = self.switcher.health_status.get(provider.name)
+        
+        if health and health.last_check:
+            status = "✅正常" if health.is_healthy else "❌故障"
+            response_time = f"{health.response_time:.2f}s" if health.response_time != float('inf') else "超时"
+            if health.stale:
+                # 上次运行缓存下来的结果，等待新的探测刷新
+                status += "(缓存)"
+        else:
+            status = "未检测"
+            response_time = "N/A"
+        
+        # 熔断状态优先显示
+        breaker = self.switcher.circuit_breakers.get(provider.name)
+        if breaker and breaker.state == CircuitState.OPEN:
+            status = "⛔熔断"
+        elif breaker and breaker.state == CircuitState.HALF_OPEN:
+            status = "🟡试探"
+        
+        # 最近一段时间的延迟统计
+        stats = self.switcher.get_latency_stats(provider.name)
+        if stats:
+            p95 = f"{stats.p95:.2f}s" if stats.p95 != float('inf') else "超时"
+            error_rate = f"{stats.error_rate:.0%}"
+        else:
+            p95 = "N/A"
+            error_rate = "N/A"
+        
+        # 各阶段中位耗时；复用连接时没有 DNS/连接/TLS 样本
+        phases = self.switcher.get_phase_stats(provider.name)
+        phase_columns = tuple(
+            f"{phases[phase] * 1000:.0f}ms" if phase in phases else "-"
+            for phase in ('dns', 'connect', 'tls', 'ttfb')
+        )
+        
+        # 标记当前激活的提供商
+        icon = "🔹" if provider.name == self.switcher.current_provider else ""
+        
+        return icon, (
+            provider.name,
+            provider.type.value,
+            provider.model,
+            status,
+            response_time,
+            p95,
+            error_rate,
+            *phase_columns,
+            provider.priority
+        )
+    
+    def sync_provider_rows(self):
+        """让列表的行与配置中的提供商一一对应(行 id 即提供商名称)，返回新增的行"""
+        names = [provider.name for provider in self.switcher.providers]
+        if list(self.provider_tree.get_children()) == names:
+            return set()
+        
+        wanted = set(names)
+        for name in list(self._rows):
+            if name not in wanted:
+                self.provider_tree.delete(name)
+                del self._rows[name]
+                self._offscreen_rows.discard(name)
+        
+        added = set()
+        for index, name in enumerate(names):
+            if name in self._rows:
+                self.provider_tree.move(name, '', index)
             else:
-                status = "未检测"
-                response_time = "N/A"
-            
-            # 标记当前激活的提供商
-            icon = "🔹" if provider.name == self.switcher.current_provider else ""
-            
-            self.provider_tree.insert('', 'end', text=icon, values=(
-                provider.name,
-                provider.type.value,
-                provider.model,
-                status,
-                response_time,
-                provider.priority
-            ))
-        
-        # 更新当前状态
-        current = self.switcher.current_provider or "未激活"
-        self.current_provider_label.config(text=f"当前激活: {current}")
-        
-        # 更新环境变量显示
-        self.update_env_display()
+                # 先插入只有名称的占位行，可见时再渲染完整内容；ttk.Treeview 没有虚拟模式，
+                # 每个提供商仍占一行(滚动条才准确)，省下的是行内容的计算和重绘
+                self.provider_tree.insert('', index, iid=name, text='', values=(name,))
+                self._rows[name] = None
+                added.add(name)
+        return added
+    
+    def visible_rows(self):
+        """当前滚动位置下可见的行"""
+        children = self.provider_tree.get_children()
+        if not children:
+            return set()
+        first, last = self.provider_tree.yview()
+        start = max(int(first * len(children)) - 1, 0)
+        end = min(int(last * len(children)) + 2, len(children))
+        return set(children[start:end])
+    
+    def render_rows(self, names):
+        """重绘指定的行；不可见的行只做标记，滚动到时再画"""
+        if not names:
+            return
+        visible = self.visible_rows()
+        for name in names:
+            if name not in visible:
+                self._offscreen_rows.add(name)
+                continue
+            self._offscreen_rows.discard(name)
+            provider = self.switcher.get_provider(name)
+            if provider is None or name not in self._rows:
+                continue
+            row = self.provider_row(provider)
+            if row != self._rows[name]:
+                self.provider_tree.item(name, text=row[0], values=row[1])
+                self._rows[name] = row
+    
+    def render_visible_rows(self):
+        """补画已进入可见区域、之前被跳过的行"""
+        self.render_rows(self._offscreen_rows & self.visible_rows())
+    
+    @traced("update_provider_list", "gui")
+    def update_provider_list(self, names=None):
+        """更新提供商列表显示：只重绘 names 中(None 表示全部)内容有变化的可见行"""
+        added = self.sync_provider_rows()
+        dirty = set(self._rows) if names is None else (set(names) & set(self._rows)) | added
+        
+        # 激活的提供商变了：新旧两行的图标都要更新
+        current = self.switcher.current_provider
+        if current != self._shown_current:
+            dirty.update(name for name in (current, self._shown_current) if name in self._rows)
+            self._shown_current = current
+            self.current_provider_label.config(text=f"当前激活: {current or '未激活'}")
+            self.update_env_display()
+        
+        self.render_rows(dirty)
     
     def update_env_display(self):
-        """更新环境变量显示"""
-        self.env_display.delete(1.0, tk.END)
-        
-        env_vars = {}
-        for key, value in os.environ.items():
-            if key.startswith("ANTHROPIC_"):
-                env_vars[key] = value
+        """更新环境变量显示；内容没变时不重写文本框"""
+        env_vars = {key: value for key, value in os.environ.items() if key.startswith("ANTHROPIC_")}
+        if env_vars == self._shown_env:
+            return
+        self._shown_env = env_vars
         
+        self.env_display.delete(1.0, tk.END)
         if env_vars:
             for key, value in sorted(env_vars.items()):
                 self.env_display.insert(tk.END, f"{key}={value}\n")
@@ -677,19 +969,9 @@ echo'''
             self.env_display.insert(tk.END, "当前未设置ANTHROPIC相关环境变量")
     
     def check_providers_health(self):
-        """异步检查提供商健康状态"""
-        def run_health_check():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                loop.run_until_complete(self.switcher.check_all_providers())
-                # 在主线程中更新UI
-                self.root.after(0, self.update_provider_list)
-            finally:
-                loop.close()
-        
-        # 在后台线程中运行
-        threading.Thread(target=run_health_check, daemon=True).start()
+        """立即重新检查所有提供商健康状态"""
+        # 探测在后台监控线程中进行，结果通过 on_update 回调刷新界面
+        self.health_monitor.trigger()
     
     def activate_selected(self):
         """激活选中的提供商"""
@@ -730,7 +1012,7 @@ echo'''
         provider_name = item['values'][0]
         
         # 获取当前提供商数据
-        provider = next((p for p in self.switcher.providers if p.name == provider_name), None)
+        provider = self.switcher.get_provider(provider_name)
         if not provider:
             messagebox.showerror("错误", "找不到选中的提供商")
             return
@@ -743,6 +1025,9 @@ echo'''
             success = self.switcher.update_provider(provider_name, **updates)
             if success:
                 messagebox.showinfo("成功", f"已更新提供商: {provider_name}")
+                if not self.switcher.health_status[provider_name].last_check:
+                    # 端点变化后健康状态已清空，立即重新探测
+                    self.health_monitor.trigger([provider_name])
                 self.update_provider_list()
             else:
                 messagebox.showerror("错误", "更新提供商失败")
@@ -766,12 +1051,33 @@ echo'''
             else:
                 messagebox.showerror("错误", "删除提供商失败")
     
+    def reload_config(self):
+        """配置文件被外部修改：只更新变化的提供商，并只重新探测它们"""
+        changes = self.switcher.reload_config()
+        if not changes:
+            return
+        if changes.reprobe:
+            self.health_monitor.trigger(changes.reprobe)
+        self.update_provider_list()
+        self.refresh_projects()
+    
+    def on_close(self):
+        """关闭窗口：先停止后台监控和配置监视再退出"""
+        self.config_watcher.stop()
+        self.env_server.stop()
+        self.health_monitor.stop()
+        # 取消监控等未完成的任务，关闭共享会话(同时保存配置和健康缓存)
+        self.worker.stop()
+        self.switcher.flush_config()
+        self.root.destroy()
+    
     def run(self):
         """运行GUI"""
         self.root.mainloop()
 
 def main():
-    """主函数"""
+    """主函数；--profile[=trace.json] 记录性能追踪"""
+    profiling.enable_from_argv(sys.argv)
     app = AIProviderGUI_V2()
     app.run()
 
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Background Health Monitor
+
+Long-running health monitor that re-probes each provider on its own adaptive schedule.
+Healthy and stable providers are probed less often, failing providers back off
+exponentially, and every delay is jittered so probes never burst together. Providers
+that share a probe origin (same endpoint, different keys or models) share each
+liveness result, so an origin is probed about once per interval however many
+entries point at it.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import argparse
+import asyncio
+import heapq
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from provider_switch import AIProviderSwitcher, HealthStatus, ProviderConfig
+
+# 退避指数的上限：间隔早已被 *_max_interval 截断，再大的指数只会让 2 ** n 转 float 时溢出
+MAX_BACKOFF_EXPONENT = 32
+
+
+@dataclass
+class MonitorConfig:
+    """探测调度参数(秒)"""
+    healthy_interval: float = 60.0     # 健康提供商的基础探测间隔
+    healthy_max_interval: float = 600.0  # 结果一直稳定时最多拉长到的间隔
+    failure_interval: float = 10.0     # 故障提供商第一次重试的间隔
+    failure_max_interval: float = 900.0  # 故障退避的上限
+    jitter: float = 0.2                # 间隔的随机抖动比例 (±20%)
+    max_concurrent: int = 8            # 同一时刻最多并发的探测数
+    deep_interval: float = 0.0         # 深度(推理)探测间隔，0 表示关闭；会产生少量 token 消耗
+    save_interval: float = 30.0        # 健康缓存落盘间隔
+    metrics_textfile: str = ""         # 每次落盘时同时写出的 Prometheus 文本文件(供 node_exporter 读取)
+
+
+@dataclass
+class ProbeSchedule:
+    """单个提供商的调度状态"""
+    provider_name: str
+    next_due: float = 0.0
+    interval: float = 0.0
+    consecutive_failures: int = 0
+    stable_rounds: int = 0
+    next_deep_due: float = 0.0
+
+
+class HealthMonitor:
+    """后台健康监控器：按提供商各自的节奏持续探测"""
+
+    def __init__(self, switcher: AIProviderSwitcher, config: Optional[MonitorConfig] = None,
+                 on_update: Optional[Callable[[HealthStatus], None]] = None):
+        self.switcher = switcher
+        self.config = config or MonitorConfig()
+        if self.config.deep_interval > 0:
+            # 深度探测失败的结果一直有效到下一次深度探测(间隔带抖动)
+            switcher.inference_failure_ttl = self.config.deep_interval * (1 + self.config.jitter)
+        self.on_update = on_update
+        self.schedules: Dict[str, ProbeSchedule] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._probing = set()
+        self._own_probe = set()   # 同源探测结果取决于密钥，下一次必须单独探测的提供商
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def _jittered(self, interval: float) -> float:
+        """给间隔加上随机抖动，避免所有探测在同一时刻触发"""
+        spread = interval * self.config.jitter
+        return max(0.0, interval + random.uniform(-spread, spread))
+
+    def _next_interval(self, schedule: ProbeSchedule, previous: Optional[HealthStatus],
+                       status: HealthStatus) -> float:
+        """根据本次结果计算下一次探测间隔"""
+        if not status.is_healthy:
+            # 故障：指数退避
+            schedule.consecutive_failures += 1
+            schedule.stable_rounds = 0
+            return self._backoff(self.config.failure_interval, schedule.consecutive_failures - 1,
+                                 self.config.failure_max_interval)
+
+        schedule.consecutive_failures = 0
+        if previous is not None and previous.is_healthy:
+            # 结果与上次一致，说明这次探测没带来新信息，逐步拉长间隔
+            schedule.stable_rounds += 1
+        else:
+            schedule.stable_rounds = 0
+        return self._backoff(self.config.healthy_interval, schedule.stable_rounds,
+                             self.config.healthy_max_interval)
+
+    @staticmethod
+    def _backoff(base: float, rounds: int, ceiling: float) -> float:
+        """base * 2^rounds，不超过 ceiling；运行再久也不会溢出"""
+        return min(base * 2 ** min(rounds, MAX_BACKOFF_EXPONENT), ceiling)
+
+    def _sync_schedules(self):
+        """与提供商列表同步：新增的立即探测，删除的丢弃"""
+        names = {provider.name for provider in self.switcher.providers}
+        now = time.monotonic()
+
+        for name in names - self.schedules.keys():
+            schedule = ProbeSchedule(provider_name=name, next_due=now)
+            self.schedules[name] = schedule
+            heapq.heappush(self._heap, (schedule.next_due, name))
+
+        for name in self.schedules.keys() - names:
+            del self.schedules[name]
+            self._own_probe.discard(name)
+
+    def _pop_due(self, now: float) -> List[str]:
+        """取出所有已到期的提供商"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            next_due, name = heapq.heappop(self._heap)
+            schedule = self.schedules.get(name)
+            # 堆里可能残留已删除或已被重新调度的旧条目；正在探测的等它自己重新排期
+            if schedule is None or schedule.next_due != next_due or name in self._probing:
+                continue
+            due.append(name)
+        return due
+
+    def _group_by_origin(self, names: List[str]) -> List[List[str]]:
+        """把同时到期的提供商按探测源分组，每组只发一次探测"""
+        groups: Dict[Tuple, List[str]] = {}
+        for name in names:
+            provider = self.switcher.get_provider(name)
+            if provider is None or name in self._own_probe or self.switcher.needs_own_probe(name):
+                self._own_probe.discard(name)
+                groups[(name,)] = [name]
+            else:
+                groups.setdefault(self.switcher.probe_origin(provider), []).append(name)
+        return list(groups.values())
+
+    def _reschedule(self, schedule: ProbeSchedule, previous: Optional[HealthStatus], status: HealthStatus,
+                    not_before: float = 0.0):
+        schedule.interval = self._next_interval(schedule, previous, status)
+        schedule.next_due = max(time.monotonic() + self._jittered(schedule.interval), not_before)
+        heapq.heappush(self._heap, (schedule.next_due, schedule.provider_name))
+        # 主循环可能正按旧的堆顶时间睡眠，唤醒它重新计算
+        self._wakeup.set()
+
+    def _previous_status(self, name: str) -> Optional[HealthStatus]:
+        previous = self.switcher.health_status.get(name)
+        if previous is not None and previous.last_check == 0:
+            return None  # 从未探测过
+        return previous
+
+    async def _probe(self, name: str, semaphore: asyncio.Semaphore, followers: List[str] = ()):
+        """探测单个提供商并重新排期；结果共享给同源的提供商(followers 是同批到期的同源提供商)"""
+        provider = self.switcher.get_provider(name)
+        schedule = self.schedules.get(name)
+        if provider is None or schedule is None:
+            return
+
+        breaker = self.switcher.get_circuit(name)
+        if not breaker.allow_request():
+            # 熔断中，等冷却结束(进入半开)后再用探测做试探
+            schedule.next_due = time.monotonic() + self._jittered(max(breaker.retry_after(), 1.0))
+            heapq.heappush(self._heap, (schedule.next_due, name))
+            self._wakeup.set()
+            return
+
+        self._probing.update((name, *followers))
+        try:
+            async with semaphore:
+                status = await self.switcher.check_provider_health(provider)
+        finally:
+            self._probing.difference_update((name, *followers))
+
+        await self._apply(provider, schedule, status, semaphore)
+        if not self.switcher.can_share(status):
+            # 结果取决于密钥：同批到期的同源提供商放回队列，各自用自己的密钥探测
+            now = time.monotonic()
+            for follower in followers:
+                follower_schedule = self.schedules.get(follower)
+                if follower_schedule is not None:
+                    # next_due 要一起更新，否则 _pop_due 会把这个条目当作过期条目丢弃
+                    follower_schedule.next_due = now
+                    heapq.heappush(self._heap, (now, follower))
+                    self._own_probe.add(follower)
+            self._wakeup.set()
+            return
+
+        # 同源的其他提供商直接沿用这次结果；排在本提供商之后，下一次仍由它代表整个源探测
+        shared = []
+        for sibling_name in self.switcher.origin_siblings(provider):
+            sibling = self.switcher.get_provider(sibling_name)
+            sibling_schedule = self.schedules.get(sibling_name)
+            if (sibling is None or sibling_schedule is None or sibling_name in self._probing
+                    or self.switcher.needs_own_probe(sibling_name)):
+                continue
+            shared.append(self._apply(sibling, sibling_schedule, self.switcher.shared_status(status, sibling_name),
+                                      semaphore, not_before=schedule.next_due))
+        await asyncio.gather(*shared)
+
+    async def _probe_group(self, names: List[str], semaphore: asyncio.Semaphore):
+        """_probe 的外层：探测中出现意外异常时也要重新排期，否则这些提供商再也不会被探测"""
+        try:
+            await self._probe(names[0], semaphore, names[1:])
+        except Exception as e:
+            print(f"探测 {names[0]} 时出错: {e!r}")
+            now = time.monotonic()
+            for name in names:
+                schedule = self.schedules.get(name)
+                if schedule is None:
+                    continue
+                schedule.next_due = now + self._jittered(max(schedule.interval, self.config.failure_interval))
+                heapq.heappush(self._heap, (schedule.next_due, name))
+            self._wakeup.set()
+
+    async def _apply(self, provider: ProviderConfig, schedule: ProbeSchedule, status: HealthStatus,
+                     semaphore: asyncio.Semaphore, not_before: float = 0.0):
+        """记录存活探测结果，按需附带深度探测，然后重新排期"""
+        previous = self._previous_status(provider.name)
+        self.switcher.record_health(status)
+
+        if status.is_healthy and self.config.deep_interval > 0 and time.monotonic() >= schedule.next_deep_due:
+            status = await self._deep_probe(provider, schedule, semaphore)
+
+        self._reschedule(schedule, previous, status, not_before)
+        if self.on_update:
+            self.on_update(status)
+
+    async def _deep_probe(self, provider: ProviderConfig, schedule: ProbeSchedule,
+                          semaphore: asyncio.Semaphore) -> HealthStatus:
+        """存活检查通过后，按更长的间隔附带一次深度探测"""
+        self._probing.add(provider.name)
+        try:
+            async with semaphore:
+                result = await self.switcher.check_provider_inference(provider)
+        finally:
+            self._probing.discard(provider.name)
+        self.switcher.record_inference(result)
+        schedule.next_deep_due = time.monotonic() + self._jittered(self.config.deep_interval)
+        return self.switcher.health_status[provider.name]
+
+    async def run(self, close_session: bool = True):
+        """监控主循环，直到 stop() 被调用或任务被取消
+
+        与其他任务共用事件循环(例如 GUI 的 AsyncWorker)时传 close_session=False，
+        由循环的所有者负责关闭共享的 HTTP 会话。
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        semaphore = asyncio.Semaphore(self.config.max_concurrent)
+        in_flight = set()
+        next_save = time.monotonic() + self.config.save_interval
+
+        try:
+            while not self._stopping:
+                self._sync_schedules()
+                if time.monotonic() >= next_save:
+                    self.switcher.save_health()
+                    if self.config.metrics_textfile:
+                        self.write_metrics()
+                    next_save = time.monotonic() + self.config.save_interval
+                for names in self._group_by_origin(self._pop_due(time.monotonic())):
+                    task = asyncio.create_task(self._probe_group(names, semaphore))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+
+                # 睡到下一个到期时间，或者被 trigger()/stop() 唤醒
+                wake_at = min(self._heap[0][0], next_save) if self._heap else next_save
+                timeout = wake_at - time.monotonic()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+            if close_session:
+                await self.switcher.close()
+
+    def write_metrics(self):
+        """写出指标文本文件；写失败只打印，不影响监控"""
+        try:
+            self.switcher.metrics.write_textfile(self.config.metrics_textfile)
+        except OSError as e:
+            print(f"写入指标文件失败: {e}")
+
+    def _call_in_loop(self, callback: Callable[[], None]):
+        """把回调投递到监控所在的事件循环"""
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            self._loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            pass  # 循环恰好在此刻关闭
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._call_in_loop(self._wakeup.set)
+
+    def trigger(self, provider_names: Optional[List[str]] = None):
+        """立即重新探测指定提供商(默认全部)，可从任意线程调用"""
+        def reschedule():
+            # 先同步一次，刚加入(例如配置热重载)的提供商也能被触发
+            self._sync_schedules()
+            now = time.monotonic()
+            for name in provider_names or list(self.schedules):
+                schedule = self.schedules.get(name)
+                if schedule is None:
+                    continue
+                schedule.next_due = now
+                heapq.heappush(self._heap, (now, name))
+            self._wakeup.set()
+
+        self._call_in_loop(reschedule)
+
+    def start_in_thread(self) -> threading.Thread:
+        """在独立线程的事件循环里运行监控"""
+        self._stopping = False
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.run()), daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        """停止监控并等待后台线程退出"""
+        self._stopping = True
+        self._wake()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+            self._thread = None
+
+
+async def main():
+    """持续监控并打印状态变化"""
+    parser = argparse.ArgumentParser(description="Easy Claude Code 后台健康监控")
+    parser.add_argument("--deep-interval", type=float, default=0.0,
+                        help="深度(推理)探测间隔秒数，0 表示只做存活检查")
+    parser.add_argument("--metrics-port", type=int, help="在 127.0.0.1 的该端口提供 /metrics")
+    parser.add_argument("--metrics-textfile", default="", help="定期写出 Prometheus 文本文件 (*.prom)")
+    args = parser.parse_args()
+
+    switcher = AIProviderSwitcher()
+    if args.metrics_port:
+        from metrics import MetricsServer
+        server = MetricsServer(switcher.metrics, port=args.metrics_port)
+        server.start()
+        print(f"指标: http://127.0.0.1:{server.port}/metrics")
+
+    def report(status: HealthStatus):
+        state = "✅ 正常" if status.is_healthy else "❌ 故障"
+        schedule = monitor.schedules.get(status.provider_name)
+        interval = f"{schedule.interval:.0f}s" if schedule else "-"
+        print(f"[{time.strftime('%H:%M:%S')}] {status.provider_name}: {state} "
+              f"({status.response_time:.2f}s, 下次间隔 ~{interval})")
+
+    config = MonitorConfig(deep_interval=args.deep_interval, metrics_textfile=args.metrics_textfile)
+    monitor = HealthMonitor(switcher, config, on_update=report)
+    print("正在持续监控提供者健康状态 (Ctrl+C 退出)...")
+    await monitor.run()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Persistent Health Store
+
+Keeps the last known health results, rolling latency histories and circuit-breaker
+state in a small SQLite file next to the provider config, so a fresh start can rank
+providers immediately while new probes run in the background. Each table holds one row
+per provider (INSERT OR REPLACE), so the file stays bounded and never needs compaction.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Tuple
+
+SCHEMA_VERSION = 1
+DEFAULT_MAX_AGE = 6 * 3600  # 超过这个时间(秒)的缓存结果不再加载
+PHASE_PREFIX = "phase:"     # 各请求阶段的历史在 history 表里的 kind 前缀
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS health (
+    provider_name TEXT PRIMARY KEY,
+    is_healthy INTEGER NOT NULL,
+    response_time REAL NOT NULL,
+    last_check REAL NOT NULL,
+    error_message TEXT
+);
+CREATE TABLE IF NOT EXISTS history (
+    provider_name TEXT NOT NULL,
+    kind TEXT NOT NULL,              -- latency / ttft / phase:<dns|connect|tls|send|ttfb>
+    latencies BLOB NOT NULL,
+    outcomes BLOB NOT NULL,
+    ring_index INTEGER NOT NULL,
+    ring_count INTEGER NOT NULL,
+    ewma REAL NOT NULL,
+    PRIMARY KEY (provider_name, kind)
+);
+CREATE TABLE IF NOT EXISTS circuit (
+    provider_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    consecutive_failures INTEGER NOT NULL,
+    opened_at REAL NOT NULL          -- 墙上时间，加载时换算回单调时钟
+);
+CREATE TABLE IF NOT EXISTS inference (
+    provider_name TEXT PRIMARY KEY,
+    ok INTEGER NOT NULL,
+    ttft REAL NOT NULL,
+    total_time REAL NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    tokens_per_sec REAL NOT NULL,
+    last_check REAL NOT NULL,
+    error_message TEXT
+);
+"""
+
+HistoryRow = Tuple[bytes, bytes, int, int, float]
+
+
+@dataclass
+class HealthSnapshot:
+    """从存储里读出的一组状态(原始行，由调用方还原成对象)"""
+    health: Dict[str, Tuple] = field(default_factory=dict)
+    latency: Dict[str, HistoryRow] = field(default_factory=dict)
+    ttft: Dict[str, HistoryRow] = field(default_factory=dict)
+    phases: Dict[str, Dict[str, HistoryRow]] = field(default_factory=dict)   # 名称 -> 阶段 -> 历史
+    circuits: Dict[str, Tuple[str, int, float]] = field(default_factory=dict)
+    inference: Dict[str, Tuple] = field(default_factory=dict)
+
+
+class HealthStore:
+    """基于 SQLite 的健康状态存储；每次操作单独开连接，可在任意线程调用"""
+
+    def __init__(self, path: str, max_age: float = DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        if not self._initialized:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                # 结构不兼容时直接重建，缓存丢了只是少一次热启动
+                for table in ("health", "history", "circuit", "inference"):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.executescript(SCHEMA)
+            self._initialized = True
+        return conn
+
+    def load(self, names: Optional[Iterable[str]] = None) -> HealthSnapshot:
+        """读取仍在有效期内的状态；names 给定时只返回这些提供商"""
+        snapshot = HealthSnapshot()
+        wanted = set(names) if names is not None else None
+        cutoff = time.time() - self.max_age
+        try:
+            with closing(self._connect()) as conn:
+                for row in conn.execute("SELECT * FROM health WHERE last_check >= ?", (cutoff,)):
+                    snapshot.health[row[0]] = row[1:]
+                fresh = set(snapshot.health)
+                for row in conn.execute("SELECT * FROM history"):
+                    if row[0] not in fresh:
+                        continue
+                    if row[1] == "latency":
+                        snapshot.latency[row[0]] = row[2:]
+                    elif row[1] == "ttft":
+                        snapshot.ttft[row[0]] = row[2:]
+                    elif row[1].startswith(PHASE_PREFIX):
+                        snapshot.phases.setdefault(row[0], {})[row[1][len(PHASE_PREFIX):]] = row[2:]
+                for row in conn.execute("SELECT * FROM circuit"):
+                    if row[0] in fresh:
+                        snapshot.circuits[row[0]] = row[1:]
+                for row in conn.execute("SELECT * FROM inference WHERE last_check >= ?", (cutoff,)):
+                    snapshot.inference[row[0]] = row[1:]
+        except sqlite3.Error as e:
+            print(f"读取健康缓存失败: {e}")
+            return HealthSnapshot()
+
+        if wanted is not None:
+            for table in (snapshot.health, snapshot.latency, snapshot.ttft, snapshot.phases, snapshot.circuits,
+                          snapshot.inference):
+                for name in set(table) - wanted:
+                    del table[name]
+        return snapshot
+
+    def save(self, snapshot: HealthSnapshot, removed: Iterable[str] = ()):
+        """在一个事务里写入快照中的各行，并删除 removed 中的提供商"""
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO health VALUES (?, ?, ?, ?, ?)",
+                    [(name, *row) for name, row in snapshot.health.items()]
+                )
+                for kind, rows in (("latency", snapshot.latency), ("ttft", snapshot.ttft)):
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [(name, kind, *row) for name, row in rows.items()]
+                    )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO history VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(name, PHASE_PREFIX + phase, *row)
+                     for name, phases in snapshot.phases.items() for phase, row in phases.items()]
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO circuit VALUES (?, ?, ?, ?)",
+                    [(name, *row) for name, row in snapshot.circuits.items()]
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO inference VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(name, *row) for name, row in snapshot.inference.items()]
+                )
+                for name in removed:
+                    for table in ("health", "history", "circuit", "inference"):
+                        conn.execute(f"DELETE FROM {table} WHERE provider_name = ?", (name,))
+        except sqlite3.Error as e:
+            print(f"保存健康缓存失败: {e}")
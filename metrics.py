@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Metrics
+
+Prometheus / OpenMetrics export of provider and gateway metrics: probe latency
+histograms, probe success/failure counters, circuit state, active provider, switch
+count and gateway request/byte/time-to-first-byte metrics. No third-party client is
+needed. Hot-path updates are plain slot increments on preallocated objects (no
+locks); state such as circuit and active provider is sampled only when scraped.
+Served at the gateway's /metrics, on a standalone port, or written to a textfile
+for node_exporter's textfile collector.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import math
+import os
+import tempfile
+import threading
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from provider_switch import AIProviderSwitcher, HealthStatus, InferenceStatus, PhaseTimings
+
+PREFIX = "easy_claude_"
+CONTENT_TYPE_TEXT = "text/plain; version=0.0.4; charset=utf-8"
+CONTENT_TYPE_OPENMETRICS = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# 探测延迟与首字节时间的桶上界(秒)，+Inf 桶自动追加
+PROBE_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TTFB_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+CIRCUIT_STATES = ("closed", "open", "half_open")
+
+
+class Counter:
+    """单调递增计数；只在一个事件循环里更新，无需加锁"""
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Histogram:
+    """固定桶直方图：observe 只是二分查找 + 两次加法"""
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        if math.isfinite(value):
+            self.sum += value
+
+
+class MetricFamily:
+    """同名、同标签集合的一组指标"""
+
+    def __init__(self, name: str, help_text: str, kind: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind  # counter / gauge / histogram
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """按标签值取子指标，第一次用到时创建"""
+        child = self.children.get(values)
+        if child is None:
+            if self.kind == "histogram":
+                child = Histogram(self.buckets)
+            elif self.kind == "counter":
+                child = Counter()
+            else:
+                child = Gauge()
+            # 并发创建时以先放进去的为准
+            child = self.children.setdefault(values, child)
+        return child
+
+    def remove(self, label: str, value: str):
+        """删除某个标签取该值的所有子指标(例如已删除的提供商)"""
+        index = self.label_names.index(label)
+        for key in [key for key in list(self.children) if key[index] == value]:
+            self.children.pop(key, None)
+
+    def clear(self):
+        self.children.clear()
+
+    def render(self, openmetrics: bool) -> Iterator[str]:
+        name = self.name
+        sample_name = name + "_total" if self.kind == "counter" else name
+        family_name = name if openmetrics else sample_name
+        yield f"# HELP {family_name} {self.help_text}"
+        yield f"# TYPE {family_name} {self.kind}"
+        # 复制一份再遍历，渲染时其他线程仍可新增子指标
+        for values, child in sorted(list(self.children.items())):
+            labels = list(zip(self.label_names, values))
+            if self.kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                    cumulative += count
+                    yield f"{name}_bucket{format_labels(labels + [('le', format_value(bound))])} {cumulative}"
+                yield f"{name}_count{format_labels(labels)} {cumulative}"
+                yield f"{name}_sum{format_labels(labels)} {format_value(child.sum)}"
+            else:
+                yield f"{sample_name}{format_labels(labels)} {format_value(child.value)}"
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels: List[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels) + "}"
+
+
+class MetricsRegistry:
+    """指标注册表；collectors 在每次导出前执行，用来采样不在热路径上更新的状态"""
+
+    def __init__(self):
+        self.families: List[MetricFamily] = []
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, name: str, help_text: str, kind: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = ()) -> MetricFamily:
+        family = MetricFamily(PREFIX + name, help_text, kind, label_names, buckets)
+        self.families.append(family)
+        return family
+
+    def render(self, openmetrics: bool = False) -> str:
+        """导出为 Prometheus 文本格式(默认)或 OpenMetrics 格式"""
+        for collect in self.collectors:
+            collect()
+        lines = [line for family in self.families for line in family.render(openmetrics)]
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str):
+        """原子地写入文本文件，供 node_exporter 的 textfile collector 读取(文件名需以 .prom 结尾)"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.render())
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+
+class ProviderMetrics(MetricsRegistry):
+    """切换器、探测和网关的全部指标"""
+
+    def __init__(self, switcher: "AIProviderSwitcher"):
+        super().__init__()
+        self.switcher = switcher
+        # 热路径上更新
+        self.probe_duration = self.register(
+            "probe_duration_seconds", "Health probe latency.", "histogram", ("provider",), PROBE_BUCKETS)
+        self.probes = self.register(
+            "probes", "Health probes by result.", "counter", ("provider", "result"))
+        self.phase_duration = self.register(
+            "request_phase_seconds", "Request phase durations (dns, connect, tls, send, ttfb) of probes and gateway requests.",
+            "histogram", ("provider", "source", "phase"), PROBE_BUCKETS)
+        self.inference_ttft = self.register(
+            "inference_ttft_seconds", "Deep probe time to first token.", "histogram", ("provider",), TTFB_BUCKETS)
+        self.inference_probes = self.register(
+            "inference_probes", "Deep (inference) probes by result.", "counter", ("provider", "result"))
+        self.switches = self.register(
+            "provider_switches", "Times the active provider was switched.", "counter")
+        self.switches.labels()  # 无标签的计数从 0 开始导出
+        self.gateway_requests = self.register(
+            "gateway_requests", "Requests answered by the gateway, by provider and status code.", "counter",
+            ("provider", "code"))
+        self.gateway_upstream_failures = self.register(
+            "gateway_upstream_failures", "Upstream attempts that failed over to another provider.", "counter",
+            ("provider",))
+        self.gateway_response_bytes = self.register(
+            "gateway_response_bytes", "Response bytes relayed to clients.", "counter", ("provider",))
+        self.gateway_ttfb = self.register(
+            "gateway_ttfb_seconds", "Gateway time from upstream request to first byte relayed.", "histogram",
+            ("provider",), TTFB_BUCKETS)
+        self.gateway_tokens = self.register(
+            "gateway_tokens", "Tokens reported in relayed responses.", "counter", ("provider", "kind"))
+        # 导出时采样
+        self.provider_up = self.register(
+            "provider_up", "1 if the last probe succeeded.", "gauge", ("provider",))
+        self.provider_score = self.register(
+            "provider_score", "Current ranking score (absent when not rankable).", "gauge", ("provider",))
+        self.last_probe = self.register(
+            "provider_last_probe_timestamp_seconds", "Unix time of the last probe.", "gauge", ("provider",))
+        self.circuit_state = self.register(
+            "circuit_state", "Circuit breaker state (one-hot).", "gauge", ("provider", "state"))
+        self.active_provider = self.register(
+            "active_provider", "1 for the currently active provider.", "gauge", ("provider",))
+        self.collectors.append(self.collect)
+
+    def observe_probe(self, status: "HealthStatus"):
+        self.probe_duration.labels(status.provider_name).observe(status.response_time)
+        self.probes.labels(status.provider_name, "success" if status.is_healthy else "failure").inc()
+        if status.phases is not None:
+            self.observe_phases(status.provider_name, "probe", status.phases)
+
+    def observe_phases(self, name: str, source: str, phases: "PhaseTimings"):
+        from provider_switch import PHASES
+        for phase in PHASES:
+            value = getattr(phases, phase)
+            if value is not None:
+                self.phase_duration.labels(name, source, phase).observe(value)
+
+    def observe_inference(self, result: "InferenceStatus"):
+        if result.ok:
+            self.inference_ttft.labels(result.provider_name).observe(result.ttft)
+        self.inference_probes.labels(result.provider_name, "success" if result.ok else "failure").inc()
+
+    def forget(self, name: str):
+        """提供商被删除或端点变化：丢弃它的累计指标"""
+        for family in self.families:
+            if "provider" in family.label_names:
+                family.remove("provider", name)
+
+    def collect(self):
+        """采样提供商的当前状态"""
+        switcher = self.switcher
+        for family in (self.provider_up, self.provider_score, self.last_probe, self.circuit_state,
+                       self.active_provider):
+            family.clear()
+        scores = switcher.score_all()
+        for provider in switcher.providers:
+            name = provider.name
+            status = switcher.health_status.get(name)
+            if status is not None and status.last_check:
+                self.provider_up.labels(name).set(1 if status.is_healthy else 0)
+                self.last_probe.labels(name).set(status.last_check)
+            score = scores.get(name)
+            if score is not None:
+                self.provider_score.labels(name).set(score)
+            state = switcher.get_circuit(name).state.value
+            for candidate in CIRCUIT_STATES:
+                self.circuit_state.labels(name, candidate).set(1 if candidate == state else 0)
+        if switcher.current_provider:
+            self.active_provider.labels(switcher.current_provider).set(1)
+
+
+def wants_openmetrics(accept: Optional[str]) -> bool:
+    return bool(accept) and "application/openmetrics-text" in accept
+
+
+class MetricsServer:
+    """独立的 /metrics HTTP 服务(标准库实现，在后台线程运行)"""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        # http.server 只在需要独立端口时导入，不拖慢命令行启动
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                openmetrics = wants_openmetrics(self.headers.get("Accept"))
+                body = registry.render(openmetrics).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE_OPENMETRICS if openmetrics else CONTENT_TYPE_TEXT)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # 不把每次抓取打印到终端
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Mock Provider Server
+
+Self-contained mock server that speaks every dialect check_provider_health probes:
+Anthropic (root, /v1/models, streaming /v1/messages), OpenAI-style /models, Azure
+deployments, Gemini /models and Ollama /api/tags. Each behaviour profile has its own
+latency distribution, error rate and stall rate, selected by URL prefix /p/<profile>/.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import argparse
+import asyncio
+import json
+import random
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+
+@dataclass
+class MockProfile:
+    """一种模拟提供者的行为"""
+    latency_ms: float = 20.0          # 典型延迟(lognormal 为中位数)
+    distribution: str = "fixed"       # fixed / uniform / exponential / lognormal
+    spread_ms: float = 0.0            # uniform 的半宽或 lognormal 的标准差
+    error_rate: float = 0.0           # 返回错误状态码的概率
+    error_status: int = 503
+    stall_rate: float = 0.0           # 卡住不响应的概率
+    stall_seconds: float = 60.0
+    tokens: int = 16                  # /v1/messages 流式返回的 token 数
+    token_interval_ms: float = 5.0    # 相邻 token 的间隔
+
+    def sample_latency(self) -> float:
+        """按分布抽取一次延迟(秒)"""
+        mean = self.latency_ms / 1000
+        spread = self.spread_ms / 1000
+        if self.distribution == "uniform":
+            return max(0.0, random.uniform(mean - spread, mean + spread))
+        if self.distribution == "exponential":
+            return random.expovariate(1 / mean) if mean > 0 else 0.0
+        if self.distribution == "lognormal":
+            return random.lognormvariate(0, spread / mean if mean > 0 else 0) * mean
+        return mean
+
+
+# 内置的几种典型行为
+DEFAULT_PROFILES = {
+    "fast": MockProfile(latency_ms=10),
+    "normal": MockProfile(latency_ms=50, distribution="lognormal", spread_ms=20),
+    "slow": MockProfile(latency_ms=800, distribution="uniform", spread_ms=300),
+    "flaky": MockProfile(latency_ms=100, distribution="exponential", error_rate=0.3),
+    "stall": MockProfile(latency_ms=50, stall_rate=0.5),
+    "down": MockProfile(latency_ms=5, error_rate=1.0, error_status=502),
+}
+
+
+class MockProviderServer:
+    """模拟提供者服务器"""
+
+    def __init__(self, profiles: Optional[Dict[str, MockProfile]] = None, default_profile: str = "fast"):
+        self.profiles = dict(profiles or DEFAULT_PROFILES)
+        self.default_profile = default_profile
+        self.request_count = 0
+        self.runner: Optional[web.AppRunner] = None
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/_mock/stats", self.handle_stats)
+        app.router.add_route("*", "/p/{profile}", self.handle)
+        app.router.add_route("*", "/p/{profile}/{tail:.*}", self.handle)
+        app.router.add_route("*", "/{tail:.*}", self.handle)
+        return app
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "requests": self.request_count,
+            "profiles": {name: asdict(profile) for name, profile in self.profiles.items()},
+        })
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        """按 profile 注入延迟/错误/卡顿，然后按路径返回对应方言的响应"""
+        self.request_count += 1
+        profile = self.profiles.get(request.match_info.get("profile", self.default_profile))
+        if profile is None:
+            return web.json_response({"error": "unknown profile"}, status=404)
+
+        if random.random() < profile.stall_rate:
+            await asyncio.sleep(profile.stall_seconds)
+        await asyncio.sleep(profile.sample_latency())
+        if random.random() < profile.error_rate:
+            return web.json_response(
+                {"type": "error", "error": {"type": "api_error", "message": "mock failure"}},
+                status=profile.error_status
+            )
+
+        tail = request.match_info.get("tail", "").strip("/")
+        if tail == "v1/messages" and request.method == "POST":
+            return await self.stream_messages(request, profile)
+        if tail == "api/tags":
+            return web.json_response({"models": [{"name": "llama3:latest", "size": 0}]})
+        if tail == "openai/deployments":
+            return web.json_response({"data": [{"id": "gpt-4o", "model": "gpt-4o", "object": "deployment"}]})
+        if tail in ("models", "v1/models"):
+            if "key" in request.query:
+                # Gemini 用 ?key= 认证，返回格式不同
+                return web.json_response({"models": [{"name": "models/gemini-1.5-flash"}]})
+            return web.json_response({"object": "list", "data": [{"id": "mock-model", "object": "model"}]})
+        if tail == "":
+            return web.json_response({"status": "ok"})
+        return web.json_response({"error": "not found"}, status=404)
+
+    async def stream_messages(self, request: web.Request, profile: MockProfile) -> web.StreamResponse:
+        """Anthropic 格式的流式 /v1/messages"""
+        try:
+            payload = await request.json()
+        except ValueError:
+            payload = {}
+        model = payload.get("model", "mock-model")
+        tokens = min(profile.tokens, payload.get("max_tokens") or profile.tokens)
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        def event(name: str, data: dict) -> bytes:
+            return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+        await response.write(event("message_start", {
+            "type": "message_start",
+            "message": {"id": "msg_mock", "type": "message", "role": "assistant", "model": model,
+                        "content": [], "usage": {"input_tokens": 8, "output_tokens": 1}}
+        }))
+        await response.write(event("content_block_start", {
+            "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}
+        }))
+        for _ in range(tokens):
+            await response.write(event("content_block_delta", {
+                "type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": "pong "}
+            }))
+            await asyncio.sleep(profile.token_interval_ms / 1000)
+        await response.write(event("content_block_stop", {"type": "content_block_stop", "index": 0}))
+        await response.write(event("message_delta", {
+            "type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": tokens}
+        }))
+        await response.write(event("message_stop", {"type": "message_stop"}))
+        await response.write_eof()
+        return response
+
+    async def start(self, hosts: List[str], port: int):
+        """在一个或多个回环地址上监听(多个地址用于模拟多主机)"""
+        self.runner = web.AppRunner(self.create_app(), access_log=None)
+        await self.runner.setup()
+        for host in hosts:
+            await web.TCPSite(self.runner, host, port).start()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+def load_profiles(path: Optional[str]) -> Dict[str, MockProfile]:
+    """从 JSON 文件加载 profile，未指定时使用内置 profile"""
+    if not path:
+        return dict(DEFAULT_PROFILES)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {name: MockProfile(**spec) for name, spec in data.items()}
+
+
+def loopback_hosts(count: int) -> List[str]:
+    """127.0.0.1 起的若干个回环地址"""
+    return [f"127.0.0.{i}" for i in range(1, count + 1)]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Easy Claude Code 模拟提供者服务器")
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--hosts", type=int, default=1, help="监听的回环地址数量 (127.0.0.1 起)")
+    parser.add_argument("--profiles", help="profile 定义的 JSON 文件")
+    args = parser.parse_args()
+
+    server = MockProviderServer(load_profiles(args.profiles))
+    await server.start(loopback_hosts(args.hosts), args.port)
+    print(f"模拟服务器已启动: 端口 {args.port}, {args.hosts} 个地址, profiles: {', '.join(server.profiles)}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Request Phase Tracing
+
+Splits each probe or gateway request into DNS resolution, TCP connect, TLS handshake,
+request send and time to first byte, using aiohttp trace hooks and the monotonic
+perf_counter clock. A request opts in by passing a PhaseRecorder as
+trace_request_ctx; requests without one are not recorded.
+
+aiohttp reports connection creation as one step. TimedTCPConnector marks the point
+where the TCP socket is connected (asyncio calls the protocol factory before
+starting TLS), which splits that step into connect and TLS.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import contextvars
+import time
+from typing import Dict, Optional
+
+import aiohttp
+
+from provider_switch import PhaseTimings
+
+# 正在建立连接的请求；连接器在同一个任务里读取它
+_connecting: contextvars.ContextVar[Optional["PhaseRecorder"]] = contextvars.ContextVar("_connecting", default=None)
+
+
+class PhaseRecorder:
+    """记录一次请求各阶段的单调时钟时间点"""
+    __slots__ = ("marks",)
+
+    def __init__(self):
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, name: str):
+        self.marks[name] = time.perf_counter()
+
+    def span(self, start: str, end: str) -> Optional[float]:
+        if start in self.marks and end in self.marks:
+            return max(self.marks[end] - self.marks[start], 0.0)
+        return None
+
+    def timings(self) -> PhaseTimings:
+        """换算成各阶段耗时；复用连接、DNS 缓存命中或明文 HTTP 时对应阶段为 None
+
+        在请求失败后立即调用时，卡住的阶段(例如连接超时、TLS 握手失败)计到调用时刻为止。
+        """
+        marks = self.marks
+        dns = self.span("dns_start", "dns_end")
+        connect = tls = None
+        if "connect_start" in marks:
+            # 连接创建包含 DNS 解析，从中扣掉
+            connect_end = marks.get("connect_end", time.perf_counter())
+            tcp_done = marks.get("tcp_done", connect_end)
+            connect = max(tcp_done - marks["connect_start"] - (dns or 0.0), 0.0)
+            tls = max(connect_end - tcp_done, 0.0) if "tcp_done" in marks else None
+        ready = marks.get("connect_end") or marks.get("reused") or marks.get("request_start")
+        sent = max((marks[key] for key in ("headers_sent", "chunk_sent") if key in marks), default=None)
+        waiting_from = sent if sent is not None else ready
+        return PhaseTimings(
+            dns=dns,
+            connect=connect,
+            tls=tls,
+            send=max(sent - ready, 0.0) if sent is not None and ready is not None else None,
+            ttfb=max(marks["response_start"] - waiting_from, 0.0)
+            if "response_start" in marks and waiting_from is not None else None,
+            total=self.span("request_start", "response_start"),
+            reused="reused" in marks
+        )
+
+
+def _marker(name: str, connecting: Optional[bool] = None):
+    async def on_signal(session, trace_config_ctx, params):
+        recorder = trace_config_ctx.trace_request_ctx
+        if isinstance(recorder, PhaseRecorder):
+            recorder.mark(name)
+            if connecting is not None:
+                _connecting.set(recorder if connecting else None)
+    return on_signal
+
+
+def create_trace_config() -> aiohttp.TraceConfig:
+    """挂上各阶段的钩子；只有传了 PhaseRecorder 的请求才记录"""
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(_marker("request_start", connecting=False))
+    config.on_dns_resolvehost_start.append(_marker("dns_start"))
+    config.on_dns_resolvehost_end.append(_marker("dns_end"))
+    config.on_connection_create_start.append(_marker("connect_start", connecting=True))
+    config.on_connection_create_end.append(_marker("connect_end", connecting=False))
+    config.on_connection_reuseconn.append(_marker("reused"))
+    if hasattr(config, "on_request_headers_sent"):  # aiohttp >= 3.8
+        config.on_request_headers_sent.append(_marker("headers_sent"))
+    config.on_request_chunk_sent.append(_marker("chunk_sent"))
+    config.on_request_end.append(_marker("response_start"))
+    return config
+
+
+class TimedTCPConnector(aiohttp.TCPConnector):
+    """在 TCP 连上、TLS 握手开始前打一个时间点，把连接阶段拆成 connect 和 tls"""
+
+    async def _wrap_create_connection(self, *args, **kwargs):
+        recorder = _connecting.get()
+        if recorder is None or not args or not kwargs.get("ssl"):
+            return await super()._wrap_create_connection(*args, **kwargs)
+        protocol_factory = args[0]
+
+        def timed_factory():
+            recorder.mark("tcp_done")
+            return protocol_factory()
+
+        return await super()._wrap_create_connection(timed_factory, *args[1:], **kwargs)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Profiling and Tracing
+
+Opt-in timing spans around the slow-path operations (config load/save, health
+checks, provider activation, GUI list refresh, terminal launch). Enabled with
+--profile[=trace.json] on the entry points, or with EASY_CLAUDE_PROFILE=trace.json
+in the environment. Spans are written as Chrome trace JSON (open in
+chrome://tracing or https://ui.perfetto.dev). --cprofile or EASY_CLAUDE_CPROFILE=1
+also writes a cProfile dump of the main thread next to it (trace.prof).
+
+When disabled, a traced function costs one global lookup and a branch per call.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import atexit
+import functools
+import inspect
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+TRACE_ENV = "EASY_CLAUDE_PROFILE"
+CPROFILE_ENV = "EASY_CLAUDE_CPROFILE"
+DEFAULT_TRACE_PATH = "easy-claude-trace-{pid}.json"
+
+
+class Tracer:
+    """收集 Chrome trace 事件；append 在 GIL 下是原子的，各线程可以直接写"""
+
+    def __init__(self, path: str, cprofile: bool = False):
+        self.path = path
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.events: List[Dict[str, Any]] = []
+        self.threads: Dict[int, str] = {}
+        self._ids = itertools.count(1)
+        self.profiler = None
+        if cprofile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def timestamp(self, moment: float) -> float:
+        """perf_counter 时间点 -> 相对启动的微秒"""
+        return round((moment - self.origin) * 1e6, 3)
+
+    def _thread(self) -> int:
+        tid = threading.get_ident()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        return tid
+
+    def complete(self, name: str, category: str, start: float, end: float, args: Optional[Dict] = None):
+        """同步代码的一段耗时 (ph=X)"""
+        event = {"name": name, "cat": category, "ph": "X", "pid": self.pid, "tid": self._thread(),
+                 "ts": self.timestamp(start), "dur": self.timestamp(end) - self.timestamp(start)}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def async_span(self, name: str, category: str, start: float, end: float, args: Optional[Dict] = None):
+        """协程的一段耗时：同一线程上可能互相交错，用异步事件 (ph=b/e) 表示"""
+        span_id = next(self._ids)
+        tid = self._thread()
+        begin = {"name": name, "cat": category, "ph": "b", "id": span_id, "pid": self.pid, "tid": tid,
+                 "ts": self.timestamp(start)}
+        if args:
+            begin["args"] = args
+        self.events.append(begin)
+        self.events.append({"name": name, "cat": category, "ph": "e", "id": span_id, "pid": self.pid, "tid": tid,
+                            "ts": self.timestamp(end)})
+
+    def save(self):
+        """写出 trace JSON，以及可选的 cProfile 数据"""
+        metadata = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": os.path.basename(sys.argv[0])}}]
+        metadata += [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+                     for tid, name in list(self.threads.items())]
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms"}, f)
+        message = f"性能追踪已写入: {self.path} ({len(self.events)} 个事件)"
+        if self.profiler is not None:
+            self.profiler.disable()
+            profile_path = os.path.splitext(self.path)[0] + ".prof"
+            self.profiler.dump_stats(profile_path)
+            message += f"，cProfile: {profile_path}"
+        print(message, file=sys.stderr)
+
+
+_tracer: Optional[Tracer] = None
+
+
+def enable(path: Optional[str] = None, cprofile: bool = False) -> Tracer:
+    """开始记录；进程退出时自动保存"""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(path or DEFAULT_TRACE_PATH.format(pid=os.getpid()), cprofile)
+        atexit.register(stop)
+    return _tracer
+
+
+def stop():
+    """停止记录并保存"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.save()
+
+
+def enabled() -> bool:
+    return _tracer is not None
+
+
+def traced(name: Optional[str] = None, category: str = "app",
+           detail: Optional[Callable[..., Dict]] = None):
+    """给函数或协程加计时 span；detail(*args, **kwargs) 可返回附加到事件上的参数"""
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                tracer = _tracer
+                if tracer is None:
+                    return await func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    tracer.async_span(span_name, category, start, time.perf_counter(),
+                                      detail(*args, **kwargs) if detail else None)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                tracer.complete(span_name, category, start, time.perf_counter(),
+                                detail(*args, **kwargs) if detail else None)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def span(name: str, category: str = "app", **args):
+    """给一段代码加计时 span"""
+    tracer = _tracer
+    if tracer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracer.complete(name, category, start, time.perf_counter(), args or None)
+
+
+def enable_from_argv(argv: List[str]) -> bool:
+    """处理入口的 --profile[=PATH] 和 --cprofile 参数(从 argv 中移除)"""
+    path = None
+    requested = cprofile = False
+    for arg in list(argv[1:]):
+        if arg == "--profile" or arg.startswith("--profile="):
+            requested = True
+            path = arg.partition("=")[2] or None
+            argv.remove(arg)
+        elif arg == "--cprofile":
+            requested = cprofile = True
+            argv.remove(arg)
+    if requested:
+        enable(path, cprofile)
+    return requested
+
+
+def enable_from_env():
+    """EASY_CLAUDE_PROFILE=1 或 =路径 时开启(对所有入口生效)"""
+    value = os.environ.get(TRACE_ENV, "")
+    if value and value != "0":
+        enable(None if value == "1" else value, os.environ.get(CPROFILE_ENV, "") not in ("", "0"))
+
+
+enable_from_env()
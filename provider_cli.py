@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Headless Command Line Interface
+
+Scriptable subcommands (status, check, best, activate, env, launch, batch) that print JSON.
+Never imports tkinter, and imports asyncio/aiohttp only for subcommands that touch
+the network, so calls from scripts and shell prompts start fast. status and best
+answer from the cached health store without probing.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import sys
+import time
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+from provider_switch import AIProviderSwitcher, HealthStatus, ProviderConfig
+import profiling
+
+
+def finite(value: Optional[float]) -> Optional[float]:
+    """JSON 不支持 inf/nan，统一转成 null"""
+    if value is None or math.isinf(value) or math.isnan(value):
+        return None
+    return round(value, 4)
+
+
+def status_json(switcher: AIProviderSwitcher, status: HealthStatus) -> Dict:
+    """一次健康检查结果的 JSON 表示"""
+    return {
+        "name": status.provider_name,
+        "healthy": status.is_healthy,
+        "checked": status.last_check > 0,
+        "stale": status.stale,
+        "response_time": finite(status.response_time),
+        "age": finite(time.time() - status.last_check) if status.last_check else None,
+        "error": status.error_message,
+        "circuit": switcher.get_circuit(status.provider_name).state.value,
+        "shared_from": status.shared_from,
+    }
+
+
+def provider_json(switcher: AIProviderSwitcher, provider: ProviderConfig) -> Dict:
+    """提供者的配置摘要、最近的健康状态和延迟统计(不含 API key)"""
+    status = switcher.health_status.get(provider.name) or switcher.unchecked_status(provider.name)
+    stats = switcher.get_latency_stats(provider.name)
+    inference = switcher.inference_status.get(provider.name)
+    return {
+        **status_json(switcher, status),
+        "type": provider.type.value,
+        "base_url": provider.base_url,
+        "model": provider.model,
+        "priority": provider.priority,
+        "score": finite(switcher.compute_score(provider)),
+        "latency": {key: finite(value) for key, value in asdict(stats).items()} if stats else None,
+        "phases": {phase: finite(value) for phase, value in switcher.get_phase_stats(provider.name).items()},
+        "inference": {key: finite(value) if isinstance(value, float) else value
+                      for key, value in asdict(inference).items()} if inference else None,
+    }
+
+
+def emit(data, pretty: bool = False):
+    print(json.dumps(data, ensure_ascii=False, indent=2 if pretty else None))
+
+
+def resolve_provider(switcher: AIProviderSwitcher, name: Optional[str],
+                     prefer_current: bool = True) -> Optional[ProviderConfig]:
+    """按名称取提供者；未指定名称时取环境变量服务里激活的提供者，没有服务(或 prefer_current=False)则取排名第一的"""
+    if name is None:
+        current = ""
+        if prefer_current:
+            from env_server import query
+            current = (query("current") or "").strip()
+        name = current or switcher.get_best_provider()
+        if name is None:
+            return None
+    return switcher.get_provider(name)
+
+
+def run_checks(switcher: AIProviderSwitcher, names: List[str], deep: bool) -> List[HealthStatus]:
+    """探测指定提供者(默认全部)，这里才会导入 asyncio/aiohttp"""
+    import asyncio
+
+    providers = [switcher.get_provider(name) for name in names] if names else None
+
+    async def check():
+        try:
+            return [status async for status in switcher.iter_provider_health(providers, deep=deep)]
+        finally:
+            await switcher.close()
+
+    return asyncio.run(check())
+
+
+def cmd_status(switcher: AIProviderSwitcher, args) -> int:
+    emit({
+        "config": os.path.abspath(switcher.config_file),
+        "ranking": switcher.rank_providers(),
+        "providers": [provider_json(switcher, provider) for provider in switcher.providers],
+    }, args.pretty)
+    return 0
+
+
+def cmd_check(switcher: AIProviderSwitcher, args) -> int:
+    unknown = [name for name in args.names if switcher.get_provider(name) is None]
+    if unknown:
+        emit({"error": f"未找到提供者: {', '.join(unknown)}"}, args.pretty)
+        return 2
+    statuses = run_checks(switcher, args.names, args.deep)
+    emit([status_json(switcher, status) for status in statuses], args.pretty)
+    return 0 if statuses and all(status.is_healthy for status in statuses) else 1
+
+
+def cmd_best(switcher: AIProviderSwitcher, args) -> int:
+    # 默认只用缓存的健康数据；没有任何可用数据或指定 --refresh 时才联网探测
+    if args.refresh or switcher.get_best_provider() is None:
+        run_checks(switcher, [], args.deep)
+    best = switcher.get_best_provider()
+    if best is None:
+        emit({"best": None, "error": "所有提供者都不可用"}, args.pretty)
+        return 1
+    emit({"best": best, "provider": provider_json(switcher, switcher.get_provider(best))}, args.pretty)
+    return 0
+
+
+def cmd_scores(switcher: AIProviderSwitcher, args) -> int:
+    # 与 best 一样默认只用缓存的健康数据
+    if args.refresh:
+        run_checks(switcher, [], args.deep)
+    emit({
+        "weights": dict(switcher.scoring.active_factors()),
+        "providers": [asdict(item) for item in switcher.explain_scores()],
+    }, args.pretty)
+    return 0
+
+
+def cmd_activate(switcher: AIProviderSwitcher, args) -> int:
+    # 不带名称时切换到最佳提供者；重新激活当前的提供者没有意义
+    provider = resolve_provider(switcher, args.name, prefer_current=False)
+    if provider is None:
+        emit({"error": f"未找到提供者: {args.name or '(无可用提供者)'}"}, args.pretty)
+        return 2
+    from env_server import query
+
+    # activate_provider 会打印给人看的提示，挪到 stderr，stdout 只留 JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        switcher.activate_provider(provider.name)
+    # 有常驻的环境变量服务(GUI 或 env_server.py)时让它也切换，之后新开的 shell 直接生效
+    reply = query(f"activate {provider.name}")
+    emit({
+        "provider": provider.name,
+        "server": reply is not None and reply.startswith("ok"),
+        "env": switcher.provider_env(provider),
+    }, args.pretty)
+    return 0
+
+
+def cmd_env(switcher: AIProviderSwitcher, args) -> int:
+    provider = resolve_provider(switcher, args.name)
+    if args.format != "json":
+        # eval "$(provider_cli.py env NAME --format sh)"：stdout 只能是脚本，出错时什么都不输出
+        from env_server import format_env
+        if provider is None:
+            print(f"未找到提供者: {args.name or '(无可用提供者)'}", file=sys.stderr)
+            return 2
+        sys.stdout.write(format_env(switcher.provider_env(provider), args.format))
+        return 0
+    if provider is None:
+        emit({"error": f"未找到提供者: {args.name or '(无可用提供者)'}"}, args.pretty)
+        return 2
+    emit({"provider": provider.name, "env": switcher.provider_env(provider)}, args.pretty)
+    return 0
+
+
+def cmd_launch(switcher: AIProviderSwitcher, args) -> int:
+    from terminal_launcher import launch_terminal
+
+    provider = resolve_provider(switcher, args.name)
+    if provider is None:
+        emit({"error": f"未找到提供者: {args.name or '(无可用提供者)'}"}, args.pretty)
+        return 2
+    env = {key: value for key, value in os.environ.items() if not key.startswith("ANTHROPIC_")}
+    env.update(switcher.provider_env(provider))
+    if args.auto:
+        success, terminal_name, error = launch_terminal(None, env=env, working_dir=args.dir, auto_claude=True,
+                                                        fast=args.fast)
+    else:
+        success, terminal_name, error = launch_terminal(
+            f'echo "当前提供商: {provider.name}"\necho "可以直接使用 {args.command} 命令"',
+            env=env, working_dir=args.dir
+        )
+    emit({"provider": provider.name, "success": success, "terminal": terminal_name, "error": error}, args.pretty)
+    return 0 if success else 1
+
+
+def cmd_batch(switcher: AIProviderSwitcher, args) -> int:
+    from batch_launcher import BatchLauncher
+
+    projects = switcher.project_directories
+    if args.projects:
+        by_name = {project.name: project for project in projects}
+        unknown = [name for name in args.projects if name not in by_name]
+        if unknown:
+            emit({"error": f"未找到项目: {', '.join(unknown)}"}, args.pretty)
+            return 2
+        projects = [by_name[name] for name in args.projects]
+    if not projects:
+        emit({"error": "配置中没有项目目录"}, args.pretty)
+        return 2
+
+    launcher = BatchLauncher(switcher)
+    sessions = launcher.assign(projects, args.strategy)
+    if not args.dry_run:
+        launcher.launch(sessions, fast=args.fast)
+    emit([asdict(session) for session in sessions], args.pretty)
+    return 0 if all(session.status != "failed" for session in sessions) else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Easy Claude Code 命令行 (JSON 输出)")
+    parser.add_argument("--config", default="providers.json", help="配置文件路径")
+    parser.add_argument("--pretty", action="store_true", help="缩进输出 JSON")
+    parser.add_argument("--profile", nargs="?", const="", metavar="TRACE",
+                        help="记录性能追踪(Chrome trace JSON)，默认写到 easy-claude-trace-<pid>.json")
+    parser.add_argument("--cprofile", action="store_true", help="与 --profile 一起使用：同时写 cProfile 数据")
+    # --pretty 也可以写在子命令后面；SUPPRESS 保证没写时不会覆盖前面的值
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--pretty", action="store_true", default=argparse.SUPPRESS, help="缩进输出 JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    status = commands.add_parser("status", parents=[common], help="所有提供者的配置和缓存的健康状态(不联网)")
+    status.set_defaults(handler=cmd_status)
+
+    check = commands.add_parser("check", parents=[common], help="立即探测提供者，全部健康时退出码为 0")
+    check.add_argument("names", nargs="*", help="要探测的提供者，默认全部")
+    check.add_argument("--deep", action="store_true", help="同时执行深度(推理)探测")
+    check.set_defaults(handler=cmd_check)
+
+    best = commands.add_parser("best", parents=[common], help="当前最佳提供者(优先使用缓存)")
+    best.add_argument("--refresh", action="store_true", help="先探测全部提供者")
+    best.add_argument("--deep", action="store_true", help="探测时同时执行深度探测")
+    best.set_defaults(handler=cmd_best)
+
+    scores = commands.add_parser("scores", parents=[common], help="各提供者的得分及每个因子的贡献")
+    scores.add_argument("--refresh", action="store_true", help="先探测全部提供者")
+    scores.add_argument("--deep", action="store_true", help="探测时同时执行深度探测")
+    scores.set_defaults(handler=cmd_scores)
+
+    activate = commands.add_parser("activate", parents=[common], help="激活提供者(通知运行中的环境变量服务)")
+    activate.add_argument("name", nargs="?", help="提供者名称，默认最佳提供者")
+    activate.set_defaults(handler=cmd_activate)
+
+    env = commands.add_parser("env", parents=[common], help="输出提供者对应的环境变量")
+    env.add_argument("name", nargs="?", help="提供者名称，默认当前激活的或最佳提供者")
+    env.add_argument("--format", choices=["json", "sh", "fish"], default="json",
+                     help="sh/fish 输出可直接 eval 的脚本")
+    env.set_defaults(handler=cmd_env)
+
+    launch = commands.add_parser("launch", parents=[common], help="带上提供者环境变量打开新终端")
+    launch.add_argument("name", nargs="?", help="提供者名称，默认当前激活的或最佳提供者")
+    launch.add_argument("--dir", help="工作目录")
+    launch.add_argument("--command", default="claude", help="提示的启动命令")
+    launch.add_argument("--auto", action="store_true", help="在终端里直接运行 claude")
+    launch.add_argument("--fast", action="store_true", help="与 --auto 一起使用：按环境快照直接执行 claude")
+    launch.set_defaults(handler=cmd_launch)
+
+    batch = commands.add_parser("batch", parents=[common], help="为多个项目并发打开终端，分摊到各个提供者")
+    batch.add_argument("projects", nargs="*", help="项目名称，默认配置中的全部项目")
+    batch.add_argument("--strategy", choices=["load", "weight"], default="load",
+                       help="load: 按(会话数+1)/得分分摊; weight: 只按得分加权轮询")
+    batch.add_argument("--fast", action="store_true", help="按环境快照直接执行 claude")
+    batch.add_argument("--dry-run", action="store_true", help="只输出分配结果，不打开终端")
+    batch.set_defaults(handler=cmd_batch)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.profile is not None or args.cprofile:
+        profiling.enable(args.profile or None, args.cprofile)
+    # 默认配置的创建提示等输出不能混进 JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        switcher = AIProviderSwitcher(args.config)
+    try:
+        return args.handler(switcher, args)
+    finally:
+        switcher.flush_config()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Local Failover Gateway
+
+Local Anthropic-compatible HTTP gateway for Claude Code. Point ANTHROPIC_BASE_URL at it
+and every /v1/* request is forwarded to the best healthy provider, failing over to the
+next one on connection errors, timeouts, 5xx or 429 responses - no terminal restart needed.
+The gateway adds the real provider keys, so it only serves clients that present the random
+token it generates at startup (ANTHROPIC_AUTH_TOKEN).
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import secrets
+import time
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from metrics import CONTENT_TYPE_OPENMETRICS, CONTENT_TYPE_TEXT, wants_openmetrics
+from probe_trace import PhaseRecorder
+from provider_switch import AIProviderSwitcher, HealthStatus, LatencyHistory, ProviderConfig
+
+
+# 不应转发的逐跳头部，以及由网关重新设置的认证头部
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "host", "content-length",
+}
+CLIENT_AUTH_HEADERS = {"x-api-key", "authorization"}
+
+# 触发故障转移的上游状态码
+FAILOVER_STATUSES = {429, 500, 502, 503, 504, 529}
+
+DEFAULT_PORT = 8765
+
+# 上游读缓冲大小；写给客户端时 drain 提供背压，整体内存占用有上限
+STREAM_BUFFER_SIZE = 64 * 1024
+# 为判断首个事件是否为 error 最多预读的字节数
+FIRST_EVENT_LIMIT = 64 * 1024
+
+# 对冲请求：首字节样本不足时使用的默认等待时间，以及令牌桶最多累积的对冲次数
+HEDGE_DEFAULT_DELAY = 3.0
+HEDGE_MIN_SAMPLES = 10
+HEDGE_BURST = 5.0
+
+
+class UpstreamFailure(Exception):
+    """上游提供者请求失败，可以转移到下一个提供者"""
+    pass
+
+
+class SseUsageScanner:
+    """增量扫描 SSE 流中的 usage 字段
+
+    数据块本身原样转发，这里只在数据块包含事件边界且可能含有 "usage" 时才切分解析，
+    其余数据块只做一次字节查找。
+    """
+
+    MAX_TAIL = 1024 * 1024
+    USAGE_MARK = b'"usage"'
+
+    def __init__(self):
+        self.tail = b""
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def feed(self, chunk: bytes):
+        boundary = chunk.rfind(b"\n\n")
+        if boundary < 0:
+            if chunk[:1] == b"\n" and self.tail[-1:] == b"\n":
+                # 事件边界的两个换行分在了两个数据块里
+                if self.USAGE_MARK in self.tail:
+                    self._parse(self.tail[:-1])
+                self.tail = chunk[1:]
+                return
+            # 事件尚未结束，暂存；超大的单个事件直接放弃统计
+            self.tail = self.tail + chunk if len(self.tail) + len(chunk) <= self.MAX_TAIL else b""
+            return
+
+        mark = self.USAGE_MARK
+        if mark in self.tail or mark in (self.tail[-len(mark):] + chunk[:len(mark)]) \
+                or chunk.find(mark, 0, boundary) >= 0:
+            self._parse(self.tail + chunk[:boundary])
+        self.tail = chunk[boundary + 2:]
+
+    def _parse(self, data: bytes):
+        for event in data.split(b"\n\n"):
+            if self.USAGE_MARK not in event:
+                continue
+            for line in event.split(b"\n"):
+                if not line.startswith(b"data:"):
+                    continue
+                try:
+                    payload = json.loads(line[5:])
+                except ValueError:
+                    continue
+                # message_start 的 usage 在 message 里，message_delta 的在顶层；output_tokens 是累计值
+                usage = payload.get("usage") or (payload.get("message") or {}).get("usage") or {}
+                self.input_tokens = max(self.input_tokens, usage.get("input_tokens") or 0)
+                self.output_tokens = max(self.output_tokens, usage.get("output_tokens") or 0)
+
+
+class ProviderGateway:
+    """本地 Anthropic 兼容网关，按健康排名转发并自动故障转移"""
+
+    def __init__(self, switcher: AIProviderSwitcher, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                 hedge: bool = False, hedge_ratio: float = 0.1, token: Optional[str] = None,
+                 max_connections: int = 0):
+        self.switcher = switcher
+        self.host = host
+        self.port = port
+        # 上游连接数上限(0 为不限)；流式请求会一直占用连接，不能沿用探测连接池的每主机上限
+        self.max_connections = max_connections
+        # 客户端访问令牌：网关会注入真实密钥，不能让本机任意用户或进程直接使用
+        self.token = token or secrets.token_urlsafe(32)
+        # 对冲：主提供者在其 p95 首字节时间内没响应时，向下一个提供者发同样的请求
+        # hedge_ratio 限制长期对冲比例，避免花费翻倍
+        self.hedge = hedge
+        self.hedge_ratio = hedge_ratio
+        self.hedge_stats = {"requests": 0, "hedged": 0, "hedge_wins": 0}
+        self._hedge_tokens = 0.0
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.runner: Optional[web.AppRunner] = None
+        self.last_provider: Optional[str] = None
+        self.first_byte_history: Dict[str, LatencyHistory] = {}
+        self.usage: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def env(self) -> Dict[str, str]:
+        """让 claude 走网关所需的环境变量"""
+        return {
+            "ANTHROPIC_BASE_URL": self.base_url,
+            # 真实密钥由网关按提供者注入，这里是访问网关本身的令牌
+            "ANTHROPIC_AUTH_TOKEN": self.token,
+        }
+
+    def authorized(self, request: web.Request) -> bool:
+        """客户端是否带了本次运行的访问令牌(x-api-key 或 Authorization: Bearer)"""
+        presented = request.headers.get("x-api-key")
+        if presented is None:
+            scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+            presented = credentials.strip() if scheme.lower() == "bearer" else ""
+        return hmac.compare_digest(presented.encode("utf-8"), self.token.encode("utf-8"))
+
+    def candidates(self) -> List[ProviderConfig]:
+        """转发顺序：先按排名的健康提供者，再兜底其余提供者(未检测的优先于已知故障的)"""
+        ranked = self.switcher.rank_providers()
+        ordered = [self.switcher.get_provider(name) for name in ranked]
+        ranked = set(ranked)
+
+        def fallback_key(provider: ProviderConfig):
+            status = self.switcher.health_status.get(provider.name)
+            known_bad = status is not None and status.last_check > 0
+            return (known_bad, provider.priority)
+
+        rest = sorted((p for p in self.switcher.providers if p.name not in ranked), key=fallback_key)
+        return ordered + rest
+
+    def upstream_url(self, provider: ProviderConfig, path_qs: str) -> str:
+        """提供者的 base_url 与 claude 请求路径拼接，与直连时 claude 的行为一致"""
+        return provider.base_url.rstrip('/') + path_qs
+
+    def upstream_headers(self, provider: ProviderConfig, request: web.Request) -> Dict[str, str]:
+        """复制客户端头部，替换为提供者自己的认证信息"""
+        headers = {
+            key: value for key, value in request.headers.items()
+            if key.lower() not in HOP_BY_HOP_HEADERS and key.lower() not in CLIENT_AUTH_HEADERS
+        }
+        headers.update(self.switcher.anthropic_auth_headers(provider))
+        return headers
+
+    def rewrite_body(self, provider: ProviderConfig, body: bytes) -> bytes:
+        """提供者指定了模型时替换请求里的模型名(haiku 类请求映射到快速模型)"""
+        if not body or not provider.model or provider.model == "auto":
+            return body
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return body
+        if not isinstance(payload, dict) or "model" not in payload:
+            return body
+
+        requested = str(payload["model"])
+        payload["model"] = provider.small_fast_model if "haiku" in requested else provider.model
+        return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+    def record_failure(self, provider: ProviderConfig, elapsed: float, message: str):
+        """把转发失败记入健康状态，后续请求会优先避开该提供者"""
+        self.switcher.metrics.gateway_upstream_failures.labels(provider.name).inc()
+        self.switcher.record_health(HealthStatus(
+            provider_name=provider.name,
+            is_healthy=False,
+            response_time=elapsed,
+            last_check=time.time(),
+            error_message=message
+        ))
+
+    async def open_upstream(self, provider: ProviderConfig, request: web.Request, body: bytes,
+                            is_last: bool) -> aiohttp.ClientResponse:
+        """向单个提供者发起请求，返回已收到响应头的上游响应"""
+        recorder = PhaseRecorder()
+        start_time = time.perf_counter()
+        try:
+            response = await self.session.request(
+                request.method,
+                self.upstream_url(provider, request.path_qs),
+                headers=self.upstream_headers(provider, request),
+                data=self.rewrite_body(provider, body),
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    sock_connect=self.switcher.http_pool.connect_timeout,
+                    sock_read=provider.timeout
+                ),
+                allow_redirects=False,
+                read_bufsize=STREAM_BUFFER_SIZE,
+                trace_request_ctx=recorder
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.record_phases(provider, recorder)
+            message = str(e) or type(e).__name__
+            self.record_failure(provider, time.perf_counter() - start_time, message)
+            raise UpstreamFailure(f"{provider.name}: {message}")
+
+        self.record_phases(provider, recorder)
+        self.switcher.record_ratelimit(provider.name, response.headers, response.status)
+        if response.status in FAILOVER_STATUSES and not is_last:
+            response.release()
+            message = f"HTTP {response.status}"
+            self.record_failure(provider, time.perf_counter() - start_time, message)
+            raise UpstreamFailure(f"{provider.name}: {message}")
+
+        return response
+
+    def record_phases(self, provider: ProviderConfig, recorder: PhaseRecorder):
+        """记录转发请求的各阶段耗时；DNS/连接/TLS 也并入提供者的阶段历史"""
+        phases = recorder.timings()
+        self.switcher.record_phases(provider.name, phases, network_only=True)
+        self.switcher.metrics.observe_phases(provider.name, "gateway", phases)
+
+    @staticmethod
+    def is_event_stream(upstream: aiohttp.ClientResponse) -> bool:
+        """未压缩的 SSE 响应才做事件级检查"""
+        return (upstream.status == 200
+                and upstream.content_type == "text/event-stream"
+                and "Content-Encoding" not in upstream.headers)
+
+    async def read_first_event(self, provider: ProviderConfig, upstream: aiohttp.ClientResponse,
+                               is_last: bool) -> bytes:
+        """预读 SSE 的第一个事件；若上游一开始就报错，此时客户端还没收到任何字节，可以安全转移"""
+        start_time = time.perf_counter()
+        buffered = b""
+        try:
+            while b"\n\n" not in buffered and len(buffered) < FIRST_EVENT_LIMIT:
+                chunk = await upstream.content.readany()
+                if not chunk:
+                    break
+                buffered += chunk
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            upstream.release()
+            message = str(e) or type(e).__name__
+            self.record_failure(provider, time.perf_counter() - start_time, message)
+            raise UpstreamFailure(f"{provider.name}: {message}")
+
+        if buffered.startswith(b"event: error") and not is_last:
+            upstream.release()
+            self.record_failure(provider, time.perf_counter() - start_time, "SSE error event")
+            raise UpstreamFailure(f"{provider.name}: SSE error event")
+        return buffered
+
+    async def relay(self, request: web.Request, upstream: aiohttp.ClientResponse,
+                    provider: ProviderConfig, prefix: bytes, sent_at: float) -> web.StreamResponse:
+        """把上游字节原样流式回传给客户端，不做重新序列化"""
+        response = web.StreamResponse(status=upstream.status, reason=upstream.reason)
+        for key, value in upstream.headers.items():
+            if key.lower() not in HOP_BY_HOP_HEADERS:
+                response.headers[key] = value
+        response.headers["X-Easy-Claude-Provider"] = provider.name
+
+        scanner = SseUsageScanner() if self.is_event_stream(upstream) else None
+        await response.prepare(request)
+
+        first_byte = True
+        relayed = 0
+        chunk = prefix or await upstream.content.readany()
+        try:
+            while chunk:
+                if first_byte:
+                    first_byte = False
+                    self.record_first_byte(provider, time.perf_counter() - sent_at)
+                if scanner is not None:
+                    scanner.feed(chunk)
+                # write 在发送缓冲超过高水位时会等待 drain，慢客户端会反压到上游读取
+                await response.write(chunk)
+                relayed += len(chunk)
+                chunk = await upstream.content.readany()
+            await response.write_eof()
+        finally:
+            # 整个响应结束后才累加一次，不在每个数据块上更新指标
+            self.switcher.metrics.gateway_response_bytes.labels(provider.name).inc(relayed)
+
+        if scanner is not None:
+            self.record_usage(provider, scanner.input_tokens, scanner.output_tokens)
+        return response
+
+    def record_first_byte(self, provider: ProviderConfig, elapsed: float):
+        """记录从发出请求到首字节转发给客户端的耗时"""
+        history = self.first_byte_history.get(provider.name)
+        if history is None:
+            history = self.first_byte_history[provider.name] = LatencyHistory()
+        history.record(elapsed, True)
+        self.switcher.metrics.gateway_ttfb.labels(provider.name).observe(elapsed)
+
+    def record_usage(self, provider: ProviderConfig, input_tokens: int, output_tokens: int):
+        """累计每个提供者经网关消耗的 token"""
+        totals = self.usage.setdefault(provider.name, {"requests": 0, "input_tokens": 0, "output_tokens": 0})
+        totals["requests"] += 1
+        totals["input_tokens"] += input_tokens
+        totals["output_tokens"] += output_tokens
+        self.switcher.metrics.gateway_tokens.labels(provider.name, "input").inc(input_tokens)
+        self.switcher.metrics.gateway_tokens.labels(provider.name, "output").inc(output_tokens)
+
+    async def attempt(self, provider: ProviderConfig, request: web.Request, body: bytes,
+                      is_last: bool) -> Tuple[aiohttp.ClientResponse, bytes, float]:
+        """向一个提供者发起请求，直到拿到首个可转发的数据(SSE 为首个事件)"""
+        if not self.switcher.get_circuit(provider.name).allow_request():
+            raise UpstreamFailure(f"{provider.name}: 熔断中")
+        sent_at = time.perf_counter()
+        upstream = await self.open_upstream(provider, request, body, is_last)
+        try:
+            prefix = await self.read_first_event(provider, upstream, is_last) \
+                if self.is_event_stream(upstream) else b""
+        except asyncio.CancelledError:
+            # 对冲落败时被取消，归还连接
+            upstream.release()
+            raise
+        return upstream, prefix, sent_at
+
+    def hedge_delay(self, provider: ProviderConfig) -> float:
+        """主提供者的 p95 首字节时间，样本不足时用默认值"""
+        history = self.first_byte_history.get(provider.name)
+        if history is None or len(history) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return history.percentile(95)
+
+    def take_hedge_token(self) -> bool:
+        """令牌桶：每个请求积累 hedge_ratio 个令牌，对冲一次消耗一个"""
+        if self._hedge_tokens < 1.0:
+            return False
+        self._hedge_tokens -= 1.0
+        return True
+
+    @staticmethod
+    async def discard(task: asyncio.Task):
+        """取消落败的请求；若它恰好已经完成则释放连接"""
+        task.cancel()
+        try:
+            upstream, _, _ = await task
+            upstream.release()
+        except (asyncio.CancelledError, UpstreamFailure):
+            pass
+
+    async def hedged_attempt(self, primary: ProviderConfig, secondary: ProviderConfig,
+                             request: web.Request, body: bytes, errors: List[str], secondary_is_last: bool):
+        """对前两个候选做对冲请求
+
+        返回 (结果, 是否已对 secondary 发出请求)。结果为 (provider, upstream, prefix, sent_at)，
+        失败时为 None；没有发出对冲请求时 secondary 还没试过，调用方应接着尝试它。
+        """
+        tasks = {asyncio.create_task(self.attempt(primary, request, body, False)): primary}
+        done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(primary))
+        hedged = not done and self.take_hedge_token()
+        if hedged:
+            self.hedge_stats["hedged"] += 1
+            tasks[asyncio.create_task(self.attempt(secondary, request, body, secondary_is_last))] = secondary
+
+        pending = set(tasks)
+        # 作为最后一个候选的 secondary 返回的错误响应：另一边还没结束时不算胜出，先留作兜底
+        fallback = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = None
+            for task in done:
+                try:
+                    result = (tasks[task],) + task.result()
+                except UpstreamFailure as e:
+                    errors.append(str(e))
+                    continue
+                if self.is_error_response(result[1], result[2]):
+                    fallback = result
+                elif winner is None:
+                    winner = result
+                else:
+                    result[1].release()  # 两边同时到达，只保留一个
+            if winner is not None:
+                if fallback is not None:
+                    self.drop_error_response(*fallback, errors)
+                for loser in pending:
+                    await self.discard(loser)
+                if winner[0] is secondary:
+                    self.hedge_stats["hedge_wins"] += 1
+                return winner, hedged
+        # 没有其他请求可等了，才把错误响应转发给客户端
+        return fallback, hedged
+
+    @staticmethod
+    def is_error_response(upstream: aiohttp.ClientResponse, prefix: bytes) -> bool:
+        """本应触发故障转移的响应(只有最后一个候选才会返回这种响应)"""
+        return upstream.status in FAILOVER_STATUSES or prefix.startswith(b"event: error")
+
+    def drop_error_response(self, provider: ProviderConfig, upstream: aiohttp.ClientResponse, prefix: bytes,
+                            sent_at: float, errors: List[str]):
+        """另一边已成功，放弃留作兜底的错误响应，按失败记录"""
+        upstream.release()
+        message = f"HTTP {upstream.status}" if upstream.status in FAILOVER_STATUSES else "SSE error event"
+        self.record_failure(provider, time.perf_counter() - sent_at, message)
+        errors.append(f"{provider.name}: {message}")
+
+    async def handle_proxy(self, request: web.Request) -> web.StreamResponse:
+        """转发 /v1/* 请求，失败时依次尝试下一个提供者"""
+        if not self.authorized(request):
+            return self.error_response(401, "网关访问令牌无效，请使用网关启动时输出的 ANTHROPIC_AUTH_TOKEN",
+                                       "authentication_error")
+        body = await request.read()
+        candidates = self.candidates()
+        if not candidates:
+            return self.error_response(503, "没有配置任何提供者")
+
+        self.hedge_stats["requests"] += 1
+        self._hedge_tokens = min(self._hedge_tokens + self.hedge_ratio, HEDGE_BURST)
+
+        errors = []
+        remaining = candidates
+        if self.hedge and len(candidates) >= 2:
+            result, hedged = await self.hedged_attempt(candidates[0], candidates[1], request, body, errors,
+                                                       secondary_is_last=len(candidates) == 2)
+            if result is not None:
+                return await self.respond(request, *result)
+            # 主提供者在对冲前就失败(或没有对冲令牌)时，第二个候选还没试过
+            remaining = candidates[2:] if hedged else candidates[1:]
+
+        for index, provider in enumerate(remaining):
+            try:
+                upstream, prefix, sent_at = await self.attempt(
+                    provider, request, body, is_last=index == len(remaining) - 1
+                )
+            except UpstreamFailure as e:
+                errors.append(str(e))
+                continue
+            return await self.respond(request, provider, upstream, prefix, sent_at)
+
+        return self.error_response(502, "所有提供者均不可用: " + "; ".join(errors))
+
+    async def respond(self, request: web.Request, provider: ProviderConfig, upstream: aiohttp.ClientResponse,
+                      prefix: bytes, sent_at: float) -> web.StreamResponse:
+        """选定提供者后把响应转发给客户端
+
+        最后一个候选的 429/5xx 也会原样转发，但要记为失败；其他 4xx(如 401)取决于请求或密钥，不改变熔断器。
+        """
+        self.last_provider = provider.name
+        if upstream.status in FAILOVER_STATUSES or upstream.status >= 500:
+            self.record_failure(provider, time.perf_counter() - sent_at, f"HTTP {upstream.status}")
+        elif upstream.status < 400:
+            self.switcher.get_circuit(provider.name).record_success()
+        self.switcher.metrics.gateway_requests.labels(provider.name, str(upstream.status)).inc()
+        try:
+            return await self.relay(request, upstream, provider, prefix, sent_at)
+        finally:
+            upstream.release()
+
+    async def handle_status(self, request: web.Request) -> web.Response:
+        """网关自身状态，便于排查当前转发顺序"""
+        return web.json_response({
+            "base_url": self.base_url,
+            "last_provider": self.last_provider,
+            "candidates": [provider.name for provider in self.candidates()],
+            "circuits": {
+                name: breaker.state.value for name, breaker in self.switcher.circuit_breakers.items()
+            },
+            "first_byte_p95": {
+                name: history.percentile(95) for name, history in self.first_byte_history.items()
+            },
+            "usage": self.usage,
+            "hedge": dict(self.hedge_stats, enabled=self.hedge, ratio=self.hedge_ratio),
+        })
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        """Prometheus / OpenMetrics 指标(按 Accept 头选择格式)"""
+        openmetrics = wants_openmetrics(request.headers.get("Accept"))
+        return web.Response(
+            body=self.switcher.metrics.render(openmetrics).encode("utf-8"),
+            headers={"Content-Type": CONTENT_TYPE_OPENMETRICS if openmetrics else CONTENT_TYPE_TEXT}
+        )
+
+    def error_response(self, status: int, message: str, error_type: str = "api_error") -> web.Response:
+        """Anthropic 格式的错误响应，claude 能正确显示；没有提供者能响应时也计入请求指标"""
+        self.switcher.metrics.gateway_requests.labels("", str(status)).inc()
+        return web.json_response(
+            {"type": "error", "error": {"type": error_type, "message": message}},
+            status=status
+        )
+
+    async def start(self):
+        """启动网关"""
+        # 独立的连接池，不受探测的每主机连接数限制；不自动解压，压缩过的响应体原样转发
+        self.session = self.switcher.create_session(
+            limit=self.max_connections, limit_per_host=0, auto_decompress=False
+        )
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_get("/_gateway/status", self.handle_status)
+        app.router.add_get("/metrics", self.handle_metrics)
+        app.router.add_route("*", "/v1/{tail:.*}", self.handle_proxy)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def stop(self):
+        """停止网关并关闭上游连接池"""
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+async def main():
+    """启动网关与后台健康监控"""
+    from config_watcher import ConfigWatcher
+    from health_monitor import HealthMonitor, MonitorConfig
+
+    parser = argparse.ArgumentParser(description="Easy Claude Code 本地故障转移网关")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--config", default="providers.json")
+    parser.add_argument("--hedge", action="store_true", help="主提供者超过 p95 首字节时间未响应时向下一个提供者发对冲请求")
+    parser.add_argument("--hedge-ratio", type=float, default=0.1, help="最多对冲的请求比例 (默认 0.1)")
+    parser.add_argument("--max-connections", type=int, default=0, help="上游连接数上限 (默认 0，不限)")
+    parser.add_argument("--metrics-textfile", default="", help="定期写出 Prometheus 文本文件 (*.prom)；/metrics 始终可用")
+    args = parser.parse_args()
+
+    switcher = AIProviderSwitcher(args.config)
+    gateway = ProviderGateway(switcher, args.host, args.port, hedge=args.hedge, hedge_ratio=args.hedge_ratio,
+                              max_connections=args.max_connections)
+    monitor = HealthMonitor(switcher, MonitorConfig(metrics_textfile=args.metrics_textfile))
+
+    await gateway.start()
+    print(f"网关已启动: {gateway.base_url} (指标: {gateway.base_url}/metrics)")
+    print("在终端中执行以下命令后运行 claude:")
+    for key, value in gateway.env().items():
+        print(f'export {key}="{value}"')
+
+    # 配置文件被外部修改时增量重载，只重新探测有变化的提供商
+    loop = asyncio.get_running_loop()
+
+    def apply_config_changes():
+        changes = switcher.reload_config()
+        if changes:
+            print(f"配置已重新加载: 新增 {changes.added}, 删除 {changes.removed}, 修改 {changes.changed}")
+            if changes.reprobe:
+                monitor.trigger(changes.reprobe)
+
+    watcher = ConfigWatcher(args.config, on_change=lambda: loop.call_soon_threadsafe(apply_config_changes))
+    watcher.start()
+
+    try:
+        await monitor.run()
+    finally:
+        watcher.stop()
+        await gateway.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
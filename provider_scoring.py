@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Provider Scoring
+
+Ranks providers on several factors instead of a single latency number: typical and
+tail latency, error rate, circuit state, measured tokens/sec, remaining rate-limit
+headroom, configured priority and (optionally) cost per million tokens. Each factor
+maps its raw value onto 0..1 (1 is best) against a fixed reference scale, and the score
+is the weighted mean of the factors, so it can be broken down into per-factor
+contributions. Because the scales are fixed rather than relative to the fleet, one
+provider's score never depends on another's and the switcher can keep re-ranking
+incrementally.
+
+Factors are computed column by column over all providers at once, so ranking a large
+fleet is a handful of passes over flat arrays. More factors can be added with
+register_factor() and enabled by giving them a weight in the "scoring" section of
+providers.json.
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import math
+from array import array
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+# 各因子的默认权重；为 0 的因子不参与计算
+DEFAULT_WEIGHTS = {
+    "latency": 1.0,       # 常规延迟(latency_percentile 分位)
+    "tail_latency": 0.5,  # 尾延迟(tail_percentile 分位)
+    "error_rate": 2.0,    # 最近窗口内的失败率
+    "circuit": 1.0,       # 熔断器状态：半开时减半
+    "throughput": 0.5,    # 深度探测测得的生成速度(tokens/s)
+    "headroom": 0.5,      # 速率限制的剩余额度
+    "priority": 0.5,      # 配置的优先级，1 最优先
+    "cost": 0.0,          # 每百万 token 的价格，默认不考虑
+}
+NEUTRAL = 0.5             # 没有数据的因子取中性值，既不加分也不扣分
+
+
+# (剩余, 上限) 响应头：Anthropic 兼容服务和常见的 OpenAI 风格网关
+RATELIMIT_HEADERS = (
+    ("anthropic-ratelimit-requests-remaining", "anthropic-ratelimit-requests-limit"),
+    ("anthropic-ratelimit-tokens-remaining", "anthropic-ratelimit-tokens-limit"),
+    ("x-ratelimit-remaining-requests", "x-ratelimit-limit-requests"),
+    ("x-ratelimit-remaining-tokens", "x-ratelimit-limit-tokens"),
+    ("x-ratelimit-remaining", "x-ratelimit-limit"),
+)
+
+
+def ratelimit_headroom(headers, status: int = 200) -> Optional[float]:
+    """从响应头算出速率限制的剩余额度占比(取各项最小值)；429 为 0，没有相关头部时为 None"""
+    if status == 429:
+        return 0.0
+    headroom = None
+    for remaining_key, limit_key in RATELIMIT_HEADERS:
+        remaining, limit = headers.get(remaining_key), headers.get(limit_key)
+        if remaining is None or limit is None:
+            continue
+        try:
+            remaining, limit = float(remaining), float(limit)
+        except ValueError:
+            continue
+        if limit > 0:
+            fraction = min(max(remaining / limit, 0.0), 1.0)
+            headroom = fraction if headroom is None else min(headroom, fraction)
+    return headroom
+
+
+@dataclass
+class ScoreInputs:
+    """一个提供者的打分原始数据(延迟单位为秒)"""
+    name: str
+    latency: float
+    tail_latency: float
+    error_rate: float = 0.0
+    circuit: str = "closed"
+    tokens_per_sec: Optional[float] = None
+    headroom: Optional[float] = None        # 剩余额度占比 0..1，未知为 None
+    priority: int = 1
+    cost_per_mtok: Optional[float] = None
+
+
+@dataclass
+class ScoringConfig:
+    """打分配置(providers.json 中的 "scoring" 段)"""
+    weights: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_WEIGHTS))
+    latency_percentile: float = 50.0
+    tail_percentile: float = 95.0
+    latency_scale: float = 1.0      # 延迟等于该值(秒)时延迟因子为 0.5
+    throughput_scale: float = 50.0  # 生成速度等于该值(tokens/s)时吞吐因子为 0.5
+    cost_scale: float = 15.0        # 价格等于该值($/百万 token)时成本因子为 0.5
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ScoringConfig":
+        """从配置文件读取；未写的权重沿用默认值，未知字段忽略"""
+        values = {key: value for key, value in data.items()
+                  if key in cls.__dataclass_fields__ and key != "weights"}
+        config = cls(**values)
+        config.weights.update({name: float(weight) for name, weight in (data.get("weights") or {}).items()})
+        return config
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _inverse(values: Sequence[Optional[float]], scale: float, unknown: float = NEUTRAL) -> List[float]:
+    """越小越好的量映射到 0..1：scale / (scale + x)"""
+    return [unknown if x is None else scale / (scale + x) if x != math.inf else 0.0 for x in values]
+
+
+def latency_factor(inputs: Sequence[ScoreInputs], config: ScoringConfig) -> List[float]:
+    return _inverse([item.latency for item in inputs], config.latency_scale)
+
+
+def tail_latency_factor(inputs: Sequence[ScoreInputs], config: ScoringConfig) -> List[float]:
+    return _inverse([item.tail_latency for item in inputs], config.latency_scale)
+
+
+def error_rate_factor(inputs: Sequence[ScoreInputs], config: ScoringConfig) -> List[float]:
+    return [1.0 - min(max(item.error_rate, 0.0), 1.0) for item in inputs]
+
+
+CIRCUIT_FACTORS = {"closed": 1.0, "half_open": 0.5, "open": 0.0}
+
+
+def circuit_factor(inputs: Sequence[ScoreInputs], config: ScoringConfig) -> List[float]:
+    return [CIRCUIT_FACTORS.get(item.circuit, 1.0) for item in inputs]
+
+
+def throughput_factor(inputs: Sequence[ScoreInputs], config: ScoringConfig) -> List[float]:
+    scale = config.throughput_scale
+    return [NEUTRAL if not item.tokens_per_sec else item.tokens_per_sec / (item.tokens_per_sec + scale)
+            for item in inputs]
+
+
+def headroom_factor(inputs: Sequence[ScoreInputs], config: ScoringConfig) -> List[float]:
+    # 没有返回速率限制头部的提供者按额度充足处理
+    return [1.0 if item.headroom is None else min(max(item.headroom, 0.0), 1.0) for item in inputs]
+
+
+def priority_factor(inputs: Sequence[ScoreInputs], config: ScoringConfig) -> List[float]:
+    return [1.0 / max(item.priority, 1) for item in inputs]
+
+
+def cost_factor(inputs: Sequence[ScoreInputs], config: ScoringConfig) -> List[float]:
+    return _inverse([item.cost_per_mtok for item in inputs], config.cost_scale)
+
+
+Factor = Callable[[Sequence[ScoreInputs], ScoringConfig], List[float]]
+
+FACTORS: Dict[str, Factor] = {
+    "latency": latency_factor,
+    "tail_latency": tail_latency_factor,
+    "error_rate": error_rate_factor,
+    "circuit": circuit_factor,
+    "throughput": throughput_factor,
+    "headroom": headroom_factor,
+    "priority": priority_factor,
+    "cost": cost_factor,
+}
+
+
+def register_factor(name: str, factor: Factor):
+    """注册自定义因子：factor(inputs, config) 对每个提供者返回 0..1 的值(1 最好)，需在配置中给它权重"""
+    FACTORS[name] = factor
+
+
+@dataclass
+class ScoreBreakdown:
+    """一个提供者的得分及各因子的贡献，各项 contribution 之和等于 score"""
+    name: str
+    score: float
+    factors: Dict[str, Dict[str, float]]    # 因子名 -> {"value", "weight", "contribution"}
+
+
+class ScoringEngine:
+    """按列批量计算所有提供者的得分"""
+
+    def __init__(self, config: Optional[ScoringConfig] = None):
+        self.config = config or ScoringConfig()
+
+    def active_factors(self) -> List[tuple]:
+        """(因子名, 归一化后的权重)，权重为 0 或未注册的因子跳过"""
+        active = [(name, weight) for name, weight in self.config.weights.items()
+                  if weight > 0 and name in FACTORS]
+        total = sum(weight for _, weight in active)
+        return [(name, weight / total) for name, weight in active] if total else []
+
+    def columns(self, inputs: Sequence[ScoreInputs]) -> Dict[str, List[float]]:
+        return {name: FACTORS[name](inputs, self.config) for name, _ in self.active_factors()}
+
+    def score(self, inputs: Sequence[ScoreInputs]) -> array:
+        """每个提供者的得分(0..1，越大越好)，与 inputs 一一对应"""
+        scores = array('d', bytes(8 * len(inputs)))
+        for name, weight in self.active_factors():
+            for i, value in enumerate(FACTORS[name](inputs, self.config)):
+                scores[i] += weight * value
+        return scores
+
+    def explain(self, inputs: Sequence[ScoreInputs]) -> List[ScoreBreakdown]:
+        """得分明细：每个因子的取值、权重和对总分的贡献"""
+        weights = dict(self.active_factors())
+        columns = self.columns(inputs)
+        result = []
+        for i, item in enumerate(inputs):
+            factors = {
+                name: {"value": column[i], "weight": weights[name], "contribution": weights[name] * column[i]}
+                for name, column in columns.items()
+            }
+            result.append(ScoreBreakdown(
+                name=item.name,
+                score=sum(factor["contribution"] for factor in factors.values()),
+                factors=factors
+            ))
+        return result
@@ -10,15 +10,30 @@ Repository: https://github.com/username/easy-claude-code
 License: MIT
 """
 
-import asyncio
-import aiohttp
+import heapq
+import itertools
 import json
+import math
 import os
+import sys
+import threading
 import time
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass
+from array import array
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Tuple
+from dataclasses import dataclass, asdict, field, fields, replace
 from enum import Enum
 
+from health_store import HealthSnapshot, HealthStore
+from metrics import ProviderMetrics
+from provider_scoring import ScoreBreakdown, ScoreInputs, ScoringConfig, ScoringEngine, ratelimit_headroom
+import profiling
+from profiling import traced
+
+if TYPE_CHECKING:
+    # asyncio/aiohttp 只在真正联网时才导入(见各网络方法)，命令行的冷启动不必为它们付出代价
+    import asyncio
+    import aiohttp
+
 
 class ProviderType(Enum):
     OPENROUTER = "openrouter"
@@ -42,9 +57,32 @@ class ProviderConfig:
     model: str
     small_fast_model: str
     custom_headers: Optional[Dict[str, str]] = None
-    priority: int = 1
+    priority: int = 1                     # 1 最优先
     max_retries: int = 3
     timeout: float = 30.0
+    cost_per_mtok: Optional[float] = None  # 每百万 token 的价格，用于成本因子
+
+@dataclass
+class ConfigChanges:
+    """一次配置热重载的差异"""
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    reprobe: List[str] = field(default_factory=list)    # 需要重新探测的(新增或端点变化)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+
+@dataclass
+class HttpPoolConfig:
+    """健康检查共享连接池配置"""
+    limit: int = 100                # 连接池总连接数上限
+    limit_per_host: int = 4         # 每个主机的连接数上限
+    keepalive_timeout: float = 60.0 # 空闲连接保活时间(秒)
+    dns_cache_ttl: int = 300        # DNS缓存时间(秒)
+    connect_timeout: float = 10.0   # 建立连接超时(秒)
+    max_concurrent_probes: int = 32 # 同时进行的健康检查数上限
 
 @dataclass
 class ProjectDirectory:
@@ -53,6 +91,24 @@ class ProjectDirectory:
     description: str = ""
 
 
+# 一次请求的各个阶段，依次发生
+PHASES = ("dns", "connect", "tls", "send", "ttfb")
+# 与请求内容无关、网关转发和探测可以共用的网络阶段
+NETWORK_PHASES = ("dns", "connect", "tls")
+
+
+@dataclass
+class PhaseTimings:
+    """一次请求各阶段耗时(秒，单调时钟)；None 表示本次没有这个阶段(复用连接、DNS 缓存命中、明文 HTTP)"""
+    dns: Optional[float] = None
+    connect: Optional[float] = None
+    tls: Optional[float] = None
+    send: Optional[float] = None
+    ttfb: Optional[float] = None      # 请求发完到收到响应头
+    total: Optional[float] = None
+    reused: bool = False              # 复用了连接池里的连接
+
+
 @dataclass
 class HealthStatus:
     provider_name: str
@@ -60,6 +116,227 @@ class HealthStatus:
     response_time: float
     last_check: float
     error_message: Optional[str] = None
+    stale: bool = False       # 来自上次运行的缓存结果，尚未被新的探测刷新
+    phases: Optional[PhaseTimings] = None
+    status_code: Optional[int] = None
+    shared_from: Optional[str] = None  # 同源共享的探测结果：实际发出探测的提供者
+
+
+@dataclass
+class InferenceStatus:
+    """深度探测结果：一次真实的小型流式推理请求"""
+    provider_name: str
+    ok: bool
+    ttft: float               # 首个 token 到达时间(秒)
+    total_time: float         # 整个请求耗时(秒)
+    output_tokens: int
+    tokens_per_sec: float
+    last_check: float
+    error_message: Optional[str] = None
+
+
+@dataclass
+class LatencyStats:
+    """某个提供者最近一段时间的延迟统计"""
+    samples: int
+    ewma: float
+    p50: float
+    p95: float
+    p99: float
+    error_rate: float
+
+
+class LatencyHistory:
+    """固定容量的延迟环形缓冲区
+
+    延迟和探测结果分别存放在两个定长 array 中，写满后覆盖最旧的样本。
+    EWMA 在写入时增量更新，百分位只统计成功的样本。
+    """
+    
+    def __init__(self, capacity: int = 64, alpha: float = 0.2):
+        self.capacity = capacity
+        self.alpha = alpha
+        self._latencies = array('d', bytes(8 * capacity))
+        self._outcomes = array('b', bytes(capacity))
+        self._index = 0
+        self._count = 0
+        self._ewma = math.inf
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def record(self, latency: float, ok: bool):
+        """记录一次探测结果"""
+        self._latencies[self._index] = latency
+        self._outcomes[self._index] = 1 if ok else 0
+        self._index = (self._index + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        
+        if ok:
+            if self._ewma == math.inf:
+                self._ewma = latency
+            else:
+                self._ewma = self.alpha * latency + (1 - self.alpha) * self._ewma
+    
+    @property
+    def ewma(self) -> float:
+        return self._ewma
+    
+    def dump(self) -> Tuple[bytes, bytes, int, int, float]:
+        """导出原始缓冲区，用于持久化"""
+        return self._latencies.tobytes(), self._outcomes.tobytes(), self._index, self._count, self._ewma
+    
+    @classmethod
+    def restore(cls, latencies: bytes, outcomes: bytes, index: int, count: int, ewma: float) -> "LatencyHistory":
+        """从 dump() 的结果恢复"""
+        history = cls(capacity=len(outcomes))
+        history._latencies = array('d', latencies)
+        history._outcomes = array('b', outcomes)
+        history._index = index
+        history._count = count
+        history._ewma = ewma
+        return history
+    
+    def error_rate(self) -> float:
+        """失败样本占比，无样本时为 0"""
+        if not self._count:
+            return 0.0
+        return 1.0 - sum(self._outcomes[:self._count]) / self._count
+    
+    def _ok_latencies(self) -> List[float]:
+        """窗口内成功样本的延迟(已排序)"""
+        return sorted(self._latencies[i] for i in range(self._count) if self._outcomes[i])
+    
+    @staticmethod
+    def _nearest_rank(sorted_latencies: List[float], q: float) -> float:
+        if not sorted_latencies:
+            return math.inf
+        rank = max(math.ceil(q / 100 * len(sorted_latencies)), 1)
+        return sorted_latencies[rank - 1]
+    
+    def percentile(self, q: float) -> float:
+        """成功样本的 q 分位延迟(最近秩法)，无成功样本时为 inf"""
+        return self._nearest_rank(self._ok_latencies(), q)
+    
+    def percentiles(self, *qs: float) -> List[float]:
+        """一次排序取多个分位"""
+        ok_latencies = self._ok_latencies()
+        return [self._nearest_rank(ok_latencies, q) for q in qs]
+    
+    def stats(self) -> LatencyStats:
+        """汇总当前窗口内的统计数据"""
+        ok_latencies = self._ok_latencies()
+        return LatencyStats(
+            samples=self._count,
+            ewma=self._ewma,
+            p50=self._nearest_rank(ok_latencies, 50),
+            p95=self._nearest_rank(ok_latencies, 95),
+            p99=self._nearest_rank(ok_latencies, 99),
+            error_rate=self.error_rate()
+        )
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """单个提供者的熔断器
+
+    连续失败达到阈值(ProviderConfig.max_retries)后断开，冷却 reset_timeout 秒后进入半开状态，
+    半开时只放行少量试探请求：试探成功则恢复，失败则重新断开。
+    """
+    
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0, half_open_trials: int = 1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_trials = half_open_trials
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._state = CircuitState.CLOSED
+        self._trials_in_flight = 0
+        self._trial_started_at = 0.0
+    
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._state = CircuitState.HALF_OPEN
+            self._trials_in_flight = 0
+        return self._state
+    
+    def retry_after(self) -> float:
+        """距离进入半开状态还需等待的秒数"""
+        if self.state != CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+    
+    def allow_request(self) -> bool:
+        """是否放行一次请求；半开状态下会占用一个试探名额，调用方必须随后记录结果"""
+        state = self.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state != CircuitState.HALF_OPEN:
+            return False
+        now = time.monotonic()
+        if self._trials_in_flight >= self.half_open_trials and now - self._trial_started_at >= self.reset_timeout:
+            # 试探请求迟迟没有结果(例如被取消)，不能让熔断器一直卡在半开
+            self._trials_in_flight = 0
+        if self._trials_in_flight < self.half_open_trials:
+            self._trials_in_flight += 1
+            self._trial_started_at = now
+            return True
+        return False
+    
+    def snapshot(self) -> Tuple[str, int, float]:
+        """导出 (状态, 连续失败次数, 断开时刻的墙上时间)，用于持久化"""
+        opened_at_wall = time.time() - (time.monotonic() - self.opened_at) if self.opened_at else 0.0
+        return self._state.value, self.consecutive_failures, opened_at_wall
+    
+    def restore(self, state: str, consecutive_failures: int, opened_at_wall: float):
+        """从 snapshot() 恢复；单调时钟不跨进程，按墙上时间换算已经冷却的时长"""
+        self._state = CircuitState(state)
+        self.consecutive_failures = consecutive_failures
+        if opened_at_wall:
+            self.opened_at = time.monotonic() - max(0.0, time.time() - opened_at_wall)
+        if self._state == CircuitState.HALF_OPEN:
+            self._trials_in_flight = 0
+    
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._trials_in_flight = 0
+        self._state = CircuitState.CLOSED
+    
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == CircuitState.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._state = CircuitState.OPEN
+            self.opened_at = time.monotonic()
+            self._trials_in_flight = 0
+
+
+CONFIG_SAVE_DELAY = 0.5    # 配置修改后延迟写盘的秒数，期间的多次修改合并为一次写入
+# 这些字段变化后旧的健康数据不再可信，需要重新探测
+ENDPOINT_FIELDS = ("type", "base_url", "api_key", "custom_headers")
+# 存活探测的这些响应码取决于所用的密钥，不能共享给同源的其他提供者
+KEY_SPECIFIC_STATUSES = (429,)
+
+# 切换提供者时需要先清理的环境变量
+ANTHROPIC_ENV_VARS = (
+    "ANTHROPIC_API_KEY",
+    "ANTHROPIC_AUTH_TOKEN",
+    "ANTHROPIC_MODEL",
+    "ANTHROPIC_SMALL_FAST_MODEL",
+    "ANTHROPIC_BASE_URL",
+)
+
+# 深度探测：模型为 auto 时使用的模型名、最多生成的 token 数
+DEEP_PROBE_FALLBACK_MODEL = "claude-3-5-haiku-20241022"
+DEEP_PROBE_MAX_TOKENS = 16
+# 深度探测失败后让提供者退出排名的时长(秒)；过期后只通过首 token 历史的错误率扣分
+INFERENCE_FAILURE_TTL = 900.0
+ANTHROPIC_VERSION = "2023-06-01"
 
 
 class AIProviderError(Exception):
@@ -67,6 +344,27 @@ class AIProviderError(Exception):
     pass
 
 
+def atomic_write_json(path: str, data: Dict):
+    """先写同目录下的临时文件再原子替换，写到一半崩溃也不会留下截断的文件"""
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 class AIProviderSwitcher:
     """AI提供者自动切换器"""
     
@@ -75,15 +373,60 @@ class AIProviderSwitcher:
         self.providers: List[ProviderConfig] = []
         self.project_directories: List[ProjectDirectory] = []
         self.health_status: Dict[str, HealthStatus] = {}
+        self.latency_history: Dict[str, LatencyHistory] = {}
+        self.circuit_breakers: Dict[str, CircuitBreaker] = {}
+        self.inference_status: Dict[str, InferenceStatus] = {}
+        self.ttft_history: Dict[str, LatencyHistory] = {}
+        self.inference_failure_ttl = INFERENCE_FAILURE_TTL
+        self.phase_history: Dict[str, Dict[str, LatencyHistory]] = {}
+        self.ratelimit_headroom: Dict[str, float] = {}
+        # 探测源 -> 共用该源的提供者，按需重建(见 origin_groups)
+        self._origin_groups: Optional[Dict[Tuple, List[str]]] = None
         self.current_provider: Optional[str] = None
+        # 按名称索引，避免对列表做线性查找
+        self._provider_index: Dict[str, ProviderConfig] = {}
+        self._project_names: set = set()
+        self._project_paths: set = set()
+        # 增量维护的排名：得分缓存 + 惰性删除的最大堆
+        self._scores: Dict[str, float] = {}
+        self._rank_heap: List[Tuple[float, int, str]] = []
+        self._rank_entry: Dict[str, int] = {}
+        self._rank_seq = itertools.count()
+        self._rank_lock = threading.Lock()
+        self.scoring = ScoringEngine()
+        self.http_pool = HttpPoolConfig()
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._session_loop: Optional["asyncio.AbstractEventLoop"] = None
+        # 上次运行留下的健康状态，启动时即可排名；_dirty 记录尚未落盘的提供商
+        self.health_store = HealthStore(os.path.splitext(config_file)[0] + ".health.db")
+        self._dirty: set = set()
+        self._removed: set = set()
+        # 配置写盘：防抖定时器 + 上次写入/读取时文件的 (mtime, size)，用来识别外部修改
+        self._save_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        self._config_pending = False
+        self._config_signature: Optional[Tuple[int, int]] = None
+        # Prometheus 指标：探测/网关在热路径上累加，其余状态在导出时采样
+        self.metrics = ProviderMetrics(self)
         self.load_config()
+        self.load_health()
     
+    @traced("load_config", "config")
     def load_config(self):
         """加载配置文件"""
         if os.path.exists(self.config_file):
+            self._config_signature = self.config_signature()
             with open(self.config_file, 'r', encoding='utf-8') as f:
                 config_data = json.load(f)
                 
+                # 加载连接池配置
+                pool_data = config_data.get('http_pool', {})
+                self.http_pool = HttpPoolConfig(**{
+                    key: value for key, value in pool_data.items()
+                    if key in HttpPoolConfig.__dataclass_fields__
+                })
+                self.scoring.config = ScoringConfig.from_dict(config_data.get('scoring', {}))
+                
                 # 加载项目目录
                 for dir_data in config_data.get('project_directories', []):
                     project_dir = ProjectDirectory(
@@ -92,31 +435,40 @@ class AIProviderSwitcher:
                         description=dir_data.get('description', '')
                     )
                     self.project_directories.append(project_dir)
+                    self._project_names.add(project_dir.name)
+                    self._project_paths.add(project_dir.path)
                 
                 # 加载提供商
                 for provider_data in config_data.get('providers', []):
-                    provider = ProviderConfig(
-                        name=provider_data['name'],
-                        type=ProviderType(provider_data['type']),
-                        base_url=provider_data['base_url'],
-                        api_key=provider_data['api_key'],
-                        model=provider_data['model'],
-                        small_fast_model=provider_data['small_fast_model'],
-                        custom_headers=provider_data.get('custom_headers'),
-                        priority=provider_data.get('priority', 1),
-                        max_retries=provider_data.get('max_retries', 3),
-                        timeout=provider_data.get('timeout', 30.0)
-                    )
+                    provider = self.parse_provider(provider_data)
                     self.providers.append(provider)
-                    self.health_status[provider.name] = HealthStatus(
-                        provider_name=provider.name,
-                        is_healthy=False,
-                        response_time=float('inf'),
-                        last_check=0
-                    )
+                    self._provider_index[provider.name] = provider
+                    self.health_status[provider.name] = self.unchecked_status(provider.name)
         else:
             self.create_default_config()
     
+    @staticmethod
+    def parse_provider(provider_data: Dict) -> ProviderConfig:
+        """把配置文件中的一项转成 ProviderConfig"""
+        return ProviderConfig(
+            name=provider_data['name'],
+            type=ProviderType(provider_data['type']),
+            base_url=provider_data['base_url'],
+            api_key=provider_data['api_key'],
+            model=provider_data['model'],
+            small_fast_model=provider_data['small_fast_model'],
+            custom_headers=provider_data.get('custom_headers'),
+            priority=provider_data.get('priority', 1),
+            max_retries=provider_data.get('max_retries', 3),
+            timeout=provider_data.get('timeout', 30.0),
+            cost_per_mtok=provider_data.get('cost_per_mtok')
+        )
+    
+    @staticmethod
+    def unchecked_status(name: str) -> HealthStatus:
+        """尚未探测过的提供商的占位状态"""
+        return HealthStatus(provider_name=name, is_healthy=False, response_time=float('inf'), last_check=0)
+    
     def create_default_config(self):
         """创建默认配置文件"""
         default_config = {
@@ -160,15 +512,48 @@ class AIProviderSwitcher:
             ]
         }
         
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(default_config, f, indent=2, ensure_ascii=False)
+        atomic_write_json(self.config_file, default_config)
         
         print(f"默认配置文件已创建: {self.config_file}")
         print("请编辑 providers.json 文件并填入您的 API keys")
         self.load_config()
     
+    @traced("save_config", "config")
     def save_config(self):
-        """保存配置到文件"""
+        """请求保存配置：CONFIG_SAVE_DELAY 内的多次修改合并成一次写入
+
+        定时器线程不是守护线程，进程退出前会等它把最后一次修改写完。
+        """
+        with self._save_lock:
+            self._config_pending = True
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(CONFIG_SAVE_DELAY, self.flush_config)
+            self._save_timer.start()
+    
+    @traced("flush_config", "config")
+    def flush_config(self):
+        """立即写出尚未保存的配置修改"""
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if not self._config_pending:
+                return
+            atomic_write_json(self.config_file, self.config_data())
+            self._config_signature = self.config_signature()
+            self._config_pending = False
+    
+    def config_signature(self) -> Optional[Tuple[int, int]]:
+        """配置文件的 (mtime_ns, size)，文件不存在时为 None"""
+        try:
+            stat = os.stat(self.config_file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def config_data(self) -> Dict:
+        """当前配置的可序列化形式"""
         config_data = {
             "project_directories": [
                 {
@@ -189,36 +574,127 @@ class AIProviderSwitcher:
                     "priority": provider.priority,
                     "max_retries": provider.max_retries,
                     "timeout": provider.timeout,
-                    **({"custom_headers": provider.custom_headers} if provider.custom_headers else {})
+                    **({"custom_headers": provider.custom_headers} if provider.custom_headers else {}),
+                    **({"cost_per_mtok": provider.cost_per_mtok} if provider.cost_per_mtok is not None else {})
                 }
                 for provider in self.providers
             ]
         }
         
-        with open(self.config_file, 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, indent=2, ensure_ascii=False)
+        if self.http_pool != HttpPoolConfig():
+            config_data["http_pool"] = asdict(self.http_pool)
+        if self.scoring.config != ScoringConfig():
+            config_data["scoring"] = self.scoring.config.to_dict()
+        return config_data
+    
+    def reload_config(self) -> ConfigChanges:
+        """增量重新加载被外部修改的配置文件，只更新有变化的提供商
+
+        未变化的提供商保留健康状态和历史；端点相关字段变化的提供商清空旧数据，
+        放进 reprobe 由调用方安排重新探测。文件没有变化、本地还有未写出的修改
+        (以本地为准，稍后会覆盖文件)或文件内容无效时什么也不做。
+        """
+        changes = ConfigChanges()
+        signature = self.config_signature()
+        if self._config_pending or signature is None or signature == self._config_signature:
+            return changes
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                config_data = json.load(f)
+            new_providers = [self.parse_provider(data) for data in config_data.get('providers', [])]
+            new_projects = [
+                ProjectDirectory(name=data['name'], path=data['path'], description=data.get('description', ''))
+                for data in config_data.get('project_directories', [])
+            ]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # 编辑器可能正写到一半，等文件下一次变化再试
+            print(f"重新加载配置失败: {e}")
+            return changes
+        self._config_signature = signature
+        
+        pool_data = config_data.get('http_pool', {})
+        self.http_pool = HttpPoolConfig(**{
+            key: value for key, value in pool_data.items()
+            if key in HttpPoolConfig.__dataclass_fields__
+        })
+        scoring = ScoringConfig.from_dict(config_data.get('scoring', {}))
+        rescore = scoring != self.scoring.config
+        self.scoring.config = scoring
+        self.project_directories = new_projects
+        self._project_names = {project.name for project in new_projects}
+        self._project_paths = {project.path for project in new_projects}
+        
+        providers = []
+        for provider in new_providers:
+            current = self._provider_index.get(provider.name)
+            if current is None:
+                self._provider_index[provider.name] = provider
+                self.health_status[provider.name] = self.unchecked_status(provider.name)
+                changes.added.append(provider.name)
+                changes.reprobe.append(provider.name)
+                providers.append(provider)
+                continue
+            if current != provider:
+                endpoint_changed = any(getattr(current, name) != getattr(provider, name) for name in ENDPOINT_FIELDS)
+                # 原地更新，其他地方持有的引用继续有效
+                for config_field in fields(ProviderConfig):
+                    setattr(current, config_field.name, getattr(provider, config_field.name))
+                changes.changed.append(provider.name)
+                if endpoint_changed:
+                    self.forget_provider_state(provider.name)
+                    self.health_status[provider.name] = self.unchecked_status(provider.name)
+                    changes.reprobe.append(provider.name)
+                self.refresh_rank(provider.name)
+            providers.append(current)
+        
+        kept = {provider.name for provider in providers}
+        for name in list(self._provider_index):
+            if name not in kept:
+                del self._provider_index[name]
+                self.forget_provider_state(name)
+                changes.removed.append(name)
+                if self.current_provider == name:
+                    self.current_provider = None
+        self.providers = providers
+        if rescore:
+            self.rescore_all()
+        if changes:
+            self._origin_groups = None
+        return changes
+    
+    def forget_provider_state(self, name: str):
+        """清除提供商的健康状态、历史和熔断器(包括健康缓存中的记录)"""
+        for state in (self.health_status, self.latency_history, self.circuit_breakers,
+                      self.inference_status, self.ttft_history, self.phase_history, self.ratelimit_headroom):
+            state.pop(name, None)
+        self.metrics.forget(name)
+        self.refresh_rank(name)
+        self._origin_groups = None
+        self._dirty.discard(name)
+        self._removed.add(name)
     
     def add_project_directory(self, name: str, path: str, description: str = ""):
         """添加项目目录"""
         # 检查是否已存在
-        for proj_dir in self.project_directories:
-            if proj_dir.name == name or proj_dir.path == path:
-                return False  # 已存在
+        if name in self._project_names or path in self._project_paths:
+            return False  # 已存在
         
         # 添加新项目目录
         new_proj_dir = ProjectDirectory(name=name, path=path, description=description)
         self.project_directories.append(new_proj_dir)
+        self._project_names.add(name)
+        self._project_paths.add(path)
         self.save_config()
         return True
     
     def add_provider(self, name: str, provider_type: str, base_url: str, api_key: str, 
                     model: str, small_fast_model: str, custom_headers: Optional[Dict[str, str]] = None,
-                    priority: int = 1, max_retries: int = 3, timeout: float = 30.0) -> bool:
+                    priority: int = 1, max_retries: int = 3, timeout: float = 30.0,
+                    cost_per_mtok: Optional[float] = None) -> bool:
         """添加新的AI提供商"""
         # 检查是否已存在
-        for provider in self.providers:
-            if provider.name == name:
-                return False  # 已存在
+        if name in self._provider_index:
+            return False  # 已存在
         
         try:
             # 创建提供商配置
@@ -232,10 +708,13 @@ class AIProviderSwitcher:
                 custom_headers=custom_headers,
                 priority=priority,
                 max_retries=max_retries,
-                timeout=timeout
+                timeout=timeout,
+                cost_per_mtok=cost_per_mtok
             )
             
             self.providers.append(new_provider)
+            self._provider_index[name] = new_provider
+            self._origin_groups = None
             self.save_config()
             return True
         except ValueError:
@@ -243,10 +722,11 @@ class AIProviderSwitcher:
     
     def update_provider(self, name: str, **updates) -> bool:
         """更新提供商配置"""
-        provider = next((p for p in self.providers if p.name == name), None)
+        provider = self.get_provider(name)
         if not provider:
             return False
         
+        endpoint = tuple(getattr(provider, field_name) for field_name in ENDPOINT_FIELDS)
         try:
             # 更新字段
             if 'provider_type' in updates:
@@ -267,7 +747,16 @@ class AIProviderSwitcher:
                 provider.max_retries = updates['max_retries']
             if 'timeout' in updates:
                 provider.timeout = updates['timeout']
+            if 'cost_per_mtok' in updates:
+                provider.cost_per_mtok = updates['cost_per_mtok']
             
+            if endpoint != tuple(getattr(provider, field_name) for field_name in ENDPOINT_FIELDS):
+                # 端点变了，旧端点的健康数据和熔断状态不再可信，回到未检测状态等待重新探测
+                self.forget_provider_state(name)
+                self.health_status[name] = self.unchecked_status(name)
+            # 优先级等变化会影响排名，端点变化会影响探测源分组
+            self.refresh_rank(name)
+            self._origin_groups = None
             self.save_config()
             return True
         except ValueError:
@@ -275,11 +764,13 @@ class AIProviderSwitcher:
     
     def delete_provider(self, name: str) -> bool:
         """删除提供商"""
-        provider = next((p for p in self.providers if p.name == name), None)
+        provider = self.get_provider(name)
         if not provider:
             return False
         
         self.providers.remove(provider)
+        del self._provider_index[name]
+        self.forget_provider_state(name)
         
         # 如果删除的是当前激活的提供商，则清空当前提供商
         if self.current_provider == name:
@@ -292,133 +783,635 @@ class AIProviderSwitcher:
         self.save_config()
         return True
     
+    async def get_session(self) -> "aiohttp.ClientSession":
+        """获取共享的HTTP会话，所有探测复用同一个连接池"""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if self._session is not None and (self._session.closed or self._session_loop is not loop):
+            # 会话绑定在创建它的事件循环上，换了循环只能重建
+            self._session = None
+        
+        if self._session is None:
+            self._session = self.create_session()
+            self._session_loop = loop
+        
+        return self._session
+    
+    def create_session(self, limit: Optional[int] = None, limit_per_host: Optional[int] = None,
+                       **kwargs) -> "aiohttp.ClientSession":
+        """按 http_pool 配置创建一个新的连接池会话(需在事件循环中调用)，请求可按阶段计时
+
+        limit / limit_per_host 可覆盖探测用的连接数上限(0 为不限)。
+        """
+        import aiohttp
+        from probe_trace import TimedTCPConnector, create_trace_config
+        connector = TimedTCPConnector(
+            limit=self.http_pool.limit if limit is None else limit,
+            limit_per_host=self.http_pool.limit_per_host if limit_per_host is None else limit_per_host,
+            ttl_dns_cache=self.http_pool.dns_cache_ttl,
+            keepalive_timeout=self.http_pool.keepalive_timeout
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(sock_connect=self.http_pool.connect_timeout),
+            trace_configs=[create_trace_config()],
+            **kwargs
+        )
+    
+    async def close(self):
+        """关闭共享的HTTP会话，释放所有保活连接，并把未保存的配置和健康状态落盘"""
+        self.flush_config()
+        self.save_health()
+        session, self._session = self._session, None
+        self._session_loop = None
+        if session is not None and not session.closed:
+            await session.close()
+    
+    def probe_request(self, provider: ProviderConfig) -> Tuple[str, Dict[str, str]]:
+        """存活探测的 URL 和请求头"""
+        headers = {
+            "Content-Type": "application/json",
+            **(provider.custom_headers or {})
+        }
+        
+        if provider.type == ProviderType.OPENROUTER:
+            headers["Authorization"] = f"Bearer {provider.api_key}"
+            headers["HTTP-Referer"] = "https://claude.ai"
+            # 使用简单的根路径检查，避免404
+            test_url = f"{provider.base_url.rstrip('/')}"
+        elif provider.type == ProviderType.CUSTOM_ANTHROPIC:
+            headers["x-api-key"] = provider.api_key
+            # 对于 custom_anthropic，检查根路径或v1端点
+            test_url = f"{provider.base_url.rstrip('/')}"
+        elif provider.type == ProviderType.DEEPSEEK:
+            headers["Authorization"] = f"Bearer {provider.api_key}"
+            test_url = f"{provider.base_url}/models"
+        elif provider.type == ProviderType.MOONSHOT:
+            headers["Authorization"] = f"Bearer {provider.api_key}"
+            # Moonshot 使用根路径检查，避免 /models 404
+            test_url = f"{provider.base_url.rstrip('/')}"
+        elif provider.type == ProviderType.ZHIPU:
+            headers["Authorization"] = f"Bearer {provider.api_key}"
+            test_url = f"{provider.base_url}/models"
+        elif provider.type == ProviderType.BAICHUAN:
+            headers["Authorization"] = f"Bearer {provider.api_key}"
+            test_url = f"{provider.base_url}/models"
+        elif provider.type == ProviderType.OFFICIAL_ANTHROPIC:
+            headers["x-api-key"] = provider.api_key
+            test_url = "https://api.anthropic.com/v1/models"
+        elif provider.type == ProviderType.AZURE_OPENAI:
+            headers["api-key"] = provider.api_key
+            test_url = f"{provider.base_url}/openai/deployments?api-version=2023-05-15"
+        elif provider.type == ProviderType.GEMINI:
+            test_url = f"{provider.base_url}/models?key={provider.api_key}"
+        elif provider.type == ProviderType.LOCAL_OLLAMA:
+            test_url = f"{provider.base_url}/api/tags"
+        
+        return test_url, headers
+    
+    def probe_origin(self, provider: ProviderConfig) -> Tuple:
+        """探测源：(scheme, host, port, path, 认证方式)
+
+        认证方式只看携带凭据的请求头名和查询参数名，不看取值，所以同一端点上不同密钥、
+        不同模型的条目属于同一个源，存活探测的结果可以共享。
+        """
+        from urllib.parse import parse_qsl, urlsplit
+        test_url, headers = self.probe_request(provider)
+        parts = urlsplit(test_url)
+        try:
+            port = parts.port
+        except ValueError:
+            port = None
+        return (
+            parts.scheme.lower(),
+            (parts.hostname or "").lower(),
+            port or {"http": 80, "https": 443}.get(parts.scheme.lower()),
+            parts.path.rstrip('/'),
+            tuple(sorted(name.lower() for name in headers)),
+            tuple(sorted(name for name, _ in parse_qsl(parts.query, keep_blank_values=True)))
+        )
+    
+    def origin_groups(self) -> Dict[Tuple, List[str]]:
+        """探测源 -> 共用该源的提供者名称(按配置顺序)"""
+        groups = self._origin_groups
+        if groups is None:
+            groups = {}
+            for provider in self.providers:
+                groups.setdefault(self.probe_origin(provider), []).append(provider.name)
+            self._origin_groups = groups
+        return groups
+    
+    def origin_siblings(self, provider: ProviderConfig) -> List[str]:
+        """与该提供者同源的其他提供者"""
+        return [name for name in self.origin_groups().get(self.probe_origin(provider), ()) if name != provider.name]
+    
+    @staticmethod
+    def can_share(status: HealthStatus) -> bool:
+        """存活探测结果能否共享给同源的其他提供者"""
+        return status.status_code not in KEY_SPECIFIC_STATUSES
+    
+    def needs_own_probe(self, name: str) -> bool:
+        """熔断器不处于闭合状态(半开试探)，或上次结果取决于密钥(如 429)时，必须用自己的密钥探测"""
+        breaker = self.circuit_breakers.get(name)
+        if breaker is not None and breaker.state != CircuitState.CLOSED:
+            return True
+        status = self.health_status.get(name)
+        return status is not None and not self.can_share(status)
+    
+    @staticmethod
+    def shared_status(status: HealthStatus, provider_name: str) -> HealthStatus:
+        """把同源探测结果转成另一个提供者的健康状态"""
+        return replace(status, provider_name=provider_name, shared_from=status.provider_name)
+    
+    @traced("check_provider_health", "probe", detail=lambda self, provider: {"provider": provider.name})
     async def check_provider_health(self, provider: ProviderConfig) -> HealthStatus:
-        """检查单个提供者的健康状态"""
-        start_time = time.time()
+        """检查单个提供者的健康状态，同时记录各阶段耗时"""
+        import aiohttp
+        from probe_trace import PhaseRecorder
+        recorder = PhaseRecorder()
+        start_time = time.perf_counter()
         
         try:
-            headers = {
-                "Content-Type": "application/json",
-                **(provider.custom_headers or {})
-            }
-            
-            if provider.type == ProviderType.OPENROUTER:
-                headers["Authorization"] = f"Bearer {provider.api_key}"
-                headers["HTTP-Referer"] = "https://claude.ai"
-                # 使用简单的根路径检查，避免404
-                test_url = f"{provider.base_url.rstrip('/')}"
-            elif provider.type == ProviderType.CUSTOM_ANTHROPIC:
-                headers["x-api-key"] = provider.api_key
-                # 对于 custom_anthropic，检查根路径或v1端点
-                test_url = f"{provider.base_url.rstrip('/')}"
-            elif provider.type == ProviderType.DEEPSEEK:
-                headers["Authorization"] = f"Bearer {provider.api_key}"
-                test_url = f"{provider.base_url}/models"
-            elif provider.type == ProviderType.MOONSHOT:
-                headers["Authorization"] = f"Bearer {provider.api_key}"
-                # Moonshot 使用根路径检查，避免 /models 404
-                test_url = f"{provider.base_url.rstrip('/')}"
-            elif provider.type == ProviderType.ZHIPU:
-                headers["Authorization"] = f"Bearer {provider.api_key}"
-                test_url = f"{provider.base_url}/models"
-            elif provider.type == ProviderType.BAICHUAN:
-                headers["Authorization"] = f"Bearer {provider.api_key}"
-                test_url = f"{provider.base_url}/models"
-            elif provider.type == ProviderType.OFFICIAL_ANTHROPIC:
-                headers["x-api-key"] = provider.api_key
-                test_url = "https://api.anthropic.com/v1/models"
-            elif provider.type == ProviderType.AZURE_OPENAI:
-                headers["api-key"] = provider.api_key
-                test_url = f"{provider.base_url}/openai/deployments?api-version=2023-05-15"
-            elif provider.type == ProviderType.GEMINI:
-                test_url = f"{provider.base_url}/models?key={provider.api_key}"
-            elif provider.type == ProviderType.LOCAL_OLLAMA:
-                test_url = f"{provider.base_url}/api/tags"
-            
-            async with aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=provider.timeout)
-            ) as session:
-                async with session.get(test_url, headers=headers) as response:
-                    response_time = time.time() - start_time
-                    
-                    # 更宽松的健康检查：200=成功，401/403=服务存在但权限问题，404=端点不存在但可能服务正常
-                    if response.status in [200, 401, 403, 404]:
-                        return HealthStatus(
-                            provider_name=provider.name,
-                            is_healthy=True,
-                            response_time=response_time,
-                            last_check=time.time()
-                        )
-                    else:
-                        return HealthStatus(
-                            provider_name=provider.name,
-                            is_healthy=False,
-                            response_time=response_time,
-                            last_check=time.time(),
-                            error_message=f"HTTP {response.status}"
-                        )
+            test_url, headers = self.probe_request(provider)
+            session = await self.get_session()
+            start_time = time.perf_counter()
+            async with session.get(
+                test_url,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=provider.timeout),
+                trace_request_ctx=recorder
+            ) as response:
+                response_time = time.perf_counter() - start_time
+                # 读完响应体，连接才能放回连接池复用
+                await response.read()
+                self.record_ratelimit(provider.name, response.headers, response.status)
+                
+                # 更宽松的健康检查：200=成功，401/403=服务存在但权限问题，404=端点不存在但可能服务正常
+                if response.status in [200, 401, 403, 404]:
+                    status = HealthStatus(
+                        provider_name=provider.name,
+                        is_healthy=True,
+                        response_time=response_time,
+                        last_check=time.time(),
+                        status_code=response.status
+                    )
+                else:
+                    status = HealthStatus(
+                        provider_name=provider.name,
+                        is_healthy=False,
+                        response_time=response_time,
+                        last_check=time.time(),
+                        error_message=f"HTTP {response.status}",
+                        status_code=response.status
+                    )
         
         except Exception as e:
-            return HealthStatus(
+            status = HealthStatus(
                 provider_name=provider.name,
                 is_healthy=False,
-                response_time=time.time() - start_time,
+                response_time=time.perf_counter() - start_time,
                 last_check=time.time(),
                 error_message=str(e)
             )
+        
+        # 失败的探测也保留已完成的阶段，例如 DNS 成功但连接超时
+        status.phases = recorder.timings()
+        self.metrics.observe_probe(status)
+        return status
+    
+    def anthropic_auth_headers(self, provider: ProviderConfig) -> Dict[str, str]:
+        """按 claude 直连该提供者时的方式生成认证头部(与 activate_provider 的环境变量一致)"""
+        if provider.type == ProviderType.CUSTOM_ANTHROPIC:
+            # ANTHROPIC_AUTH_TOKEN 对应 Bearer 认证
+            headers = {"Authorization": f"Bearer {provider.api_key}"}
+        else:
+            headers = {"x-api-key": provider.api_key}
+        headers.update(provider.custom_headers or {})
+        return headers
     
-    async def check_all_providers(self) -> Dict[str, HealthStatus]:
-        """检查所有提供者的健康状态"""
-        tasks = [self.check_provider_health(provider) for provider in self.providers]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+    def messages_url(self, provider: ProviderConfig) -> str:
+        """claude 实际请求的 /v1/messages 地址"""
+        if provider.type == ProviderType.OFFICIAL_ANTHROPIC:
+            return "https://api.anthropic.com/v1/messages"
+        return f"{provider.base_url.rstrip('/')}/v1/messages"
+    
+    async def check_provider_inference(self, provider: ProviderConfig) -> InferenceStatus:
+        """深度探测：用 small_fast_model 发一个极小的流式请求，测量首 token 时间和生成速度"""
+        import aiohttp
+        model = provider.small_fast_model
+        if not model or model == "auto":
+            model = DEEP_PROBE_FALLBACK_MODEL
+        payload = {
+            "model": model,
+            "max_tokens": DEEP_PROBE_MAX_TOKENS,
+            "stream": True,
+            "messages": [{"role": "user", "content": "ping"}]
+        }
+        headers = {
+            "Content-Type": "application/json",
+            "anthropic-version": ANTHROPIC_VERSION,
+            **self.anthropic_auth_headers(provider)
+        }
         
-        for result in results:
-            if isinstance(result, HealthStatus):
-                self.health_status[result.provider_name] = result
+        start_time = time.perf_counter()
+        ttft = math.inf
+        output_tokens = 0
         
-        return self.health_status
+        def failed(message: str) -> InferenceStatus:
+            return InferenceStatus(
+                provider_name=provider.name,
+                ok=False,
+                ttft=ttft,
+                total_time=time.perf_counter() - start_time,
+                output_tokens=output_tokens,
+                tokens_per_sec=0.0,
+                last_check=time.time(),
+                error_message=message
+            )
+        
+        try:
+            session = await self.get_session()
+            start_time = time.perf_counter()
+            async with session.post(
+                self.messages_url(provider),
+                json=payload,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=provider.timeout)
+            ) as response:
+                self.record_ratelimit(provider.name, response.headers, response.status)
+                if response.status != 200:
+                    await response.read()
+                    return failed(f"HTTP {response.status}")
+                
+                if response.content_type != "text/event-stream":
+                    # 不支持流式的兼容服务，退回普通 JSON 响应
+                    data = await response.json(content_type=None)
+                    ttft = time.perf_counter() - start_time
+                    output_tokens = (data.get("usage") or {}).get("output_tokens") or 0
+                else:
+                    async for line in response.content:
+                        if not line.startswith(b"data:"):
+                            continue
+                        try:
+                            event = json.loads(line[5:])
+                        except ValueError:
+                            continue
+                        event_type = event.get("type")
+                        if event_type == "content_block_delta" and ttft == math.inf:
+                            ttft = time.perf_counter() - start_time
+                        elif event_type == "message_delta":
+                            output_tokens = (event.get("usage") or {}).get("output_tokens") or output_tokens
+                        elif event_type == "error":
+                            return failed((event.get("error") or {}).get("message") or "SSE error event")
+        except Exception as e:
+            return failed(str(e) or type(e).__name__)
+        
+        total_time = time.perf_counter() - start_time
+        if ttft == math.inf:
+            return failed("响应中没有生成任何内容")
+        generation_time = total_time - ttft
+        tokens_per_sec = output_tokens / generation_time if generation_time > 0 and output_tokens else 0.0
+        return InferenceStatus(
+            provider_name=provider.name,
+            ok=True,
+            ttft=ttft,
+            total_time=total_time,
+            output_tokens=output_tokens,
+            tokens_per_sec=tokens_per_sec,
+            last_check=time.time()
+        )
     
-    def get_best_provider(self) -> Optional[str]:
-        """获取最佳可用提供者"""
-        healthy_providers = [
-            name for name, status in self.health_status.items()
-            if status.is_healthy
+    def record_inference(self, result: InferenceStatus):
+        """保存深度探测结果；失败同时记为一次健康检查失败"""
+        self.inference_status[result.provider_name] = result
+        self.metrics.observe_inference(result)
+        history = self.ttft_history.get(result.provider_name)
+        if history is None:
+            history = self.ttft_history[result.provider_name] = LatencyHistory()
+        history.record(result.ttft if result.ok else result.total_time, result.ok)
+        
+        if not result.ok:
+            self.record_health(HealthStatus(
+                provider_name=result.provider_name,
+                is_healthy=False,
+                response_time=result.total_time,
+                last_check=result.last_check,
+                error_message=f"深度探测失败: {result.error_message}"
+            ))
+        else:
+            self.refresh_rank(result.provider_name)
+        self._dirty.add(result.provider_name)
+    
+    async def iter_provider_health(self, providers: Optional[List[ProviderConfig]] = None,
+                                   deep: bool = False) -> AsyncIterator[HealthStatus]:
+        """并发数受限的健康检查，每完成一个就产出一个结果
+
+        最多同时进行 http_pool.max_concurrent_probes 个探测，每个主机的连接数另由连接池限制。
+        同一探测源(见 probe_origin)的提供者只探测一次，结果共享；needs_own_probe() 的提供者、
+        以及本次结果取决于密钥(如 429)时，才逐个用自己的密钥探测。深度探测总是逐个进行。
+        调用方提前退出迭代时，剩余的探测会被取消。
+        """
+        providers = [
+            provider for provider in (self.providers if providers is None else providers)
+            if self.get_circuit(provider.name).allow_request()
         ]
+        if not providers:
+            return
         
-        if not healthy_providers:
-            return None
+        import asyncio
+        results: asyncio.Queue = asyncio.Queue()
+        groups: Dict[Tuple, List[ProviderConfig]] = {}
+        for provider in providers:
+            if self.needs_own_probe(provider.name):
+                groups[(provider.name,)] = [provider]
+            else:
+                groups.setdefault(self.probe_origin(provider), []).append(provider)
+        pending = iter(groups.values())
         
-        # 按优先级排序和响应时间排序
-        provider_scores = []
-        for name in healthy_providers:
-            provider = next(p for p in self.providers if p.name == name)
-            status = self.health_status[name]
-            score = provider.priority / max(status.response_time, 0.1)
-            provider_scores.append((name, score))
+        async def finish(provider: ProviderConfig, status: HealthStatus):
+            self.record_health(status)
+            if deep and status.is_healthy:
+                self.record_inference(await self.check_provider_inference(provider))
+                status = self.health_status[provider.name]
+            await results.put(status)
         
-        provider_scores.sort(key=lambda x: x[1], reverse=True)
-        return provider_scores[0][0] if provider_scores else None
-    
-    def activate_provider(self, provider_name: str) -> bool:
-        """激活指定提供者"""
-        provider = next((p for p in self.providers if p.name == provider_name), None)
-        if not provider:
-            print(f"未找到提供者: {provider_name}")
-            return False
+        async def worker():
+            # 所有 worker 共享同一个迭代器，谁空闲谁取下一组
+            for group in pending:
+                status = await self.check_provider_health(group[0])
+                await finish(group[0], status)
+                for provider in group[1:]:
+                    if self.can_share(status):
+                        await finish(provider, self.shared_status(status, provider.name))
+                    else:
+                        await finish(provider, await self.check_provider_health(provider))
         
-        # 清理所有相关的环境变量，避免混用
-        anthropic_vars_to_clear = [
-            "ANTHROPIC_API_KEY",
-            "ANTHROPIC_AUTH_TOKEN", 
-            "ANTHROPIC_MODEL",
-            "ANTHROPIC_SMALL_FAST_MODEL",
-            "ANTHROPIC_BASE_URL"
-        ]
+        concurrency = max(1, min(self.http_pool.max_concurrent_probes, len(groups)))
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            for _ in range(len(providers)):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.save_health()
+    
+    @traced("check_all_providers", "probe")
+    async def check_all_providers(self, deep: bool = False) -> Dict[str, HealthStatus]:
+        """检查所有提供者的健康状态(熔断中的提供者跳过)；deep=True 时对存活的提供者再做深度探测"""
+        async for _ in self.iter_provider_health(deep=deep):
+            pass
+        return self.health_status
+    
+    def record_health(self, status: HealthStatus):
+        """保存一次探测结果，写入延迟历史并更新熔断器"""
+        self.health_status[status.provider_name] = status
+        history = self.latency_history.get(status.provider_name)
+        if history is None:
+            history = self.latency_history[status.provider_name] = LatencyHistory()
+        history.record(status.response_time, status.is_healthy)
         
-        for var in anthropic_vars_to_clear:
-            if var in os.environ:
-                del os.environ[var]
+        if status.phases is not None:
+            self.record_phases(status.provider_name, status.phases)
         
+        breaker = self.get_circuit(status.provider_name)
+        if status.is_healthy:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        self._dirty.add(status.provider_name)
+        self.refresh_rank(status.provider_name)
+    
+    def record_phases(self, provider_name: str, phases: PhaseTimings, network_only: bool = False):
+        """把各阶段耗时写入对应的历史；没有发生的阶段不记，避免把中位数拉向 0
+
+        network_only=True 只记 DNS/连接/TLS，用于网关转发的真实请求(发送和首字节取决于请求内容)。
+        """
+        histories = self.phase_history.setdefault(provider_name, {})
+        for phase in NETWORK_PHASES if network_only else PHASES:
+            value = getattr(phases, phase)
+            if value is None:
+                continue
+            history = histories.get(phase)
+            if history is None:
+                history = histories[phase] = LatencyHistory()
+            history.record(value, True)
+        self._dirty.add(provider_name)
+    
+    def get_phase_stats(self, provider_name: str) -> Dict[str, float]:
+        """各阶段最近样本的中位数(秒)，没有样本的阶段不出现"""
+        return {
+            phase: history.percentile(50)
+            for phase, history in self.phase_history.get(provider_name, {}).items() if len(history)
+        }
+    
+    def load_health(self):
+        """从健康缓存恢复上次的探测结果(标记为过期)，让启动后立即就能选出最佳提供商"""
+        snapshot = self.health_store.load(self._provider_index)
+        for name, (is_healthy, response_time, last_check, error_message) in snapshot.health.items():
+            self.health_status[name] = HealthStatus(
+                provider_name=name,
+                is_healthy=bool(is_healthy),
+                response_time=response_time,
+                last_check=last_check,
+                error_message=error_message,
+                stale=True
+            )
+        for name, row in snapshot.latency.items():
+            self.latency_history[name] = LatencyHistory.restore(*row)
+        for name, row in snapshot.ttft.items():
+            self.ttft_history[name] = LatencyHistory.restore(*row)
+        for name, rows in snapshot.phases.items():
+            self.phase_history[name] = {phase: LatencyHistory.restore(*row) for phase, row in rows.items()}
+        for name, row in snapshot.circuits.items():
+            self.get_circuit(name).restore(*row)
+        for name, (ok, ttft, total_time, output_tokens, tokens_per_sec, last_check, error_message) \
+                in snapshot.inference.items():
+            self.inference_status[name] = InferenceStatus(
+                provider_name=name, ok=bool(ok), ttft=ttft, total_time=total_time,
+                output_tokens=output_tokens, tokens_per_sec=tokens_per_sec,
+                last_check=last_check, error_message=error_message
+            )
+        if snapshot.health:
+            self.rescore_all()
+    
+    def save_health(self):
+        """把有变化的提供商的健康状态写入缓存"""
+        dirty, self._dirty = self._dirty, set()
+        removed, self._removed = self._removed, set()
+        if not dirty and not removed:
+            return
+        snapshot = HealthSnapshot()
+        for name in dirty:
+            status = self.health_status.get(name)
+            if status is None or status.last_check == 0:
+                continue
+            snapshot.health[name] = (int(status.is_healthy), status.response_time,
+                                     status.last_check, status.error_message)
+            if name in self.latency_history:
+                snapshot.latency[name] = self.latency_history[name].dump()
+            if name in self.ttft_history:
+                snapshot.ttft[name] = self.ttft_history[name].dump()
+            if name in self.phase_history:
+                snapshot.phases[name] = {phase: history.dump() for phase, history in self.phase_history[name].items()}
+            if name in self.circuit_breakers:
+                snapshot.circuits[name] = self.circuit_breakers[name].snapshot()
+            result = self.inference_status.get(name)
+            if result is not None:
+                snapshot.inference[name] = (int(result.ok), result.ttft, result.total_time, result.output_tokens,
+                                            result.tokens_per_sec, result.last_check, result.error_message)
+        self.health_store.save(snapshot, removed)
+    
+    def get_circuit(self, provider_name: str) -> CircuitBreaker:
+        """获取提供者的熔断器，阈值随 max_retries 配置变化"""
+        breaker = self.circuit_breakers.get(provider_name)
+        if breaker is None:
+            breaker = self.circuit_breakers[provider_name] = CircuitBreaker()
+        provider = self.get_provider(provider_name)
+        if provider is not None:
+            breaker.failure_threshold = max(provider.max_retries, 1)
+        return breaker
+    
+    def get_latency_stats(self, provider_name: str) -> Optional[LatencyStats]:
+        """获取提供者的延迟统计，从未探测过时返回 None"""
+        history = self.latency_history.get(provider_name)
+        if history is None or not len(history):
+            return None
+        return history.stats()
+    
+    def get_provider(self, name: str) -> Optional[ProviderConfig]:
+        """按名称获取提供者配置"""
+        return self._provider_index.get(name)
+    
+    def score_inputs(self, provider: ProviderConfig) -> Optional[ScoreInputs]:
+        """收集提供者的打分数据，不可用时返回 None"""
+        status = self.health_status.get(provider.name)
+        if not status or not status.is_healthy:
+            return None
+        # 最近一次深度探测失败(如密钥失效)，即使端点存活也暂时不可用；
+        # 没有新的深度探测来确认时(GUI、不带 --deep 的命令行)，失败结果过期后不再排除
+        inference = self.inference_status.get(provider.name)
+        if (inference is not None and not inference.ok
+                and time.time() - inference.last_check < self.inference_failure_ttl):
+            return None
+        # 用窗口内的分位延迟打分，单次慢探测不会让排名来回跳动；有深度探测数据时以首 token 时间为准
+        history = self.ttft_history.get(provider.name)
+        if history is None or history.ewma == math.inf:
+            history = self.latency_history.get(provider.name)
+        if history is not None and history.ewma != math.inf:
+            config = self.scoring.config
+            latency, tail_latency = history.percentiles(config.latency_percentile, config.tail_percentile)
+            error_rate = history.error_rate()
+        else:
+            latency = tail_latency = status.response_time
+            error_rate = 0.0
+        breaker = self.circuit_breakers.get(provider.name)
+        return ScoreInputs(
+            name=provider.name,
+            latency=latency,
+            tail_latency=tail_latency,
+            error_rate=error_rate,
+            circuit=breaker.state.value if breaker is not None else "closed",
+            tokens_per_sec=inference.tokens_per_sec if inference is not None else None,
+            headroom=self.ratelimit_headroom.get(provider.name),
+            priority=provider.priority,
+            cost_per_mtok=provider.cost_per_mtok
+        )
+    
+    def compute_score(self, provider: ProviderConfig) -> Optional[float]:
+        """计算提供者当前得分(0..1，越大越好)，不可用时返回 None"""
+        inputs = self.score_inputs(provider)
+        if inputs is None:
+            return None
+        return self.scoring.score([inputs])[0]
+    
+    def score_all(self) -> Dict[str, float]:
+        """一次批量计算所有可用提供者的得分"""
+        inputs = [item for item in map(self.score_inputs, self.providers) if item is not None]
+        return dict(zip((item.name for item in inputs), self.scoring.score(inputs)))
+    
+    def explain_scores(self) -> List[ScoreBreakdown]:
+        """所有可用提供者的得分明细，按得分从高到低"""
+        inputs = [item for item in map(self.score_inputs, self.providers) if item is not None]
+        return sorted(self.scoring.explain(inputs), key=lambda item: item.score, reverse=True)
+    
+    def rescore_all(self):
+        """批量重算全部得分并重建排名堆，用于启动和打分配置变化"""
+        scores = self.score_all()
+        with self._rank_lock:
+            self._scores = scores
+            self._rank_entry = {name: next(self._rank_seq) for name in scores}
+            self._rank_heap = [(-score, self._rank_entry[name], name) for name, score in scores.items()]
+            heapq.heapify(self._rank_heap)
+    
+    def record_ratelimit(self, provider_name: str, headers, status: int = 200):
+        """从探测或转发的响应头更新速率限制剩余额度
+
+        不带速率限制头部的非 429 响应说明限流已经解除，清掉旧值(包括 429 留下的 0)，按额度充足处理。
+        """
+        headroom = ratelimit_headroom(headers, status)
+        if headroom == self.ratelimit_headroom.get(provider_name):
+            return
+        if headroom is None:
+            del self.ratelimit_headroom[provider_name]
+        else:
+            self.ratelimit_headroom[provider_name] = headroom
+        self.refresh_rank(provider_name)
+    
+    def refresh_rank(self, name: str):
+        """健康状态或配置变化后重新计算单个提供者的得分，O(log n)"""
+        provider = self.get_provider(name)
+        score = self.compute_score(provider) if provider else None
+        with self._rank_lock:
+            if score is None:
+                self._scores.pop(name, None)
+                self._rank_entry.pop(name, None)
+                return
+            seq = next(self._rank_seq)
+            self._scores[name] = score
+            self._rank_entry[name] = seq
+            heapq.heappush(self._rank_heap, (-score, seq, name))
+            
+            # 过期条目太多时重建堆
+            if len(self._rank_heap) > 2 * len(self._rank_entry) + 64:
+                self._rank_heap = [(-value, self._rank_entry[key], key) for key, value in self._scores.items()]
+                heapq.heapify(self._rank_heap)
+    
+    def _is_open(self, name: str) -> bool:
+        breaker = self.circuit_breakers.get(name)
+        return breaker is not None and breaker.state == CircuitState.OPEN
+    
+    def rank_providers(self) -> List[str]:
+        """按得分从高到低返回所有可用的提供者(熔断中的除外)"""
+        with self._rank_lock:
+            scores = list(self._scores.items())
+        scores.sort(key=lambda x: x[1], reverse=True)
+        # 熔断中的提供者不参与排名，冷却后(半开)重新参与
+        return [name for name, _ in scores if not self._is_open(name)]
+    
+    def get_best_provider(self) -> Optional[str]:
+        """获取最佳可用提供者：取堆顶，跳过过期条目"""
+        with self._rank_lock:
+            skipped = []
+            best = None
+            while self._rank_heap:
+                _, seq, name = self._rank_heap[0]
+                if self._rank_entry.get(name) != seq:
+                    heapq.heappop(self._rank_heap)  # 过期条目
+                    continue
+                if self._is_open(name):
+                    # 熔断中但之后可能恢复，暂时拿出来，查完放回
+                    skipped.append(heapq.heappop(self._rank_heap))
+                    continue
+                best = name
+                break
+            for entry in skipped:
+                heapq.heappush(self._rank_heap, entry)
+            return best
+    
+    def provider_env(self, provider: ProviderConfig) -> Dict[str, str]:
+        """提供者对应的 Claude Code 环境变量(不修改当前进程的环境)"""
         # 基础环境变量
         env_vars = {
             "ANTHROPIC_BASE_URL": provider.base_url,
@@ -456,59 +1449,34 @@ class AIProviderSwitcher:
             for key, value in provider.custom_headers.items():
                 env_var_name = f"ANTHROPIC_CUSTOM_HEADERS_{key.replace('-', '_').upper()}"
                 env_vars[env_var_name] = value
+        return env_vars
+    
+    @traced("activate_provider", "switch", detail=lambda self, provider_name: {"provider": provider_name})
+    def activate_provider(self, provider_name: str) -> bool:
+        """激活指定提供者"""
+        provider = self.get_provider(provider_name)
+        if not provider:
+            print(f"未找到提供者: {provider_name}")
+            return False
+        
+        # 清理所有相关的环境变量，避免混用
+        for var in ANTHROPIC_ENV_VARS:
+            if var in os.environ:
+                del os.environ[var]
+        
+        env_vars = self.provider_env(provider)
         
         # 更新环境变量
         for key, value in env_vars.items():
             os.environ[key] = value
         
+        if provider_name != self.current_provider:
+            self.metrics.switches.labels().inc()
         self.current_provider = provider_name
         
-        # 创建激活文件
-        activate_script = f"""#!/bin/bash
-# Claude Code AI 提供者切换脚本 - {provider.name}
-# 提供商类型: {provider.type.value}
-
-"""
-        
-        # 添加环境变量到脚本
-        for key, value in env_vars.items():
-            activate_script += f'export {key}="{value}"\n'
-        
-        # 添加提供商特定说明
-        if provider.name == "claude_code_nexus":
-            activate_script += """
-# Claude Nekro 特殊配置说明:
-# - 使用 ANTHROPIC_AUTH_TOKEN 而不是 ANTHROPIC_API_KEY
-# - 内置模型映射，无需指定模型名称
-echo "已激活 Claude Nekro 提供商"
-"""
-        elif provider.name == "openrouter_yovy":
-            activate_script += """
-# OpenRouter 特殊配置说明:
-# - 需要明确指定模型名称
-# - 支持多种模型选择
-echo "已激活 OpenRouter 提供商"
-"""
-        elif provider.type == ProviderType.MOONSHOT:
-            activate_script += """
-# Moonshot 特殊配置说明:
-# - 兼容 Claude 格式
-# - 模型名称可选
-echo "已激活 Moonshot 提供商"
-"""
-        else:
-            activate_script += f"""
-echo "已激活 {provider.name} 提供商"
-"""
-        
-        activate_script += 'echo "可以直接使用 claude 命令"\n'
-        
-        with open("activate_provider.sh", "w") as f:
-            f.write(activate_script)
-        
         print(f"已激活提供者: {provider_name}")
-        print("运行以下命令应用更改:")
-        print(f"source activate_provider.sh")
+        print("在其他 shell 中应用(不写任何文件):")
+        print(f'eval "$(python provider_cli.py env {provider_name} --format sh)"')
         
         return True
     
@@ -520,7 +1488,20 @@ echo "已激活 {provider.name} 提供商"
             if health:
                 status = "✅ 正常" if health.is_healthy else "❌ 故障"
                 response_time = f"{health.response_time:.2f}s" if health.response_time != float('inf') else "超时"
-                print(f"{provider.name}: {status} (响应时间: {response_time})")
+                line = f"{provider.name}: {status} (响应时间: {response_time}"
+                stats = self.get_latency_stats(provider.name)
+                if stats and stats.ewma != math.inf:
+                    line += (f", 平均: {stats.ewma:.2f}s, p50/p95/p99: {stats.p50:.2f}/{stats.p95:.2f}/{stats.p99:.2f}s"
+                             f", 错误率: {stats.error_rate:.0%}")
+                breaker = self.circuit_breakers.get(provider.name)
+                if breaker and breaker.state != CircuitState.CLOSED:
+                    line += f", 熔断: {breaker.state.value}"
+                inference = self.inference_status.get(provider.name)
+                if inference and inference.ok:
+                    line += f", 首token: {inference.ttft:.2f}s, {inference.tokens_per_sec:.1f} tok/s"
+                elif inference:
+                    line += f", 深度探测失败: {inference.error_message}"
+                print(line + ")")
         
         if self.current_provider:
             print(f"\n当前激活: {self.current_provider}")
@@ -535,12 +1516,18 @@ echo "已激活 {provider.name} 提供商"
 
 
 async def main():
-    """主函数"""
+    """主函数；--profile[=trace.json] 记录性能追踪"""
+    profiling.enable_from_argv(sys.argv)
     switcher = AIProviderSwitcher()
     
-    # 检查所有提供者状态
+    # 检查所有提供者状态，每完成一个立即显示
     print("正在检测提供者健康状态...")
-    await switcher.check_all_providers()
+    try:
+        async for status in switcher.iter_provider_health(deep="--deep" in sys.argv):
+            state = "✅" if status.is_healthy else "❌"
+            print(f"  {state} {status.provider_name} ({status.response_time:.2f}s)")
+    finally:
+        await switcher.close()
     
     # 显示状态
     switcher.list_providers()
@@ -557,4 +1544,5 @@ async def main():
 
 
 if __name__ == "__main__":
+    import asyncio
     asyncio.run(main())
\ No newline at end of file
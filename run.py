@@ -51,7 +51,7 @@ def setup_config():
     return True
 
 def main():
-    """Main entry point"""
+    """Main entry point (--profile[=trace.json] records a performance trace)"""
     print("🚀 Easy Claude Code - AI Provider Switcher")
     print("=" * 50)
     
@@ -75,6 +75,8 @@ def main():
     # Launch the GUI
     print("🎨 Launching GUI...")
     try:
+        import profiling
+        profiling.enable_from_argv(sys.argv)
         from gui_switcher_v2 import AIProviderGUI_V2
         import tkinter as tk
         
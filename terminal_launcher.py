@@ -10,59 +10,133 @@ Repository: https://github.com/username/easy-claude-code
 License: MIT
 """
 
+import json
 import os
+import shlex
 import subprocess
 import shutil
 import tempfile
+import threading
+import time
 
-def detect_available_terminals():
-    """检测系统中可用的终端"""
-    terminals = [
-        # Ubuntu/Debian 系统通用终端
-        ('x-terminal-emulator', ['x-terminal-emulator', '-e']),  # Debian/Ubuntu 系统默认终端
-        ('sensible-terminal', ['sensible-terminal', '-e']),      # Debian/Ubuntu 系统智能终端选择器
-        
-        # GNOME 桌面环境 (Ubuntu 默认)
-        ('gnome-terminal', ['gnome-terminal', '--']),
-        ('gnome-terminal-server', ['gnome-terminal', '--']),     # 新版本的gnome-terminal
-        
-        # XFCE 桌面环境  
-        ('xfce4-terminal', ['xfce4-terminal', '--hold', '-e']),
-        
-        # KDE 桌面环境
-        ('konsole', ['konsole', '-e']),
-        
-        # MATE 桌面环境 (Ubuntu MATE)
-        ('mate-terminal', ['mate-terminal', '-e']),
-        
-        # 现代终端应用
-        ('tilix', ['tilix', '-e']),                             # Ubuntu 官方仓库中的现代终端
-        ('terminator', ['terminator', '-e']),                   # 流行的多窗格终端
-        ('alacritty', ['alacritty', '-e']),                     # GPU 加速终端
-        ('kitty', ['kitty']),                                   # 现代终端模拟器
-        
-        # 轻量级终端
-        ('lxterminal', ['lxterminal', '-e']),                   # LXDE 终端
-        ('xterm', ['xterm', '-hold', '-e']),                    # 经典终端
-        ('urxvt', ['urxvt', '-hold', '-e']),                    # rxvt-unicode
-        ('rxvt', ['rxvt', '-hold', '-e']),                      # rxvt
-        ('sakura', ['sakura', '-e']),                           # 轻量级终端
-        ('qterminal', ['qterminal', '-e']),                     # LXQt 终端
-        
-        # 其他终端
-        ('deepin-terminal', ['deepin-terminal', '-e']),         # Deepin 终端
-        ('terminology', ['terminology', '-e']),                 # Enlightenment 终端
-        ('st', ['st', '-e']),                                   # Simple Terminal
-    ]
+from profiling import traced
+
+# (检测用的可执行文件名, 启动命令前缀)
+TERMINALS = [
+    # Ubuntu/Debian 系统通用终端
+    ('x-terminal-emulator', ['x-terminal-emulator', '-e']),  # Debian/Ubuntu 系统默认终端
+    ('sensible-terminal', ['sensible-terminal', '-e']),      # Debian/Ubuntu 系统智能终端选择器
+    
+    # GNOME 桌面环境 (Ubuntu 默认)
+    ('gnome-terminal', ['gnome-terminal', '--']),
+    ('gnome-terminal-server', ['gnome-terminal', '--']),     # 新版本的gnome-terminal
+    
+    # XFCE 桌面环境  
+    ('xfce4-terminal', ['xfce4-terminal', '--hold', '-e']),
+    
+    # KDE 桌面环境
+    ('konsole', ['konsole', '-e']),
+    
+    # MATE 桌面环境 (Ubuntu MATE)
+    ('mate-terminal', ['mate-terminal', '-e']),
+    
+    # 现代终端应用
+    ('tilix', ['tilix', '-e']),                             # Ubuntu 官方仓库中的现代终端
+    ('terminator', ['terminator', '-e']),                   # 流行的多窗格终端
+    ('alacritty', ['alacritty', '-e']),                     # GPU 加速终端
+    ('kitty', ['kitty']),                                   # 现代终端模拟器
+    
+    # 轻量级终端
+    ('lxterminal', ['lxterminal', '-e']),                   # LXDE 终端
+    ('xterm', ['xterm', '-hold', '-e']),                    # 经典终端
+    ('urxvt', ['urxvt', '-hold', '-e']),                    # rxvt-unicode
+    ('rxvt', ['rxvt', '-hold', '-e']),                      # rxvt
+    ('sakura', ['sakura', '-e']),                           # 轻量级终端
+    ('qterminal', ['qterminal', '-e']),                     # LXQt 终端
+    
+    # 其他终端
+    ('deepin-terminal', ['deepin-terminal', '-e']),         # Deepin 终端
+    ('terminology', ['terminology', '-e']),                 # Enlightenment 终端
+    ('st', ['st', '-e']),                                   # Simple Terminal
+]
+
+# 根据桌面环境排序终端优先级
+PRIORITY_ORDER = {
+    # Ubuntu 及其变体 - 优先使用系统默认的通用终端
+    'ubuntu': ['x-terminal-emulator', 'sensible-terminal', 'gnome-terminal', 'tilix', 'terminator', 'xterm'],
+    'ubuntu-gnome': ['gnome-terminal', 'x-terminal-emulator', 'tilix', 'terminator', 'xterm'],
+    'ubuntu-unity': ['gnome-terminal', 'x-terminal-emulator', 'unity-terminal', 'xterm'],
+    
+    # 标准桌面环境
+    'gnome': ['gnome-terminal', 'gnome-terminal-server', 'tilix', 'terminator', 'xterm'],
+    'xfce': ['xfce4-terminal', 'x-terminal-emulator', 'xterm', 'lxterminal'],
+    'kde': ['konsole', 'x-terminal-emulator', 'xterm'],
+    'mate': ['mate-terminal', 'x-terminal-emulator', 'xterm'],
+    'lxde': ['lxterminal', 'x-terminal-emulator', 'xterm'],
+    'lxqt': ['qterminal', 'x-terminal-emulator', 'lxterminal', 'xterm'],
+    'deepin': ['deepin-terminal', 'x-terminal-emulator', 'xterm'],
+    'cinnamon': ['gnome-terminal', 'x-terminal-emulator', 'tilix', 'xterm'],
+    'pantheon': ['io.elementary.terminal', 'gnome-terminal', 'x-terminal-emulator', 'xterm'],
+    
+    # 通用回退选项
+    'unknown': ['x-terminal-emulator', 'sensible-terminal', 'gnome-terminal', 'xfce4-terminal', 'konsole', 'xterm'],
+}
+
+# 终端检测缓存：{'signature', 'available', 'desktop', 'sorted', 'claude_env'}
+# desktop 在进程内不会变化，检测一次后一直使用，只在强制刷新时重新检测
+_cache = {}
+_cache_lock = threading.Lock()
+
+# 普通启动时终端里执行的 shell 初始化，快照就是在它之后采集的
+SHELL_INIT = """source ~/.bashrc 2>/dev/null || source ~/.profile 2>/dev/null || true
+export NVM_DIR="${NVM_DIR:-$HOME/.nvm}"
+[ -s "$NVM_DIR/nvm.sh" ] && . "$NVM_DIR/nvm.sh"
+"""
+CLAUDE_ENV_VERSION = 1
+CLAUDE_ENV_MARKER = "__EASY_CLAUDE_CODE_ENV__"
+
+def path_signature():
+    """PATH 以及其中每个目录的 mtime；安装或卸载程序会改变所在目录的 mtime"""
+    path = os.environ.get('PATH', os.defpath)
+    mtimes = []
+    for directory in path.split(os.pathsep):
+        try:
+            mtimes.append(os.stat(directory).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return path, tuple(mtimes)
+
+def detect_available_terminals(refresh=False):
+    """检测系统中可用的终端(结果缓存，PATH 或其目录变化时才重新检测)"""
+    signature = path_signature()
+    with _cache_lock:
+        if not refresh and _cache.get('signature') == signature:
+            return _cache['available']
     
     available = []
-    for name, cmd in terminals:
+    for name, cmd in TERMINALS:
         if shutil.which(name):
             available.append((name, cmd))
     
+    with _cache_lock:
+        _cache['signature'] = signature
+        _cache['available'] = available
+        _cache.pop('sorted', None)
+        if refresh:
+            _cache.pop('desktop', None)
     return available
 
-def get_desktop_environment():
+def get_desktop_environment(refresh=False):
+    """当前桌面环境(检测一次后缓存)"""
+    with _cache_lock:
+        if not refresh and 'desktop' in _cache:
+            return _cache['desktop']
+    desktop_env = detect_desktop_environment()
+    with _cache_lock:
+        _cache['desktop'] = desktop_env
+    return desktop_env
+
+def detect_desktop_environment():
     """检测当前桌面环境"""
     desktop = os.environ.get('XDG_CURRENT_DESKTOP', '').lower()
     session = os.environ.get('DESKTOP_SESSION', '').lower()
@@ -97,71 +171,152 @@ def get_desktop_environment():
     else:
         return 'unknown'
 
-def launch_terminal(command, env=None, working_dir=None, auto_claude=False):
-    """
-    启动终端并执行命令
-    
-    Args:
-        command (str): 要执行的命令
-        env (dict): 环境变量
-        working_dir (str): 工作目录
-        auto_claude (bool): 是否自动启动claude命令
-    
-    Returns:
-        tuple: (success, terminal_name, error_message)
-    """
+def get_sorted_terminals():
+    """按当前桌面环境的偏好排好序的可用终端(随检测结果一起缓存)"""
     available_terminals = detect_available_terminals()
-    
-    if not available_terminals:
-        return False, None, "未找到任何可用的终端应用"
+    with _cache_lock:
+        if _cache.get('available') is available_terminals and 'sorted' in _cache:
+            return _cache['sorted']
     
     desktop_env = get_desktop_environment()
+    # 首先添加首选终端，然后添加其他可用终端
+    by_name = dict(available_terminals)
+    preferred = [pref for pref in PRIORITY_ORDER.get(desktop_env, []) if pref in by_name]
+    sorted_terminals = [(name, by_name[name]) for name in preferred]
+    sorted_terminals += [(name, cmd) for name, cmd in available_terminals if name not in preferred]
+    
+    with _cache_lock:
+        if _cache.get('available') is available_terminals:
+            _cache['sorted'] = sorted_terminals
+    return sorted_terminals
+
+def warm_terminal_cache():
+    """在后台线程里预先检测终端并准备 Node/claude 环境快照，第一次点击启动时不必再等"""
+    def warm():
+        get_sorted_terminals()
+        load_claude_env()
     
-    # 根据桌面环境排序终端优先级
-    priority_order = {
-        # Ubuntu 及其变体 - 优先使用系统默认的通用终端
-        'ubuntu': ['x-terminal-emulator', 'sensible-terminal', 'gnome-terminal', 'tilix', 'terminator', 'xterm'],
-        'ubuntu-gnome': ['gnome-terminal', 'x-terminal-emulator', 'tilix', 'terminator', 'xterm'],
-        'ubuntu-unity': ['gnome-terminal', 'x-terminal-emulator', 'unity-terminal', 'xterm'],
-        
-        # 标准桌面环境
-        'gnome': ['gnome-terminal', 'gnome-terminal-server', 'tilix', 'terminator', 'xterm'],
-        'xfce': ['xfce4-terminal', 'x-terminal-emulator', 'xterm', 'lxterminal'],
-        'kde': ['konsole', 'x-terminal-emulator', 'xterm'],
-        'mate': ['mate-terminal', 'x-terminal-emulator', 'xterm'],
-        'lxde': ['lxterminal', 'x-terminal-emulator', 'xterm'],
-        'lxqt': ['qterminal', 'x-terminal-emulator', 'lxterminal', 'xterm'],
-        'deepin': ['deepin-terminal', 'x-terminal-emulator', 'xterm'],
-        'cinnamon': ['gnome-terminal', 'x-terminal-emulator', 'tilix', 'xterm'],
-        'pantheon': ['io.elementary.terminal', 'gnome-terminal', 'x-terminal-emulator', 'xterm'],
-        
-        # 通用回退选项
-        'unknown': ['x-terminal-emulator', 'sensible-terminal', 'gnome-terminal', 'xfce4-terminal', 'konsole', 'xterm'],
+    thread = threading.Thread(target=warm, daemon=True)
+    thread.start()
+    return thread
+
+def claude_env_cache_path():
+    """Node/claude 环境快照的缓存文件"""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'easy-claude-code', 'claude_env.json')
+
+def _file_mtimes(paths):
+    """{路径: mtime_ns}，不存在的文件记为 None"""
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+def capture_claude_env(timeout=20):
+    """执行一次完整的 shell 初始化(bashrc + nvm)，记录最终的 PATH、node 和 claude 路径
+
+    同时记下 shell 配置、nvm 默认版本以及 node/claude 本身的 mtime，任何一个变化快照就失效。
+    """
+    script = SHELL_INIT + (
+        f'printf "{CLAUDE_ENV_MARKER}%s\\0%s\\0%s\\0" '
+        '"$PATH" "$(command -v node)" "$(command -v claude)"'
+    )
+    try:
+        result = subprocess.run(['bash', '-c', script], stdin=subprocess.DEVNULL,
+                                capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    # bashrc 可能自己也会输出内容，只取标记之后的部分
+    marker = result.stdout.rfind(CLAUDE_ENV_MARKER)
+    if marker < 0:
+        return None
+    path, node, claude = result.stdout[marker + len(CLAUDE_ENV_MARKER):].split('\0')[:3]
+    
+    home = os.path.expanduser('~')
+    nvm_dir = os.environ.get('NVM_DIR') or os.path.join(home, '.nvm')
+    watched = [os.path.join(home, '.bashrc'), os.path.join(home, '.profile'),
+               os.path.join(nvm_dir, 'nvm.sh'), os.path.join(nvm_dir, 'alias', 'default')]
+    watched += [binary for binary in (node, claude) if binary]
+    snapshot = {
+        'version': CLAUDE_ENV_VERSION,
+        'path': path,
+        'node': node or None,
+        'claude': claude or None,
+        'captured_at': time.time(),
+        'files': _file_mtimes(watched),
     }
     
-    # 重新排序可用终端
-    preferred_terminals = priority_order.get(desktop_env, [])
-    sorted_terminals = []
+    cache_file = claude_env_cache_path()
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_file), suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp_path, cache_file)
+    except OSError:
+        pass  # 写不了缓存只是下次还要重新采集
+    return snapshot
+
+def load_claude_env(refresh=False):
+    """读取 Node/claude 环境快照，缓存缺失或相关文件 mtime 变化时重新采集"""
+    if not refresh:
+        with _cache_lock:
+            snapshot = _cache.get('claude_env')
+        if snapshot is None:
+            try:
+                with open(claude_env_cache_path(), 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                snapshot = None
+        if snapshot and snapshot.get('version') == CLAUDE_ENV_VERSION \
+                and _file_mtimes(snapshot['files']) == snapshot['files']:
+            with _cache_lock:
+                _cache['claude_env'] = snapshot
+            return snapshot
     
-    # 首先添加首选终端
-    for pref in preferred_terminals:
-        for name, cmd in available_terminals:
-            if name == pref:
-                sorted_terminals.append((name, cmd))
-                break
+    snapshot = capture_claude_env()
+    with _cache_lock:
+        _cache['claude_env'] = snapshot
+    return snapshot
+
+def merge_env(env=None):
+    """当前进程环境 + env；env 自带提供商变量时，不继承当前进程里其他提供商的 ANTHROPIC_* 变量"""
+    full_env = os.environ.copy()
+    if env:
+        if any(key.startswith('ANTHROPIC_') for key in env):
+            full_env = {key: value for key, value in full_env.items() if not key.startswith('ANTHROPIC_')}
+        full_env.update(env)
+    return full_env
+
+def build_fast_launch_command(env=None, working_dir=None):
+    """快速启动：用快照里的 PATH 直接执行 claude，跳过 bashrc/nvm 和等待
+
+    找不到 claude 时返回 None，由调用方退回普通启动。
+    """
+    snapshot = load_claude_env()
+    if not snapshot or not snapshot.get('claude'):
+        return None
     
-    # 然后添加其他可用终端
-    for name, cmd in available_terminals:
-        if not any(name == t[0] for t in sorted_terminals):
-            sorted_terminals.append((name, cmd))
+    full_env = merge_env(env)
+    full_env['PATH'] = snapshot['path']
     
+    # 有些终端(如 gnome-terminal)由服务进程创建窗口，不继承环境，所以仍把变量内联到命令里
+    exports = ''.join(
+        f'export {key}={shlex.quote(value)}; '
+        for key, value in full_env.items() if key.startswith('ANTHROPIC_') or key == 'PATH'
+    )
+    cd = f'cd {shlex.quote(working_dir)}; ' if working_dir else ''
+    # claude 退出后进入交互式 bash，终端保持可用
+    full_command = f'{exports}{cd}{shlex.quote(snapshot["claude"])}; exec bash'
+    return full_command, full_env
+
+def build_launch_command(command, env=None, working_dir=None, auto_claude=False):
+    """生成终端里执行的 bash 脚本(加载 shell 配置和 NVM)，返回 (脚本, 完整环境变量)"""
     # 准备环境变量
-    if env is None:
-        env = os.environ.copy()
-    else:
-        full_env = os.environ.copy()
-        full_env.update(env)
-        env = full_env
+    env = merge_env(env)
     
     # 准备启动命令 - 将环境变量内联到命令中
     env_setup = ""
@@ -269,7 +424,36 @@ echo
         else:
             full_command = f'{env_setup}{setup_cmd}bash'
     
+    return full_command, env
+
+@traced("launch_terminal", "launch", detail=lambda command, env=None, working_dir=None, **kwargs: {"working_dir": working_dir})
+def launch_terminal(command, env=None, working_dir=None, auto_claude=False, fast=False):
+    """
+    启动终端并执行命令
+    
+    Args:
+        command (str): 要执行的命令
+        env (dict): 环境变量
+        working_dir (str): 工作目录
+        auto_claude (bool): 是否自动启动claude命令
+        fast (bool): 与 auto_claude 一起使用，按环境快照直接执行 claude
+    
+    Returns:
+        tuple: (success, terminal_name, error_message)
+    """
+    # 检测结果已缓存(GUI 启动时预热)，这里通常直接命中
+    sorted_terminals = get_sorted_terminals()
+    
+    if not sorted_terminals:
+        return False, None, "未找到任何可用的终端应用"
+    
+    prepared = build_fast_launch_command(env, working_dir) if fast and auto_claude else None
+    if prepared is None:
+        prepared = build_launch_command(command, env, working_dir, auto_claude)
+    full_command, env = prepared
+    
     # 尝试启动终端
+    last_error = None
     for terminal_name, terminal_cmd in sorted_terminals:
         try:
             if terminal_name == 'gnome-terminal':
@@ -288,7 +472,6 @@ echo
                 cmd = ['xfce4-terminal', '-e', temp_script_path]
                 
                 # 延迟删除脚本文件
-                import threading
                 def cleanup_later():
                     import time
                     time.sleep(10)  # 给终端时间读取脚本
@@ -309,9 +492,10 @@ echo
             return True, terminal_name, None
             
         except Exception as e:
+            last_error = e
             continue
     
-    return False, None, f"所有终端启动失败: {str(e)}"
+    return False, None, f"所有终端启动失败: {str(last_error)}"
 
 def test_terminal_detection():
     """测试终端检测功能"""
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Async Worker Tests
+
+Run with: python -m unittest test_async_worker
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+
+from async_worker import AsyncWorker
+
+
+def poll_until(worker: AsyncWorker, predicate, timeout: float = 5.0):
+    """模拟 Tk 的定时器：在主线程反复 poll() 直到条件满足"""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待结果超时")
+        worker.poll()
+        time.sleep(0.01)
+
+
+class AsyncWorkerTest(unittest.TestCase):
+    def setUp(self):
+        self.shutdown_ran = threading.Event()
+
+        async def on_shutdown():
+            self.shutdown_ran.set()
+
+        self.worker = AsyncWorker(on_shutdown=on_shutdown)
+        self.worker.start()
+        self.addCleanup(self.worker.stop)
+
+    def test_results_are_delivered_on_the_polling_thread(self):
+        results = []
+
+        async def work():
+            return threading.current_thread().name
+
+        self.worker.submit(work(), on_done=lambda value: results.append((value, threading.current_thread())))
+        time.sleep(0.05)
+        self.assertEqual(results, [])  # 没有 poll() 之前不会回调
+        poll_until(self.worker, lambda: results)
+        self.assertEqual(results, [("async-worker", threading.current_thread())])
+
+    def test_errors_go_to_on_error(self):
+        errors = []
+
+        async def work():
+            raise ValueError("boom")
+
+        self.worker.submit(work(), on_done=self.fail, on_error=errors.append)
+        poll_until(self.worker, lambda: errors)
+        self.assertIsInstance(errors[0], ValueError)
+
+    def test_submit_call_runs_blocking_function_off_the_loop(self):
+        results = []
+        self.worker.submit_call(lambda a, b: (a + b, threading.current_thread().name), 1, b=2,
+                                on_done=results.append)
+        poll_until(self.worker, lambda: results)
+        value, thread_name = results[0]
+        self.assertEqual(value, 3)
+        self.assertNotEqual(thread_name, "async-worker")
+
+    def test_poll_limit(self):
+        for _ in range(5):
+            self.worker.post(lambda: None)
+        self.assertEqual(self.worker.poll(limit=3), 3)
+        self.assertEqual(self.worker.poll(), 2)
+
+    def test_stop_cancels_pending_work_and_runs_cleanup(self):
+        cancelled = threading.Event()
+
+        async def forever():
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        self.worker.submit(forever())
+        time.sleep(0.05)
+        self.worker.stop()
+        self.assertTrue(cancelled.is_set())
+        self.assertTrue(self.shutdown_ran.is_set())
+        self.assertFalse(self.worker.running)
+
+        coro = forever()
+        with self.assertRaises(RuntimeError):
+            self.worker.submit(coro)
+        coro.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Health Monitor Tests
+
+Scheduling tests for the background health monitor.
+Run with: python -m unittest test_health_monitor
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from health_monitor import HealthMonitor, MonitorConfig, ProbeSchedule
+from provider_switch import AIProviderSwitcher, HealthStatus
+
+
+def status(name: str, healthy: bool) -> HealthStatus:
+    return HealthStatus(provider_name=name, is_healthy=healthy, response_time=0.1, last_check=time.time())
+
+
+def make_switcher(directory: str, names, shared_origin: bool = False) -> AIProviderSwitcher:
+    config_file = os.path.join(directory, "providers.json")
+    with open(config_file, "w", encoding="utf-8") as f:
+        json.dump({"providers": [
+            {"name": name, "type": "custom_anthropic", "api_key": f"key-{name}", "model": "m", "small_fast_model": "m",
+             "base_url": "http://127.0.0.1:9/shared" if shared_origin else f"http://127.0.0.1:9/{name}"}
+            for name in names
+        ]}, f)
+    return AIProviderSwitcher(config_file)
+
+
+class NextIntervalTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.monitor = HealthMonitor(make_switcher(self.tmp.name, ["a"]), MonitorConfig())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_stable_provider_stays_at_ceiling_after_many_rounds(self):
+        # 运行约一周后 stable_rounds 超过 1024，2 ** n 不能溢出
+        schedule = ProbeSchedule("a", stable_rounds=5000)
+        interval = self.monitor._next_interval(schedule, status("a", True), status("a", True))
+        self.assertEqual(interval, self.monitor.config.healthy_max_interval)
+
+    def test_long_dead_provider_stays_at_ceiling(self):
+        schedule = ProbeSchedule("a", consecutive_failures=5000)
+        interval = self.monitor._next_interval(schedule, status("a", False), status("a", False))
+        self.assertEqual(interval, self.monitor.config.failure_max_interval)
+
+    def test_backoff_doubles_until_ceiling(self):
+        schedule = ProbeSchedule("a")
+        intervals = [self.monitor._next_interval(schedule, None, status("a", False)) for _ in range(8)]
+        self.assertEqual(intervals, [10.0, 20.0, 40.0, 80.0, 160.0, 320.0, 640.0, 900.0])
+
+
+class ProbeErrorTest(unittest.IsolatedAsyncioTestCase):
+    async def test_probe_exception_still_reschedules(self):
+        # 探测抛出意外异常时任务不能悄悄结束，提供商要重新排期
+        with tempfile.TemporaryDirectory() as directory:
+            switcher = make_switcher(directory, ["a"])
+            monitor = HealthMonitor(switcher, MonitorConfig())
+            monitor._wakeup = asyncio.Event()
+
+            async def broken(provider):
+                raise RuntimeError("boom")
+
+            switcher.check_provider_health = broken
+            schedule = monitor.schedules["a"] = ProbeSchedule("a", next_due=time.monotonic())
+            await monitor._probe_group(["a"], asyncio.Semaphore(1))
+
+            self.assertGreater(schedule.next_due, time.monotonic())
+            self.assertIn((schedule.next_due, "a"), monitor._heap)
+            self.assertNotIn("a", monitor._probing)
+
+
+class SharedOriginScheduleTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.switcher = make_switcher(tmp.name, ["a", "b", "c"], shared_origin=True)
+        self.monitor = HealthMonitor(self.switcher, MonitorConfig())
+        self.monitor._wakeup = asyncio.Event()
+        self.probed = []
+        self.status_code = 200
+
+        async def check(provider):
+            self.probed.append(provider.name)
+            return HealthStatus(provider.name, self.status_code == 200, 0.1, time.time(),
+                                status_code=self.status_code)
+
+        self.switcher.check_provider_health = check
+        self.monitor._sync_schedules()
+
+    async def probe_due(self):
+        semaphore = asyncio.Semaphore(4)
+        for names in self.monitor._group_by_origin(self.monitor._pop_due(time.monotonic())):
+            await self.monitor._probe_group(names, semaphore)
+
+    async def test_origin_is_probed_once_and_siblings_stay_behind_it(self):
+        await self.probe_due()
+        self.assertEqual(self.probed, ["a"])
+        schedules = self.monitor.schedules
+        self.assertEqual(self.switcher.health_status["c"].shared_from, "a")
+        # 同源的提供者排在代表它们探测的 a 之后，下一轮仍只探测一次
+        self.assertTrue(all(schedules[name].next_due >= schedules["a"].next_due for name in ("b", "c")))
+
+    async def test_followers_are_requeued_after_key_specific_result(self):
+        self.status_code = 429
+        await self.probe_due()
+        self.assertEqual(self.probed, ["a"])
+        # b、c 要立即用自己的密钥各自探测
+        await self.probe_due()
+        self.assertEqual(sorted(self.probed), ["a", "b", "c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Health Store Tests
+
+Run with: python -m unittest test_health_store
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from health_store import HealthSnapshot, HealthStore
+from provider_switch import AIProviderSwitcher, CircuitState, HealthStatus
+
+
+class HealthStoreRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.config_file = os.path.join(tmp.name, "providers.json")
+        with open(self.config_file, "w", encoding="utf-8") as f:
+            json.dump({"providers": [
+                {"name": name, "type": "custom_anthropic", "base_url": f"http://127.0.0.1:9/{name}",
+                 "api_key": "key", "model": "m", "small_fast_model": "m", "max_retries": 2}
+                for name in ("a", "b")
+            ]}, f)
+
+    def test_switcher_state_survives_restart(self):
+        switcher = AIProviderSwitcher(self.config_file)
+        for latency in (0.1, 0.2, 0.3):
+            switcher.record_health(HealthStatus("a", True, latency, time.time()))
+        for _ in range(2):
+            switcher.record_health(HealthStatus("b", False, 1.0, time.time(), error_message="HTTP 502"))
+        switcher.save_health()
+
+        restarted = AIProviderSwitcher(self.config_file)
+        status = restarted.health_status["a"]
+        self.assertTrue(status.is_healthy and status.stale)
+        self.assertEqual(restarted.latency_history["a"].percentiles(50, 100),
+                         switcher.latency_history["a"].percentiles(50, 100))
+        self.assertEqual(restarted.latency_history["a"].ewma, switcher.latency_history["a"].ewma)
+        self.assertEqual(restarted.get_circuit("b").state, CircuitState.OPEN)
+        self.assertEqual(restarted.health_status["b"].error_message, "HTTP 502")
+        # 不等新的探测就能排名
+        self.assertEqual(restarted.get_best_provider(), "a")
+
+    def test_deleted_provider_is_removed_from_store(self):
+        switcher = AIProviderSwitcher(self.config_file)
+        switcher.record_health(HealthStatus("a", True, 0.1, time.time()))
+        switcher.save_health()
+        switcher.delete_provider("a")
+        switcher.flush_config()
+        switcher.save_health()
+        self.assertNotIn("a", switcher.health_store.load().health)
+
+
+class HealthStoreTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "providers.health.db")
+
+    def test_expired_results_are_not_loaded(self):
+        store = HealthStore(self.path, max_age=60)
+        snapshot = HealthSnapshot(health={
+            "fresh": (1, 0.1, time.time(), None),
+            "old": (1, 0.1, time.time() - 120, None),
+        })
+        store.save(snapshot)
+        self.assertEqual(set(store.load().health), {"fresh"})
+        self.assertEqual(set(store.load(["other"]).health), set())
+
+    def test_incompatible_schema_is_rebuilt(self):
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE health (provider_name TEXT)")
+            conn.execute("PRAGMA user_version = 99")
+        conn.close()
+        store = HealthStore(self.path)
+        store.save(HealthSnapshot(health={"a": (1, 0.1, time.time(), None)}))
+        self.assertEqual(set(store.load().health), {"a"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Command Line Tests
+
+Run with: python -m unittest test_provider_cli
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from provider_cli import resolve_provider
+from provider_switch import AIProviderSwitcher, HealthStatus
+
+
+class ResolveProviderTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        config_file = os.path.join(tmp.name, "providers.json")
+        with open(config_file, "w", encoding="utf-8") as f:
+            json.dump({"providers": [
+                {"name": name, "type": "custom_anthropic", "base_url": f"http://127.0.0.1:9/{name}",
+                 "api_key": "key", "model": "m", "small_fast_model": "m"}
+                for name in ("best", "current")
+            ]}, f)
+        self.switcher = AIProviderSwitcher(config_file)
+        self.switcher.record_health(HealthStatus("best", True, 0.1, time.time()))
+        self.switcher.record_health(HealthStatus("current", True, 2.0, time.time()))
+
+    def resolve(self, server_reply, **options):
+        with mock.patch("env_server.query", return_value=server_reply):
+            provider = resolve_provider(self.switcher, None, **options)
+        return provider.name if provider else None
+
+    def test_env_and_launch_prefer_the_active_provider(self):
+        self.assertEqual(self.resolve("current\n"), "current")
+
+    def test_falls_back_to_best_without_env_server(self):
+        self.assertEqual(self.resolve(None), "best")
+
+    def test_activate_defaults_to_best(self):
+        self.assertEqual(self.resolve("current\n", prefer_current=False), "best")
+
+    def test_explicit_name_wins(self):
+        self.assertEqual(resolve_provider(self.switcher, "current", prefer_current=False).name, "current")
+        self.assertIsNone(resolve_provider(self.switcher, "missing"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Gateway Regression Tests
+
+Runs the failover gateway against the in-process mock provider server.
+Run with: python -m unittest test_provider_gateway
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import time
+import unittest
+from typing import Optional
+from unittest import mock
+
+import aiohttp
+
+from mock_provider_server import MockProfile, MockProviderServer
+from provider_gateway import ProviderGateway, SseUsageScanner
+from provider_switch import AIProviderSwitcher, CircuitState
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def mock_provider(name: str, port: int, profile: str, priority: int) -> dict:
+    return {
+        "name": name,
+        "type": "custom_anthropic",
+        "base_url": f"http://127.0.0.1:{port}/p/{profile}",
+        "api_key": f"key-{name}",
+        "model": "mock-model",
+        "small_fast_model": "mock-model",
+        "priority": priority,
+    }
+
+
+def sse_event(event: str, payload: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode("utf-8")
+
+
+SSE_STREAM = b"".join([
+    sse_event("message_start", {"type": "message_start",
+                                "message": {"usage": {"input_tokens": 25, "output_tokens": 1}}}),
+    sse_event("content_block_delta", {"type": "content_block_delta", "delta": {"text": "hi"}}),
+    sse_event("message_delta", {"type": "message_delta", "usage": {"output_tokens": 12}}),
+    sse_event("message_stop", {"type": "message_stop"}),
+])
+
+
+class SseUsageScannerTest(unittest.TestCase):
+    def scan(self, chunks) -> SseUsageScanner:
+        scanner = SseUsageScanner()
+        for chunk in chunks:
+            scanner.feed(chunk)
+        return scanner
+
+    def test_whole_stream(self):
+        scanner = self.scan([SSE_STREAM])
+        self.assertEqual((scanner.input_tokens, scanner.output_tokens), (25, 12))
+
+    def test_events_split_at_every_byte(self):
+        # 事件和 "usage" 标记可能被任意切开
+        scanner = self.scan([SSE_STREAM[i:i + 1] for i in range(len(SSE_STREAM))])
+        self.assertEqual((scanner.input_tokens, scanner.output_tokens), (25, 12))
+
+    def test_oversized_event_is_dropped(self):
+        scanner = SseUsageScanner()
+        scanner.feed(b"data: " + b"x" * (SseUsageScanner.MAX_TAIL + 1))
+        self.assertEqual(scanner.tail, b"")
+        scanner.feed(b"\n\n" + SSE_STREAM)
+        self.assertEqual((scanner.input_tokens, scanner.output_tokens), (25, 12))
+
+
+class GatewayFailoverTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.gateway: Optional[ProviderGateway] = None
+        self.mock = MockProviderServer()
+        self.mock_port = free_port()
+        await self.mock.start(["127.0.0.1"], self.mock_port)
+
+    async def asyncTearDown(self):
+        # start_gateway 失败时没有网关，不能掩盖真正的错误
+        if self.gateway is not None:
+            await self.gateway.stop()
+        await self.mock.stop()
+        self.tmp.cleanup()
+
+    async def start_gateway(self, providers, **options) -> ProviderGateway:
+        config_file = os.path.join(self.tmp.name, "providers.json")
+        with open(config_file, "w", encoding="utf-8") as f:
+            json.dump({"providers": providers}, f)
+        self.gateway = ProviderGateway(AIProviderSwitcher(config_file), port=free_port(), **options)
+        await self.gateway.start()
+        return self.gateway
+
+    async def post_message(self, gateway: ProviderGateway, token: Optional[str] = None):
+        # 与 claude 一样用 ANTHROPIC_AUTH_TOKEN 做 Bearer 认证
+        headers = {"Authorization": f"Bearer {gateway.env()['ANTHROPIC_AUTH_TOKEN'] if token is None else token}"}
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                f"{gateway.base_url}/v1/messages",
+                json={"model": "mock-model", "max_tokens": 8, "messages": [{"role": "user", "content": "hi"}]},
+                headers=headers
+            ) as response:
+                await response.read()
+                return response.status
+
+    async def test_primary_fails_fast_with_hedging_on(self):
+        # 主提供者立即返回 502，早于对冲延迟，也没有对冲令牌：仍应转移到第二个提供者
+        gateway = await self.start_gateway([
+            mock_provider("a_down", self.mock_port, "down", 1),
+            mock_provider("b_fast", self.mock_port, "fast", 2),
+        ], hedge=True)
+        self.assertEqual(await self.post_message(gateway), 200)
+        self.assertEqual(gateway.last_provider, "b_fast")
+        self.assertEqual(gateway.hedge_stats["hedged"], 0)
+
+    async def test_hedge_error_does_not_cancel_primary(self):
+        # 对冲请求发给了故障提供者：它先返回 502 也不能取消随后会成功的主请求
+        self.mock.profiles["late"] = MockProfile(latency_ms=300)
+        gateway = await self.start_gateway([
+            mock_provider("a_late", self.mock_port, "late", 1),
+            mock_provider("b_down", self.mock_port, "down", 2),
+        ], hedge=True, hedge_ratio=1.0)
+        with mock.patch("provider_gateway.HEDGE_DEFAULT_DELAY", 0.05):
+            self.assertEqual(await self.post_message(gateway), 200)
+        self.assertEqual(gateway.last_provider, "a_late")
+        self.assertEqual(gateway.hedge_stats["hedged"], 1)
+        self.assertEqual(gateway.hedge_stats["hedge_wins"], 0)
+        self.assertFalse(gateway.switcher.health_status["b_down"].is_healthy)
+
+    async def test_relayed_upstream_error_opens_circuit(self):
+        # 唯一的提供者返回 502 时原样转发给客户端，但要计入熔断器
+        provider = dict(mock_provider("a_down", self.mock_port, "down", 1), max_retries=2)
+        gateway = await self.start_gateway([provider])
+        for _ in range(2):
+            self.assertEqual(await self.post_message(gateway), 502)
+        breaker = gateway.switcher.circuit_breakers["a_down"]
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+
+    async def test_concurrent_streams_are_not_capped_per_host(self):
+        # 流式响应会一直占用连接：超过探测连接池的每主机上限(4)时也不能排队等待
+        self.mock.profiles["stream"] = MockProfile(latency_ms=10, token_interval_ms=100)
+        gateway = await self.start_gateway([mock_provider("a_stream", self.mock_port, "stream", 1)])
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(self.post_message(gateway) for _ in range(6)))
+        elapsed = time.perf_counter() - started
+        self.assertEqual(statuses, [200] * 6)
+        # 每个流约 0.8 秒；排队的话最后两个要等前面的流结束，总耗时约翻倍
+        self.assertLess(elapsed, 1.4)
+
+    async def test_requests_without_gateway_token_are_rejected(self):
+        gateway = await self.start_gateway([mock_provider("b_fast", self.mock_port, "fast", 1)])
+        self.assertEqual(await self.post_message(gateway, token="wrong"), 401)
+        self.assertEqual(await self.post_message(gateway, token=""), 401)
+        self.assertIsNone(gateway.last_provider)
+        self.assertEqual(await self.post_message(gateway), 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
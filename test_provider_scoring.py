@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Provider Scoring Tests
+
+Run with: python -m unittest test_provider_scoring
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import json
+import os
+import tempfile
+import time
+import unittest
+
+from provider_scoring import (FACTORS, NEUTRAL, ScoreInputs, ScoringConfig, ScoringEngine, ratelimit_headroom,
+                              register_factor)
+from provider_switch import AIProviderSwitcher, HealthStatus
+
+
+def inputs(name: str, latency: float = 1.0, **values) -> ScoreInputs:
+    return ScoreInputs(name=name, latency=latency, tail_latency=values.pop("tail_latency", latency), **values)
+
+
+class ScoringEngineTest(unittest.TestCase):
+    def test_reference_scales_map_to_half(self):
+        engine = ScoringEngine(ScoringConfig(weights={"latency": 1.0, "throughput": 1.0, "cost": 1.0}))
+        columns = engine.columns([inputs("a", latency=1.0, tokens_per_sec=50.0, cost_per_mtok=15.0)])
+        self.assertEqual({name: column[0] for name, column in columns.items()},
+                         {"latency": 0.5, "throughput": 0.5, "cost": 0.5})
+
+    def test_missing_data_is_neutral(self):
+        engine = ScoringEngine(ScoringConfig(weights={"throughput": 1.0, "cost": 1.0, "headroom": 1.0}))
+        columns = engine.columns([inputs("a")])
+        self.assertEqual((columns["throughput"][0], columns["cost"][0]), (NEUTRAL, NEUTRAL))
+        self.assertEqual(columns["headroom"][0], 1.0)  # 没有速率限制头部按额度充足处理
+
+    def test_better_provider_scores_higher(self):
+        engine = ScoringEngine()
+        scores = engine.score([
+            inputs("fast", latency=0.2),
+            inputs("slow", latency=2.0),
+            inputs("erroring", latency=0.2, error_rate=0.5),
+            inputs("half_open", latency=0.2, circuit="half_open"),
+        ])
+        self.assertEqual(len(scores), 4)
+        self.assertTrue(all(0.0 <= score <= 1.0 for score in scores))
+        self.assertGreater(scores[0], scores[1])
+        self.assertGreater(scores[0], scores[2])
+        self.assertGreater(scores[0], scores[3])
+
+    def test_score_is_independent_of_other_providers(self):
+        # 固定参考尺度：增删其他提供者不影响自己的得分，排名可以增量维护
+        engine = ScoringEngine()
+        alone = engine.score([inputs("a", latency=0.4)])[0]
+        crowd = engine.score([inputs("b", latency=5.0), inputs("a", latency=0.4), inputs("c", latency=0.01)])[1]
+        self.assertAlmostEqual(alone, crowd)
+
+    def test_explain_contributions_sum_to_score(self):
+        engine = ScoringEngine()
+        items = [inputs("a", latency=0.3, tail_latency=0.9, error_rate=0.1, tokens_per_sec=80.0, priority=2)]
+        breakdown = engine.explain(items)[0]
+        self.assertAlmostEqual(breakdown.score, engine.score(items)[0])
+        self.assertAlmostEqual(sum(f["contribution"] for f in breakdown.factors.values()), breakdown.score)
+        self.assertAlmostEqual(sum(f["weight"] for f in breakdown.factors.values()), 1.0)
+        self.assertNotIn("cost", breakdown.factors)  # 权重为 0 的因子不参与
+
+    def test_config_from_dict_keeps_default_weights(self):
+        config = ScoringConfig.from_dict({"weights": {"cost": 1}, "latency_scale": 2.0, "unknown": 1})
+        self.assertEqual(config.weights["cost"], 1.0)
+        self.assertEqual(config.weights["latency"], 1.0)
+        self.assertEqual(config.latency_scale, 2.0)
+        self.assertEqual(ScoringConfig.from_dict(config.to_dict()), config)
+
+    def test_registered_factor_needs_a_weight(self):
+        register_factor("always_zero", lambda items, config: [0.0] * len(items))
+        self.addCleanup(FACTORS.pop, "always_zero")
+        self.assertNotIn("always_zero", dict(ScoringEngine().active_factors()))
+        engine = ScoringEngine(ScoringConfig(weights={"latency": 1.0, "always_zero": 1.0}))
+        self.assertAlmostEqual(engine.score([inputs("a", latency=1.0)])[0], 0.25)
+
+    def test_ratelimit_headroom_parsing(self):
+        self.assertIsNone(ratelimit_headroom({}))
+        self.assertEqual(ratelimit_headroom({}, 429), 0.0)
+        self.assertEqual(ratelimit_headroom({"x-ratelimit-remaining": "30", "x-ratelimit-limit": "60"}), 0.5)
+        self.assertIsNone(ratelimit_headroom({"x-ratelimit-remaining": "n/a", "x-ratelimit-limit": "60"}))
+
+
+class RateLimitHeadroomTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config_file = os.path.join(self.tmp.name, "providers.json")
+        with open(config_file, "w", encoding="utf-8") as f:
+            json.dump({"providers": [{
+                "name": "a", "type": "custom_anthropic", "base_url": "http://127.0.0.1:9",
+                "api_key": "key", "model": "m", "small_fast_model": "m",
+            }]}, f)
+        self.switcher = AIProviderSwitcher(config_file)
+        self.switcher.record_health(HealthStatus("a", True, 0.2, time.time()))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_headroom_recovers_after_429(self):
+        # 429 之后不带速率限制头部的正常响应说明已恢复，不能一直按 0 额度扣分
+        full = self.switcher.compute_score(self.switcher.get_provider("a"))
+        self.switcher.record_ratelimit("a", {}, 429)
+        self.assertEqual(self.switcher.ratelimit_headroom["a"], 0.0)
+        self.assertLess(self.switcher.compute_score(self.switcher.get_provider("a")), full)
+
+        self.switcher.record_ratelimit("a", {}, 200)
+        self.assertNotIn("a", self.switcher.ratelimit_headroom)
+        self.assertEqual(self.switcher.compute_score(self.switcher.get_provider("a")), full)
+
+    def test_headroom_from_headers(self):
+        self.switcher.record_ratelimit("a", {
+            "anthropic-ratelimit-requests-remaining": "10", "anthropic-ratelimit-requests-limit": "100",
+            "anthropic-ratelimit-tokens-remaining": "5000", "anthropic-ratelimit-tokens-limit": "10000",
+        })
+        self.assertAlmostEqual(self.switcher.ratelimit_headroom["a"], 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Provider Switcher Tests
+
+Unit tests for the switcher's health bookkeeping.
+Run with: python -m unittest test_provider_switch
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import json
+import math
+import os
+import tempfile
+import time
+import unittest
+from typing import List
+
+from provider_switch import AIProviderSwitcher, CircuitBreaker, CircuitState, HealthStatus, LatencyHistory
+
+
+def provider_entry(name: str, **fields) -> dict:
+    entry = {"name": name, "type": "custom_anthropic", "base_url": f"http://127.0.0.1:9/{name}",
+             "api_key": f"key-{name}", "model": "m", "small_fast_model": "m"}
+    entry.update(fields)
+    return entry
+
+
+def healthy(name: str, response_time: float = 0.2) -> HealthStatus:
+    return HealthStatus(provider_name=name, is_healthy=True, response_time=response_time, last_check=time.time())
+
+
+def unhealthy(name: str) -> HealthStatus:
+    return HealthStatus(provider_name=name, is_healthy=False, response_time=1.0, last_check=time.time(),
+                        error_message="HTTP 502")
+
+
+class SwitcherTestCase(unittest.TestCase):
+    """在临时目录里用给定的提供者配置创建切换器"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.config_file = os.path.join(tmp.name, "providers.json")
+
+    def write_config(self, providers):
+        with open(self.config_file, "w", encoding="utf-8") as f:
+            json.dump({"providers": providers}, f)
+
+    def make_switcher(self, providers) -> AIProviderSwitcher:
+        self.write_config(providers)
+        switcher = AIProviderSwitcher(self.config_file)
+        # 防抖写盘的定时器要在临时目录删除前完成
+        self.addCleanup(switcher.flush_config)
+        return switcher
+
+
+class LatencyHistoryTest(unittest.TestCase):
+    def test_empty_history(self):
+        history = LatencyHistory()
+        self.assertEqual(len(history), 0)
+        self.assertEqual(history.ewma, math.inf)
+        self.assertEqual(history.percentile(50), math.inf)
+        self.assertEqual(history.error_rate(), 0.0)
+
+    def test_percentiles_use_nearest_rank_over_successes(self):
+        history = LatencyHistory()
+        for latency in range(1, 11):
+            history.record(latency / 10, True)
+        history.record(99.0, False)  # 失败样本不计入分位
+        self.assertEqual(history.percentiles(50, 95, 100), [0.5, 1.0, 1.0])
+        self.assertEqual(history.percentile(10), 0.1)
+        self.assertAlmostEqual(history.error_rate(), 1 / 11)
+
+    def test_ewma_ignores_failures(self):
+        history = LatencyHistory(alpha=0.5)
+        history.record(1.0, True)
+        history.record(10.0, False)
+        history.record(3.0, True)
+        self.assertEqual(history.ewma, 2.0)
+
+    def test_ring_buffer_overwrites_oldest(self):
+        history = LatencyHistory(capacity=4)
+        for latency in (9.0, 9.0, 1.0, 2.0, 3.0, 4.0):
+            history.record(latency, True)
+        self.assertEqual(len(history), 4)
+        self.assertEqual(history.percentile(100), 4.0)
+        stats = history.stats()
+        self.assertEqual((stats.samples, stats.p50, stats.p99), (4, 2.0, 4.0))
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_threshold_and_recovers_through_half_open(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30.0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+        self.assertFalse(breaker.allow_request())
+        self.assertGreater(breaker.retry_after(), 29.0)
+
+        breaker.opened_at -= 30.0  # 冷却结束
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())  # 只放行一个试探请求
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+        self.assertEqual(breaker.consecutive_failures, 0)
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30.0)
+        for _ in range(5):
+            breaker.record_failure()
+        breaker.opened_at -= 30.0
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()  # 半开时一次失败就重新断开
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+
+    def test_stuck_trial_is_released_after_timeout(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+        breaker.record_failure()
+        breaker.opened_at -= 30.0
+        self.assertTrue(breaker.allow_request())
+        breaker._trial_started_at -= 30.0  # 试探请求被取消，一直没有结果
+        self.assertTrue(breaker.allow_request())
+
+
+class SwitcherCircuitTest(SwitcherTestCase):
+    def test_threshold_follows_max_retries(self):
+        switcher = self.make_switcher([provider_entry("a", max_retries=2), provider_entry("b", priority=2)])
+        switcher.record_health(healthy("b"))
+        switcher.record_health(unhealthy("a"))
+        self.assertEqual(switcher.get_circuit("a").state, CircuitState.CLOSED)
+        switcher.record_health(unhealthy("a"))
+        self.assertEqual(switcher.get_circuit("a").state, CircuitState.OPEN)
+        self.assertEqual(switcher.rank_providers(), ["b"])
+
+        # 冷却后的试探探测成功即恢复
+        switcher.get_circuit("a").opened_at -= 30.0
+        switcher.record_health(healthy("a"))
+        self.assertEqual(switcher.get_circuit("a").state, CircuitState.CLOSED)
+        self.assertIn("a", switcher.rank_providers())
+
+
+class RankingTest(SwitcherTestCase):
+    def setUp(self):
+        super().setUp()
+        self.switcher = self.make_switcher([provider_entry(name) for name in ("a", "b", "c")])
+
+    def test_faster_provider_ranks_first(self):
+        for name, latency in (("a", 0.9), ("b", 0.1), ("c", 0.5)):
+            self.switcher.record_health(healthy(name, latency))
+        self.assertEqual(self.switcher.rank_providers(), ["b", "c", "a"])
+        self.assertEqual(self.switcher.get_best_provider(), "b")
+
+    def test_best_provider_skips_stale_heap_entries(self):
+        for name, latency in (("a", 0.9), ("b", 0.1), ("c", 0.5)):
+            self.switcher.record_health(healthy(name, latency))
+        self.switcher.record_health(unhealthy("b"))
+        self.assertEqual(self.switcher.get_best_provider(), "c")
+        # 恢复后重新参与排名(最近的失败仍计入错误率)
+        self.switcher.record_health(healthy("b", 0.1))
+        self.assertEqual(sorted(self.switcher.rank_providers()), ["a", "b", "c"])
+
+    def test_unchecked_providers_are_not_ranked(self):
+        self.assertEqual(self.switcher.rank_providers(), [])
+        self.assertIsNone(self.switcher.get_best_provider())
+
+    def test_deleted_provider_leaves_index_and_ranking(self):
+        for name in ("a", "b"):
+            self.switcher.record_health(healthy(name))
+        self.assertTrue(self.switcher.delete_provider("a"))
+        self.assertIsNone(self.switcher.get_provider("a"))
+        self.assertEqual(self.switcher.rank_providers(), ["b"])
+        self.assertEqual(self.switcher.get_best_provider(), "b")
+
+
+class ReloadConfigTest(SwitcherTestCase):
+    def rewrite(self, providers):
+        # 外部编辑：保证 (mtime, size) 签名一定变化
+        signature = os.stat(self.config_file).st_mtime_ns
+        self.write_config(providers)
+        os.utime(self.config_file, ns=(signature + 10 ** 9, signature + 10 ** 9))
+
+    def test_reload_diffs_providers(self):
+        switcher = self.make_switcher([provider_entry("a"), provider_entry("b"), provider_entry("c")])
+        for name in ("a", "b", "c"):
+            switcher.record_health(healthy(name))
+
+        self.rewrite([
+            provider_entry("a", priority=2),
+            provider_entry("b", base_url="http://127.0.0.1:9/moved"),
+            provider_entry("d"),
+        ])
+        changes = switcher.reload_config()
+        self.assertEqual(changes.added, ["d"])
+        self.assertEqual(changes.removed, ["c"])
+        self.assertEqual(sorted(changes.changed), ["a", "b"])
+        self.assertEqual(sorted(changes.reprobe), ["b", "d"])
+
+        # 只改优先级的保留健康数据，端点变化的回到未检测状态
+        self.assertTrue(switcher.health_status["a"].is_healthy)
+        self.assertEqual(switcher.get_provider("a").priority, 2)
+        self.assertEqual(switcher.health_status["b"].last_check, 0)
+        self.assertIsNone(switcher.get_provider("c"))
+        self.assertEqual(switcher.rank_providers(), ["a"])
+
+    def test_unchanged_file_is_not_reloaded(self):
+        switcher = self.make_switcher([provider_entry("a")])
+        self.assertFalse(switcher.reload_config())
+
+    def test_local_edits_are_debounced_and_not_reloaded(self):
+        switcher = self.make_switcher([provider_entry("a")])
+        switcher.update_provider("a", priority=3)
+        switcher.update_provider("a", timeout=5.0)
+        # 未写出的本地修改优先，不会被文件里的旧内容覆盖
+        self.assertFalse(switcher.reload_config())
+        switcher.flush_config()
+        with open(self.config_file, encoding="utf-8") as f:
+            saved = json.load(f)["providers"][0]
+        self.assertEqual((saved["priority"], saved["timeout"]), (3, 5.0))
+        # 自己写出的文件不算外部修改
+        self.assertFalse(switcher.reload_config())
+
+    def test_invalid_file_is_ignored(self):
+        switcher = self.make_switcher([provider_entry("a")])
+        with open(self.config_file, "w", encoding="utf-8") as f:
+            f.write('{"providers": [')
+        self.assertFalse(switcher.reload_config())
+        self.assertIsNotNone(switcher.get_provider("a"))
+
+
+class UpdateProviderTest(SwitcherTestCase):
+    def test_endpoint_edit_resets_health_and_circuit(self):
+        switcher = self.make_switcher([provider_entry("a", max_retries=1), provider_entry("b")])
+        switcher.record_health(unhealthy("a"))
+        switcher.record_health(healthy("b"))
+        self.assertEqual(switcher.get_circuit("a").state, CircuitState.OPEN)
+
+        self.assertTrue(switcher.update_provider("a", base_url="http://127.0.0.1:9/new"))
+        self.assertEqual(switcher.health_status["a"].last_check, 0)
+        self.assertEqual(switcher.get_circuit("a").state, CircuitState.CLOSED)
+        self.assertNotIn("a", switcher.latency_history)
+
+        # 只改优先级不影响健康数据
+        self.assertTrue(switcher.update_provider("b", priority=2))
+        self.assertTrue(switcher.health_status["b"].is_healthy)
+        self.assertEqual(len(switcher.latency_history["b"]), 1)
+
+
+class ProbeOriginTest(SwitcherTestCase):
+    def test_same_endpoint_with_other_keys_and_models_shares_an_origin(self):
+        switcher = self.make_switcher([
+            provider_entry("a", base_url="https://api.example.com/"),
+            provider_entry("b", base_url="https://API.example.com:443", api_key="other", model="other"),
+            provider_entry("c", base_url="https://api.example.com/other"),
+            provider_entry("d", base_url="https://api.example.com", custom_headers={"X-Org": "1"}),
+        ])
+        origin = switcher.probe_origin(switcher.get_provider("a"))
+        self.assertEqual(switcher.probe_origin(switcher.get_provider("b")), origin)
+        self.assertNotEqual(switcher.probe_origin(switcher.get_provider("c")), origin)
+        self.assertNotEqual(switcher.probe_origin(switcher.get_provider("d")), origin)
+        self.assertEqual(switcher.origin_siblings(switcher.get_provider("a")), ["b"])
+
+    def test_origin_groups_follow_endpoint_edits(self):
+        switcher = self.make_switcher([provider_entry("a", base_url="http://h"), provider_entry("b", base_url="http://h")])
+        self.assertEqual(switcher.origin_siblings(switcher.get_provider("a")), ["b"])
+        switcher.update_provider("b", base_url="http://elsewhere")
+        self.assertEqual(switcher.origin_siblings(switcher.get_provider("a")), [])
+
+
+class SharedProbeTest(SwitcherTestCase):
+    def setUp(self):
+        super().setUp()
+        self.switcher = self.make_switcher([
+            provider_entry(name, base_url="http://127.0.0.1:9/shared") for name in ("a", "b", "c")
+        ])
+        self.probed: List[str] = []
+        self.status_code = 200
+
+        async def check(provider):
+            self.probed.append(provider.name)
+            return HealthStatus(provider.name, self.status_code == 200, 0.1, time.time(),
+                                status_code=self.status_code)
+
+        self.switcher.check_provider_health = check
+        self.switcher.save_health = lambda: None
+
+    def run_checks(self):
+        import asyncio
+        return asyncio.run(self.switcher.check_all_providers())
+
+    def test_one_probe_per_origin(self):
+        statuses = self.run_checks()
+        self.assertEqual(self.probed, ["a"])
+        self.assertEqual([statuses[name].shared_from for name in ("a", "b", "c")], [None, "a", "a"])
+        self.assertTrue(all(statuses[name].is_healthy for name in ("a", "b", "c")))
+
+    def test_key_specific_result_is_not_shared(self):
+        self.status_code = 429
+        self.run_checks()
+        self.assertEqual(self.probed, ["a", "b", "c"])
+        # 429 之后每个提供者下次都用自己的密钥探测
+        self.assertTrue(all(self.switcher.needs_own_probe(name) for name in ("a", "b", "c")))
+        self.probed.clear()
+        self.status_code = 200
+        self.run_checks()
+        self.assertEqual(sorted(self.probed), ["a", "b", "c"])
+
+    def test_half_open_provider_probes_with_its_own_key(self):
+        breaker = self.switcher.get_circuit("b")
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        breaker.opened_at -= breaker.reset_timeout
+        self.assertTrue(self.switcher.needs_own_probe("b"))
+        self.run_checks()
+        self.assertEqual(sorted(self.probed), ["a", "b"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Easy Claude Code - Terminal Launcher Tests
+
+Runs the Node/claude environment snapshot against a stub HOME.
+Run with: python -m unittest test_terminal_launcher
+
+Repository: https://github.com/username/easy-claude-code
+License: MIT
+"""
+
+import os
+import shlex
+import tempfile
+import unittest
+from unittest import mock
+
+import terminal_launcher
+
+
+def write_executable(path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("#!/bin/sh\nexit 0\n")
+    os.chmod(path, 0o755)
+
+
+class TerminalDetectionCacheTest(unittest.TestCase):
+    def setUp(self):
+        saved = dict(terminal_launcher._cache)
+        terminal_launcher._cache.clear()
+        self.addCleanup(terminal_launcher._cache.update, saved)
+        self.addCleanup(terminal_launcher._cache.clear)
+
+    def test_detection_runs_once_per_process(self):
+        with mock.patch.object(terminal_launcher, "detect_desktop_environment", return_value="gnome") as detect, \
+                mock.patch.object(terminal_launcher.shutil, "which", return_value="/usr/bin/x") as which:
+            first = terminal_launcher.get_sorted_terminals()
+            self.assertIs(terminal_launcher.get_sorted_terminals(), first)
+            self.assertEqual(first[0][0], "gnome-terminal")
+            detect.assert_called_once()
+            self.assertEqual(which.call_count, len(terminal_launcher.TERMINALS))
+
+            # 强制刷新时连同桌面环境一起重新检测
+            terminal_launcher.detect_available_terminals(refresh=True)
+            terminal_launcher.get_sorted_terminals()
+            self.assertEqual(detect.call_count, 2)
+
+
+class ClaudeEnvSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.home = tmp.name
+        self.bin_dir = os.path.join(self.home, "node bin")
+        os.makedirs(self.bin_dir)
+        for name in ("node", "claude"):
+            write_executable(os.path.join(self.bin_dir, name))
+        # 只有经过 bashrc 才能找到 claude，和 nvm 安装的情况一样
+        self.bashrc = os.path.join(self.home, ".bashrc")
+        with open(self.bashrc, "w", encoding="utf-8") as f:
+            f.write(f'echo "bashrc banner"\nexport PATH={shlex.quote(self.bin_dir)}:"$PATH"\n')
+
+        patcher = mock.patch.dict(os.environ, {
+            "HOME": self.home,
+            "XDG_CACHE_HOME": os.path.join(self.home, ".cache"),
+            "NVM_DIR": os.path.join(self.home, ".nvm"),
+            "PATH": "/usr/bin:/bin",  # 不能找到本机真正安装的 claude
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        terminal_launcher._cache.pop("claude_env", None)
+        self.addCleanup(terminal_launcher._cache.pop, "claude_env", None)
+
+    def test_capture_resolves_claude_through_bashrc(self):
+        snapshot = terminal_launcher.load_claude_env()
+        self.assertEqual(snapshot["claude"], os.path.join(self.bin_dir, "claude"))
+        self.assertEqual(snapshot["node"], os.path.join(self.bin_dir, "node"))
+        self.assertTrue(snapshot["path"].startswith(self.bin_dir + ":"))
+        self.assertTrue(os.path.exists(terminal_launcher.claude_env_cache_path()))
+
+    def test_cached_snapshot_is_reused_until_a_watched_file_changes(self):
+        first = terminal_launcher.load_claude_env()
+        terminal_launcher._cache.pop("claude_env")  # 模拟新进程，只剩磁盘缓存
+        with mock.patch.object(terminal_launcher, "capture_claude_env") as capture:
+            self.assertEqual(terminal_launcher.load_claude_env(), first)
+            capture.assert_not_called()
+
+            stat = os.stat(self.bashrc)
+            os.utime(self.bashrc, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            terminal_launcher.load_claude_env()
+            capture.assert_called_once()
+
+    def test_fast_command_runs_claude_directly(self):
+        command, env = terminal_launcher.build_fast_launch_command(
+            {"ANTHROPIC_BASE_URL": "http://127.0.0.1:8765"}, "/tmp/my project"
+        )
+        snapshot = terminal_launcher.load_claude_env()
+        self.assertEqual(env["PATH"], snapshot["path"])
+        self.assertIn("export ANTHROPIC_BASE_URL=http://127.0.0.1:8765; ", command)
+        self.assertIn("cd '/tmp/my project'; ", command)
+        self.assertTrue(command.endswith(f"{shlex.quote(snapshot['claude'])}; exec bash"))
+        self.assertNotIn("bashrc", command)
+
+    def test_fast_command_falls_back_without_claude(self):
+        os.remove(os.path.join(self.bin_dir, "claude"))
+        self.assertIsNone(terminal_launcher.build_fast_launch_command())
+
+
+if __name__ == "__main__":
+    unittest.main()